@@ -1,7 +1,15 @@
 # -*- coding: utf-8 -*-
+"""AnimIO imports and exports animation in maya.
+
+Importing the package is cheap and does not require maya or mrv. Modules working
+with the maya scene, ``animio.lib`` and ``animio.ui``, assure mrv is available
+when they are imported. All other modules, like the readers in ``animio.clip``, 
+``animio.catalog`` or ``animio.curve``, can be used in a plain interpreter"""
 import os
 import sys
-import glob 
+
+# True once mrv was found to be available, see ``_assure_mrv_is_available``
+_mrv_is_available = False
 
 #{ Initialization
 
@@ -14,9 +22,15 @@ def _setup_ext_path():
 	sys.path.insert(0, _get_ext_path())
 	
 def _assure_mrv_is_available():
-	"""Assure we have access to mrv 
+	"""Assure we have access to mrv. The check is only performed on the first call, 
+	subsequent calls return immediately
 	:raise ImportError: if mrv is not available or does not have a compatible version"""
+	global _mrv_is_available
+	if _mrv_is_available:
+		return
+	# END handle repeated calls
 	import info
+	import glob
 	
 	# if we have non-mrv submodules, definitely add ext to the path.
 	module_dirs = glob.glob(_get_ext_path() + "/*")
@@ -45,10 +59,42 @@ def _assure_mrv_is_available():
 	mmajor, mminor, mmicro = info.mrv_min_version
 	major, minor, micro = mrvinfo.version[:3]
 	if major < mmajor or minor < mminor or micro < mmicro:
-		raise EnvironmentError( "%s requires MRV version %i.%i.%i or higher, got %i.%i.%i instead" % ((project_name, ) + info.mrv_min_version + mrvinfo.version[:3]))   
+		raise EnvironmentError( "%s requires MRV version %i.%i.%i or higher, got %i.%i.%i instead" % ((info.project_name, ) + info.mrv_min_version + mrvinfo.version[:3]))   
 	# END verify MRV version
+	_mrv_is_available = True
 	
 
 #} END initilization
 
-_assure_mrv_is_available()
\ No newline at end of file
+
+#{ Utilities
+
+def _in_maya():
+	""":return: True if we run within maya or mayapy, that is the maya modules are loaded"""
+	return 'maya.OpenMaya' in sys.modules or 'maya.cmds' in sys.modules
+
+def _default_processes():
+	""":return: amount of worker processes to use if the caller did not specify it, 
+		which is one per cpu. Within maya it is 0, see ``_process_pool``"""
+	if _in_maya():
+		return 0
+	# END read in-process within maya
+	try:
+		import multiprocessing
+		return multiprocessing.cpu_count()
+	except (ImportError, NotImplementedError):
+		return 0
+	# END handle missing multiprocessing support
+
+def _process_pool( processes ):
+	""":return: multiprocessing.Pool with the given amount of worker processes, or 
+		None if no workers can be started, in which case the work is done in this 
+		process. Within maya, we never start workers: they would be forks of the 
+		whole maya session on posix, and new maya instances on windows"""
+	if _in_maya():
+		return None
+	# END work in-process within maya
+	import multiprocessing
+	return multiprocessing.Pool(processes)
+
+#} END utilities
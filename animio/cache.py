@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""Contains a process wide cache of parsed animation clips, which allows to
+import the same file multiple times without reading it again.
+
+Entries are keyed by the real path of the file and validated against its size
+and modification time. Once the memory budget is exceeded, the least recently
+used entries are evicted. This module does not require maya"""
+__docformat__ = "restructuredtext"
+
+from animio.clip import read_clips
+
+import threading
+import os
+
+__all__ = ('ClipCache', 'clip_cache')
+
+
+#{ Constants
+
+# rough amount of memory used by the lists and floats of a single key,
+# and by a curve without keys
+_kBytesPerKey = 300
+_kBytesPerCurve = 1000
+
+#} END constants
+
+
+#{ Utilities
+
+def _estimate_size( clips ):
+	""":return: estimated amount of bytes occupied by the given list of ClipData instances"""
+	size = 0
+	for clip in clips:
+		for curve in clip.curves:
+			size += _kBytesPerCurve + len(curve) * _kBytesPerKey
+			size += sum(len(t) + 40 for t in curve.targets)
+		# END for each curve
+	# END for each clip
+	return size
+
+
+class _Entry( object ):
+	"""Node of the doubly linked list keeping the cache entries in order of use"""
+	__slots__ = ('key', 'clips', 'size', 'mtime', 'nbytes', 'prev', 'next')
+
+	def __init__(self, key=None, clips=None, size=0, mtime=0, nbytes=0):
+		self.key = key
+		self.clips = clips
+		self.size = size
+		self.mtime = mtime
+		self.nbytes = nbytes
+		self.prev = self.next = self
+
+#} END utilities
+
+
+class ClipCache( object ):
+	"""Least recently used cache of the ``ClipData`` lists of animation files.
+
+	:note: the returned clips are shared between all callers and must not be altered
+	:note: the cache may be used from multiple threads"""
+
+	def __init__(self, max_bytes=64 * 1024 * 1024, loader=read_clips):
+		""":param max_bytes: memory budget of the cache, see ``set_max_bytes``
+		:param loader: function returning a list of ClipData instances for a path"""
+		self._loader = loader
+		self._max_bytes = max_bytes
+		self._entries = dict()
+		# sentinel of the linked list, its next entry is the most recently used one
+		self._root = _Entry()
+		self._nbytes = 0
+		self._lock = threading.Lock()
+		self._hits = self._misses = self._evictions = self._invalidations = 0
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __contains__(self, path):
+		return os.path.realpath(path) in self._entries
+
+	#{ Utilities
+
+	def _unlink(self, entry):
+		entry.prev.next = entry.next
+		entry.next.prev = entry.prev
+
+	def _link_front(self, entry):
+		root = self._root
+		entry.prev = root
+		entry.next = root.next
+		root.next.prev = entry
+		root.next = entry
+
+	def _remove(self, entry):
+		self._unlink(entry)
+		del(self._entries[entry.key])
+		self._nbytes -= entry.nbytes
+
+	def _evict(self):
+		"""Remove least recently used entries until we are within our budget"""
+		root = self._root
+		while self._nbytes > self._max_bytes and root.prev is not root:
+			self._remove(root.prev)
+			self._evictions += 1
+		# END while over budget
+
+	#} END utilities
+
+	#{ Interface
+
+	def get(self, path):
+		""":return: list of ``ClipData`` instances stored in the file at path, read
+			from the cache if the file did not change since it was cached
+		:raise OSError: if the file does not exist
+		:raise ValueError: if the file cannot be read, see ``animio.clip.read_clips``"""
+		key = os.path.realpath(path)
+		stat = os.stat(key)
+		self._lock.acquire()
+		try:
+			entry = self._entries.get(key)
+			if entry is not None:
+				if entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+					self._hits += 1
+					self._unlink(entry)
+					self._link_front(entry)
+					return entry.clips
+				# END cache hit
+				self._remove(entry)
+				self._invalidations += 1
+			# END handle existing entry
+			self._misses += 1
+		finally:
+			self._lock.release()
+		# END exclusive access
+
+		# read without holding the lock, other files may be served meanwhile
+		clips = self._loader(key)
+
+		self._lock.acquire()
+		try:
+			previous = self._entries.get(key)
+			if previous is not None:
+				self._remove(previous)
+			# END someone else was faster
+			entry = _Entry(key, clips, stat.st_size, stat.st_mtime, _estimate_size(clips))
+			self._entries[key] = entry
+			self._link_front(entry)
+			self._nbytes += entry.nbytes
+			self._evict()
+		finally:
+			self._lock.release()
+		# END exclusive access
+		return clips
+
+	def invalidate(self, path=None):
+		"""Remove the entry of the given path, or all entries if path is None
+		:return: amount of removed entries"""
+		self._lock.acquire()
+		try:
+			if path is None:
+				entries = self._entries.values()
+			else:
+				entries = filter(None, [self._entries.get(os.path.realpath(path))])
+			# END get entries
+			for entry in entries:
+				self._remove(entry)
+			# END for each entry
+			self._invalidations += len(entries)
+			return len(entries)
+		finally:
+			self._lock.release()
+		# END exclusive access
+
+	def max_bytes(self):
+		""":return: memory budget in bytes"""
+		return self._max_bytes
+
+	def set_max_bytes(self, max_bytes):
+		"""Set the memory budget to the given amount of bytes, evicting entries
+		as required. A budget of 0 disables caching"""
+		self._lock.acquire()
+		try:
+			self._max_bytes = max_bytes
+			self._evict()
+		finally:
+			self._lock.release()
+		# END exclusive access
+
+	def paths(self):
+		""":return: list of cached paths, the most recently used one first"""
+		out = list()
+		entry = self._root.next
+		while entry is not self._root:
+			out.append(entry.key)
+			entry = entry.next
+		# END for each entry
+		return out
+
+	def stats(self):
+		""":return: dictionary with the amount of hits, misses, evictions and
+			invalidations, the amount of entries as well as the estimated amount
+			of bytes used and the memory budget"""
+		return dict(hits=self._hits, misses=self._misses, evictions=self._evictions,
+					invalidations=self._invalidations, entries=len(self._entries),
+					nbytes=self._nbytes, max_bytes=self._max_bytes)
+
+	def reset_stats(self):
+		"""Set all counters returned by ``stats`` to 0"""
+		self._hits = self._misses = self._evictions = self._invalidations = 0
+
+	#} END interface
+
+
+#{ Interface
+
+_cache = None
+
+def clip_cache():
+	""":return: the ClipCache shared by the whole process"""
+	global _cache
+	if _cache is None:
+		_cache = ClipCache()
+	# END create cache lazily
+	return _cache
+
+#} END interface
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""Contains an index of animation files, stored in a SQLite database, which
+allows to find clips by the plugs they animate or by their key range without
+opening the files.
+
+Directory trees are scanned incrementally, only files which changed since the
+previous scan are read, using multiple processes. This module does not require maya"""
+__docformat__ = "restructuredtext"
+
+from animio import _default_processes, _process_pool
+from animio.clip import read_clips, supports_file, _namespace
+from animio.shard import Manifest, is_manifest_file, iter_load_shards
+
+import sqlite3
+import fnmatch
+import os
+import logging
+log = logging.getLogger("animio.catalog")
+
+__all__ = ('Catalog', )
+
+
+#{ Constants
+
+_schema = """
+CREATE TABLE IF NOT EXISTS files (
+	id INTEGER PRIMARY KEY,
+	path TEXT UNIQUE NOT NULL,
+	size INTEGER NOT NULL,
+	mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS handles (
+	id INTEGER PRIMARY KEY,
+	file_id INTEGER NOT NULL REFERENCES files(id),
+	name TEXT NOT NULL,
+	fps REAL NOT NULL,
+	first REAL,
+	last REAL,
+	num_curves INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS targets (
+	handle_id INTEGER NOT NULL REFERENCES handles(id),
+	plug TEXT NOT NULL,
+	namespace TEXT NOT NULL,
+	node TEXT NOT NULL,
+	attribute TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS handles_file ON handles(file_id);
+CREATE INDEX IF NOT EXISTS handles_range ON handles(first, last);
+CREATE INDEX IF NOT EXISTS targets_plug ON targets(plug);
+CREATE INDEX IF NOT EXISTS targets_namespace ON targets(namespace);
+CREATE INDEX IF NOT EXISTS targets_node ON targets(node, attribute);
+CREATE INDEX IF NOT EXISTS targets_handle ON targets(handle_id);
+"""
+
+# version of the schema, databases with an older version are rebuilt
+_kSchemaVersion = 1
+
+# characters with a special meaning in glob patterns
+_glob_chars = '*?['
+
+# below this amount of changed files, we do not start worker processes
+_kMinFilesPerProcess = 8
+
+# all file types we can index, which are the ones AnimInOutLibrary.iter_import can read 
+# without maya evaluating the file
+_default_patterns = ('*.ma', '*.aio', '*.aiom')
+
+#} END constants
+
+
+#{ Utilities
+
+def _node_and_attribute( plug_name ):
+	""":return: tuple(node, attribute) of the given plug name, the node name is 
+		stripped of its namespace and parent path"""
+	node, attr = (plug_name.split('.', 1) + [''])[:2]
+	return (node.split('|')[-1].split(':')[-1], attr)
+
+def _index_file( path ):
+	"""Read the given file and summarize its handles. Runs in worker processes.
+
+	:return: tuple(path, error_string or None, list of handle tuples). A handle tuple
+		is (name, fps, first, last, num_curves, target_plug_names)
+	:note: manifests are summarized with the handles of all their shards, the parts 
+		of a handle stored in multiple shards are combined"""
+	try:
+		if is_manifest_file(path):
+			clips = [clip for index, shard_clips in iter_load_shards(path, processes=0) for clip in shard_clips]
+		else:
+			clips = read_clips(path)
+		# END read clips
+		
+		handles = list()
+		handle_index = dict()
+		for clip in clips:
+			first = last = None
+			try:
+				first, last = clip.time_range()
+			except ValueError:
+				pass
+			# END handle clips without keys
+			index = handle_index.get(clip.name)
+			if index is None:
+				handle_index[clip.name] = len(handles)
+				handles.append((clip.name, clip.fps, first, last, len(clip), clip.targets()))
+				continue
+			# END handle new handle
+			
+			name, fps, pfirst, plast, num_curves, targets = handles[index]
+			if pfirst is not None and first is not None:
+				first, last = min(first, pfirst), max(last, plast)
+			elif first is None:
+				first, last = pfirst, plast
+			# END combine ranges
+			handles[index] = (name, fps, first, last, num_curves + len(clip), targets + clip.targets())
+		# END for each clip
+		return (path, None, handles)
+	except Exception, e:
+		return (path, str(e), list())
+	# END handle errors
+
+def _iter_files( root, patterns ):
+	""":return: iterator yielding paths of supported files below root matching
+		any of the given glob patterns. Shards listed by a manifest in the same 
+		directory are skipped, as they are indexed as part of their manifest"""
+	for dirpath, dirnames, filenames in os.walk(root):
+		dirnames.sort()
+		shard_names = set()
+		for filename in filenames:
+			if not is_manifest_file(filename) or not any(fnmatch.fnmatch(filename, p) for p in patterns):
+				continue
+			# END filter manifests
+			try:
+				manifest = Manifest.read(os.path.join(dirpath, filename))
+			except Exception:
+				continue
+			# END ignore invalid manifests, they fail to be indexed later
+			shard_names.update(shard['file'] for shard in manifest.shards)
+		# END for each manifest
+		
+		for filename in sorted(filenames):
+			if filename in shard_names or not any(fnmatch.fnmatch(filename, p) for p in patterns):
+				continue
+			# END filter name
+			path = os.path.join(dirpath, filename)
+			if supports_file(path) or is_manifest_file(path):
+				yield path
+			# END filter unsupported files
+		# END for each file
+	# END for each directory
+
+#} END utilities
+
+
+class Catalog( object ):
+	"""Index of animation files, stored in a SQLite database.
+
+	Query results are lists of tuple(file_path, handle_name), sorted by path and name.
+	Key times are given in frames of the time unit of the respective file"""
+
+	def __init__(self, db_path=':memory:'):
+		""":param db_path: path to the database file, it will be created if needed"""
+		self._db_path = db_path
+		self._conn = sqlite3.connect(db_path)
+		if self._conn.execute("PRAGMA user_version").fetchone()[0] < _kSchemaVersion:
+			# the index can be rebuilt at any time, hence we just drop outdated tables
+			self._conn.executescript("""DROP TABLE IF EXISTS targets;
+										DROP TABLE IF EXISTS handles;
+										DROP TABLE IF EXISTS files;
+										PRAGMA user_version = %i;""" % _kSchemaVersion)
+		# END handle outdated schema
+		self._conn.executescript(_schema)
+
+	def __len__(self):
+		""":return: amount of indexed files"""
+		return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+	def close(self):
+		"""Close the database connection, the instance must not be used afterwards"""
+		self._conn.close()
+
+	#{ Utilities
+
+	def _remove_file(self, file_id):
+		conn = self._conn
+		conn.execute("DELETE FROM targets WHERE handle_id IN (SELECT id FROM handles WHERE file_id=?)", (file_id,))
+		conn.execute("DELETE FROM handles WHERE file_id=?", (file_id,))
+		conn.execute("DELETE FROM files WHERE id=?", (file_id,))
+
+	def _add_file(self, path, size, mtime, handles):
+		conn = self._conn
+		file_id = conn.execute("INSERT INTO files (path, size, mtime) VALUES (?, ?, ?)",
+								(path, size, mtime)).lastrowid
+		for name, fps, first, last, num_curves, targets in handles:
+			handle_id = conn.execute("""INSERT INTO handles (file_id, name, fps, first, last, num_curves)
+										VALUES (?, ?, ?, ?, ?, ?)""",
+										(file_id, name, fps, first, last, num_curves)).lastrowid
+			conn.executemany("""INSERT INTO targets (handle_id, plug, namespace, node, attribute)
+								VALUES (?, ?, ?, ?, ?)""",
+								((handle_id, t, _namespace(t)) + _node_and_attribute(t) for t in targets))
+		# END for each handle
+
+	def _query(self, where, args):
+		return self._conn.execute("""SELECT DISTINCT files.path, handles.name FROM handles
+									JOIN files ON files.id = handles.file_id %s
+									ORDER BY files.path, handles.name""" % where, args).fetchall()
+
+	#} END utilities
+
+	#{ Interface
+
+	def scan(self, root, patterns=_default_patterns, processes=None):
+		"""Update the index with all files below the given root directory. Only
+		new files and files whose size or modification time changed are read,
+		files which do not exist anymore are removed from the index.
+
+		:param root: directory to scan recursively
+		:param patterns: list of glob patterns, files must match one of them. By 
+			default, maya ascii files, native files and shard manifests are indexed
+		:param processes: amount of worker processes used to read the files,
+			if None, one per cpu is used. If 0, all files are read in this process. 
+			Within maya, files are always read in this process, see ``iter_load_shards``
+		:return: dictionary with the lists of 'added', 'updated', 'removed'
+			and 'failed' paths, and the amount of 'unchanged' files
+		:note: files which fail to be read are not indexed, and retried on the next scan"""
+		root = os.path.realpath(root)
+		conn = self._conn
+		known = dict()
+		prefix = os.path.join(root, '')
+		for file_id, path, size, mtime in conn.execute("SELECT id, path, size, mtime FROM files"):
+			if path.startswith(prefix):
+				known[path] = (file_id, size, mtime)
+			# END if file is below root
+		# END for each indexed file
+
+		result = dict(added=list(), updated=list(), removed=list(), failed=list(), unchanged=0)
+		changed = dict()
+		for path in _iter_files(root, patterns):
+			stat = os.stat(path)
+			info = known.pop(path, None)
+			if info is not None and info[1] == stat.st_size and info[2] == stat.st_mtime:
+				result['unchanged'] += 1
+				continue
+			# END skip unchanged files
+			changed[path] = (info, stat)
+		# END for each file
+
+		# files we did not encounter have been removed
+		for path, info in known.iteritems():
+			self._remove_file(info[0])
+			result['removed'].append(path)
+		# END for each removed file
+
+		paths = sorted(changed)
+		if processes is None:
+			processes = _default_processes()
+		# END get amount of processes
+		processes = min(processes, len(paths) // _kMinFilesPerProcess)
+
+		pool = None
+		if processes > 1:
+			pool = _process_pool(processes)
+		# END start workers
+		if pool is not None:
+			summaries = pool.imap_unordered(_index_file, paths)
+		else:
+			summaries = (_index_file(p) for p in paths)
+		# END choose implementation
+
+		try:
+			for path, error, handles in summaries:
+				info, stat = changed[path]
+				if info is not None:
+					self._remove_file(info[0])
+				# END remove outdated information
+				if error is not None:
+					log.warn("Failed to index %s: %s" % (path, error))
+					result['failed'].append(path)
+					continue
+				# END handle errors
+				self._add_file(path, stat.st_size, stat.st_mtime, handles)
+				result[(info is None and 'added') or 'updated'].append(path)
+			# END for each summary
+			conn.commit()
+		finally:
+			if pool is not None:
+				pool.close()
+				pool.join()
+			# END shutdown workers
+		# END assure workers are shut down
+
+		for key in ('added', 'updated', 'failed'):
+			result[key].sort()
+		# END sort results
+		return result
+
+	def find_target(self, pattern):
+		""":return: list of tuple(file_path, handle_name) of all handles animating
+			a plug matching the given glob pattern, i.e. ``*:hand_L_ctrl.rotateZ``
+		:note: the pattern is case sensitive. It is matched using the index if the node
+			name, without namespace and parent path, contains no wildcards"""
+		where = "JOIN targets ON targets.handle_id = handles.id WHERE targets.plug GLOB ?"
+		args = (pattern,)
+		node, attr = _node_and_attribute(pattern)
+		if '[' not in pattern and not any(c in node for c in _glob_chars):
+			where += " AND targets.node = ?"
+			args += (node, )
+			if not any(c in attr for c in _glob_chars):
+				where += " AND targets.attribute = ?"
+				args += (attr, )
+			# END use attribute
+		# END use index
+		return self._query(where, args)
+
+	def find_namespace(self, namespace):
+		""":return: list of tuple(file_path, handle_name) of all handles animating
+			plugs within the given namespace, without leading colon"""
+		return self._query("JOIN targets ON targets.handle_id = handles.id WHERE targets.namespace = ?", (namespace,))
+
+	def find_range(self, start, end):
+		""":return: list of tuple(file_path, handle_name) of all handles whose key
+			range overlaps the range from start to end"""
+		return self._query("WHERE handles.first <= ? AND handles.last >= ?", (end, start))
+
+	def handle_info(self, path, name):
+		""":return: dictionary with the 'fps', 'first', 'last', 'num_curves' and
+			'targets' of the given handle
+		:raise KeyError: if the handle is not indexed"""
+		row = self._conn.execute("""SELECT handles.id, fps, first, last, num_curves FROM handles
+									JOIN files ON files.id = handles.file_id
+									WHERE files.path = ? AND handles.name = ?""", (path, name)).fetchone()
+		if row is None:
+			raise KeyError("Handle %s of %s is not indexed" % (name, path))
+		# END handle missing handle
+		targets = [r[0] for r in self._conn.execute("SELECT plug FROM targets WHERE handle_id = ?", (row[0],))]
+		return dict(fps=row[1], first=row[2], last=row[3], num_curves=row[4], targets=targets)
+
+	def files(self):
+		""":return: sorted list of all indexed file paths"""
+		return [r[0] for r in self._conn.execute("SELECT path FROM files ORDER BY path")]
+
+	def namespaces(self):
+		""":return: sorted list of all namespaces of animated plugs"""
+		return [r[0] for r in self._conn.execute("SELECT DISTINCT namespace FROM targets ORDER BY namespace")]
+
+	#} END interface
@@ -0,0 +1,828 @@
+# -*- coding: utf-8 -*-
+"""Contains a pure data representation of the animation stored in files written
+by ``AnimInOutLibrary.export``, as well as readers which obtain it without loading
+the file into maya.
+
+This allows to import animation without creating file references, and to
+inspect animation files outside of maya.
+
+Besides maya ascii files, clips can be stored in a native compressed format, see
+``ClipWriter``. This module does not require maya"""
+__docformat__ = "restructuredtext"
+
+from animio.curve import *
+from animio.curve import (kConstant, kTangentFixed, kTangentLinear, kTangentFlat, kTangentSmooth,
+							kTangentStep, kTangentSlow, kTangentFast, kTangentClamped,
+							kTangentPlateau, kTangentStepNext)
+
+from array import array
+from Queue import Queue
+import threading
+import struct
+import zlib
+import json
+import math
+import sys
+import re
+import os
+
+__all__ = ('ClipData', 'ClipWriter', 'supports_file', 'is_native_file', 'read_clips', 
+			'parse_layer_info', 'format_layer_info', 'parse_take_info', 'format_take_info')
+
+
+#{ Constants
+
+# frames per second of the time units maya writes into its files
+_fps_by_unit = {	'game' : 15.0, 'film' : 24.0, 'pal' : 25.0, 'ntsc' : 30.0, 'show' : 48.0,
+					'palf' : 50.0, 'ntscf' : 60.0, 'sec' : 1.0, 'min' : 1.0 / 60.0,
+					'hour' : 1.0 / 3600.0, 'millisec' : 1000.0 }
+
+# factors converting linear units to centimeters
+_cm_by_unit = {	'mm' : 0.1, 'millimeter' : 0.1, 'cm' : 1.0, 'centimeter' : 1.0,
+				'm' : 100.0, 'meter' : 100.0, 'km' : 100000.0, 'kilometer' : 100000.0,
+				'in' : 2.54, 'inch' : 2.54, 'ft' : 30.48, 'foot' : 30.48,
+				'yd' : 91.44, 'yard' : 91.44, 'mi' : 160934.4, 'mile' : 160934.4 }
+
+# tangent type values as stored in the animation curve attributes of maya files
+_tangent_types = {	1 : kTangentFixed, 2 : kTangentLinear, 3 : kTangentFlat,
+					5 : kTangentStep, 6 : kTangentSlow, 7 : kTangentFast,
+					9 : kTangentSmooth, 10 : kTangentClamped, 11 : kTangentPlateau,
+					15 : kTangentStepNext, 18 : kTangentClamped }
+
+# identifies files in our native format, see ``ClipWriter``
+_native_magic = "AIOCLIP1"
+_native_extension = '.aio'
+
+# each block of a native file starts with its kind and the size of its compressed payload
+_block_header = struct.Struct('<cI')
+_kBlockClip = 'H'
+_kBlockCurves = 'C'
+
+# long attribute names we understand, mapped to the short names maya usually writes
+_short_names = {	'connectionInfo' : 'cifo', 'keyTimeValue' : 'ktv', 'keyTanInType' : 'kit',
+					'keyTanOutType' : 'kot', 'keyTanInX' : 'kix', 'keyTanInY' : 'kiy',
+					'keyTanOutX' : 'kox', 'keyTanOutY' : 'koy', 'tangentType' : 'tan',
+					'weightedTangents' : 'wgt', 'preInfinity' : 'pre', 'postInfinity' : 'pst',
+					'message' : 'msg', 'affectedBy' : 'ab', 'intermediateInfo' : 'imif',
+					'layerInfo' : 'lyif', 'staticTargets' : 'sttg', 'staticValues' : 'stvl',
+					'takeInfo' : 'tkif', 'activeTake' : 'actk' }
+
+# setAttr flags which take one argument
+_set_attr_flags_with_arg = set(('-s', '-size', '-k', '-keyable', '-l', '-lock',
+								'-cb', '-channelBox', '-type', '-typ', '-c', '-clamp'))
+
+_token_regex = re.compile(r'"(?:[^"\\]|\\.)*"|//[^\n]*|;|[^\s;"]+')
+_attr_regex = re.compile(r'^\.?([^\[\.]+)(?:\[(\d+)(?::(\d+))?\])?$')
+
+#} END constants
+
+
+#{ Utilities
+
+def _unquote( token ):
+	""":return: the string value of the given possibly quoted mel token"""
+	if token.startswith('"'):
+		return token[1:-1].decode('string_escape')
+	return token
+
+def _iter_statements( data ):
+	""":return: iterator yielding lists of tokens of each mel statement in data,
+		comments are skipped"""
+	statement = list()
+	for token in _token_regex.findall(data):
+		if token == ';':
+			if statement:
+				yield statement
+				statement = list()
+			# END handle statement end
+		elif not token.startswith('//'):
+			statement.append(token)
+		# END handle token
+	# END for each token
+	if statement:
+		yield statement
+	# END handle missing semicolon
+
+def _parse_set_attr( args ):
+	""":return: tuple(attr_name, first_index, type_name, values) of the given
+		setAttr arguments, the attribute name is the short name if known,
+		values is a list of unquoted tokens"""
+	attr = type_name = None
+	first_index = 0
+	values = list()
+	index = 0
+	while index < len(args):
+		token = args[index]
+		index += 1
+		if token[0] == '-' and token[1:2].isalpha():
+			if token in _set_attr_flags_with_arg:
+				if token in ('-type', '-typ'):
+					type_name = _unquote(args[index])
+				# END remember type
+				index += 1
+			# END skip flag argument
+			continue
+		# END handle flags
+
+		if attr is None:
+			match = _attr_regex.match(_unquote(token))
+			if match is None:
+				return (None, 0, None, values)
+			# END unsupported attribute
+			attr = _short_names.get(match.group(1), match.group(1))
+			first_index = int(match.group(2) or 0)
+		else:
+			values.append(_unquote(token))
+		# END handle attribute or value
+	# END for each argument
+	return (attr, first_index, type_name, values)
+
+def _namespace( plug_name ):
+	""":return: namespace of the node of the given plug name, or an empty string"""
+	node = plug_name.split('.', 1)[0].split('|')[-1]
+	if ':' not in node:
+		return ''
+	return node.rsplit(':', 1)[0]
+
+def _parse_plug( token ):
+	""":return: tuple(node_name, short_attr_name, index or None) of the given plug token"""
+	node, attr = _unquote(token).rsplit('.', 1)
+	match = _attr_regex.match(attr)
+	if match is None:
+		return (node, attr, None)
+	index = match.group(2)
+	if index is not None:
+		index = int(index)
+	# END convert index
+	return (node, _short_names.get(match.group(1), match.group(1)), index)
+
+def _as_bool( token ):
+	return token in ('yes', 'true', 'on', '1')
+
+def _fps( time_unit ):
+	""":return: frames per second of the given maya time unit name, like 'film' or '100fps'"""
+	if time_unit.endswith('fps'):
+		return float(time_unit[:-3])
+	return _fps_by_unit[time_unit]
+
+
+class _CurveRecord( object ):
+	"""Collects the attribute values of an animation curve while parsing"""
+	__slots__ = ('name', 'curve_type', 'ktv', 'default_type', 'weighted',
+				'pre', 'pst', 'kit', 'kot', 'kix', 'kiy', 'kox', 'koy')
+
+	def __init__(self, name, curve_type):
+		self.name = name
+		self.curve_type = curve_type
+		self.ktv = list()
+		self.default_type = kTangentClamped
+		self.weighted = False
+		self.pre = self.pst = kConstant
+		for attr in ('kit', 'kot', 'kix', 'kiy', 'kox', 'koy'):
+			setattr(self, attr, dict())
+		# END for each sparse key attribute
+
+	def set_attr(self, attr, first_index, values):
+		"""Record the given setAttr values"""
+		if attr == 'ktv':
+			self.ktv.extend(values)
+		elif attr in ('kit', 'kot', 'kix', 'kiy', 'kox', 'koy'):
+			store = getattr(self, attr)
+			for index, value in enumerate(values):
+				store[first_index + index] = float(value)
+			# END for each value
+		elif attr == 'tan' and values:
+			self.default_type = _tangent_types.get(int(values[0]), kTangentClamped)
+		elif attr == 'wgt' and values:
+			self.weighted = _as_bool(values[0])
+		elif attr in ('pre', 'pst') and values:
+			setattr(self, attr, int(values[0]))
+		# END handle attribute
+
+	def to_curve_data(self, targets, fps, value_factor):
+		""":return: ``CurveData`` instance with our keys
+		:param fps: frames per second of the file's time unit
+		:param value_factor: factor converting values into internal units"""
+		times = [float(t) for t in self.ktv[0::2]]
+		values = [float(v) * value_factor for v in self.ktv[1::2]]
+		num_keys = len(times)
+
+		in_types = [self.default_type] * num_keys
+		out_types = [self.default_type] * num_keys
+		for types, store in ((in_types, self.kit), (out_types, self.kot)):
+			for index, value in store.iteritems():
+				if index < num_keys:
+					types[index] = _tangent_types.get(int(value), kTangentClamped)
+			# END for each explicit type
+		# END for each tangent direction
+
+		curve = CurveData(self.name, self.curve_type, targets, times, values,
+							in_types, out_types, weighted=self.weighted,
+							pre_infinity=self.pre, post_infinity=self.pst)
+
+		# explicit tangents override the computed ones. Their x values are stored
+		# in seconds for time based curves
+		if self.curve_type[len('animCurve')] == 'U':
+			fps = 1.0
+		# END handle unitless input
+		for xstore, ystore, xs, ys in ((self.kix, self.kiy, curve.in_x, curve.in_y),
+										(self.kox, self.koy, curve.out_x, curve.out_y)):
+			for index, x in xstore.iteritems():
+				if index < num_keys and index in ystore:
+					xs[index] = x * fps
+					ys[index] = ystore[index] * value_factor
+				# END if tangent is complete
+			# END for each explicit tangent
+		# END for each tangent direction
+		return curve
+
+def _float_bytes( values ):
+	""":return: little endian string of the given floats as doubles"""
+	values = array('d', values)
+	if sys.byteorder != 'little':
+		values.byteswap()
+	# END assure byte order
+	return values.tostring()
+
+def _float_list( data ):
+	""":return: list of floats of the given string written by ``_float_bytes``"""
+	values = array('d')
+	values.fromstring(data)
+	if sys.byteorder != 'little':
+		values.byteswap()
+	# END assure byte order
+	return values.tolist()
+
+def _encode_clip( clip ):
+	""":return: payload of a clip block describing the given ClipData, without its curves"""
+	return json.dumps(dict(name=clip.name, fps=clip.fps, layer_info=clip.layer_info,
+							static_targets=clip.static_targets, static_values=clip.static_values, 
+							takes=clip.takes, active_take=clip.active_take))
+
+def _dense_sampling( curve ):
+	""":return: tuple(first_key_time, step) if the given CurveData can be stored 
+		densely, or None. This is the case for evenly spaced keys on unweighted 
+		curves without fixed tangents, as maya computes all their tangents itself"""
+	if curve.weighted or kTangentFixed in curve.in_types or kTangentFixed in curve.out_types:
+		return None
+	# END check tangents
+	return curve.sampling()
+
+def _encode_curves( curves, intermediates ):
+	""":return: payload of a curve block with the given CurveData instances and 
+		the list of intermediate chains of each of them. The payload consists of a 
+		json header line, followed by all key data as little endian doubles.
+		
+		Densely stored curves, see ``_dense_sampling``, have the first key time 
+		and the step appended to their header entry, and only store their values 
+		and tangent types"""
+	header = list()
+	floats = list()
+	for curve, chains in zip(curves, intermediates):
+		entry = [curve.name, curve.curve_type, curve.targets, chains, curve.weighted, 
+					curve.pre_infinity, curve.post_infinity, len(curve)]
+		sampling = _dense_sampling(curve)
+		if sampling is None:
+			keys = (curve.times, curve.values, curve.in_types, curve.out_types, 
+					curve.in_x, curve.in_y, curve.out_x, curve.out_y)
+		else:
+			entry.extend(sampling)
+			keys = (curve.values, curve.in_types, curve.out_types)
+		# END handle storage
+		header.append(entry)
+		for values in keys:
+			floats.extend(values)
+		# END for each key attribute
+	# END for each curve
+	return json.dumps(header) + '\n' + _float_bytes(floats)
+
+def _decode_curves( payload ):
+	""":return: tuple(list of CurveData, list of intermediate chains per curve) of 
+		the given curve block payload"""
+	header_end = payload.index('\n')
+	floats = _float_list(payload[header_end + 1:])
+	curves = list()
+	intermediates = list()
+	offset = 0
+	for entry in json.loads(payload[:header_end]):
+		name, curve_type, targets, chains, weighted, pre, post, num_keys = entry[:8]
+		if len(entry) > 8:
+			# dense curve, its tangents are computed
+			start, step = entry[8:10]
+			keys = [floats[offset + i * num_keys:offset + (i + 1) * num_keys] for i in xrange(3)]
+			offset += num_keys * 3
+			times = [start + i * step for i in xrange(num_keys)]
+			keys = [times] + keys + [None] * 4
+		else:
+			keys = [floats[offset + i * num_keys:offset + (i + 1) * num_keys] for i in xrange(8)]
+			offset += num_keys * 8
+		# END handle storage
+		in_types = [int(t) for t in keys[2]]
+		out_types = [int(t) for t in keys[3]]
+		curves.append(CurveData(str(name), str(curve_type), [str(t) for t in targets], keys[0], keys[1], 
+								in_types, out_types, keys[4], keys[5], keys[6], keys[7], weighted, pre, post))
+		intermediates.append([str(c) for c in chains])
+	# END for each curve
+	return (curves, intermediates)
+
+#} END utilities
+
+
+class ClipData( object ):
+	"""The animation managed by a single ``AnimationHandle``, stored as list of
+	``CurveData`` instances whose targets are the stored target plug names.
+
+	Key times are given in frames of the time unit the clip was stored with,
+	see ``fps``"""
+
+	def __init__(self, name='', curves=None, fps=24.0, intermediates=None, layer_info=None,
+					static_targets=None, static_values=None, takes=None, active_take=None):
+		#: name of the handle
+		self.name = name
+		#: list of CurveData instances in the order of the handle
+		self.curves = curves or list()
+		#: frames per second of the time unit of all key times
+		self.fps = fps
+		#: list with a list for each curve, holding a string for each target. It
+		#: contains the '>' separated names of the intermediate input plugs between
+		#: curve and target, or is empty if the curve drove the target directly
+		self.intermediates = intermediates or [[''] * len(c.targets) for c in self.curves]
+		#: dictionary with the settings of the animation layer the curves belong to, 
+		#: see ``parse_layer_info``, or None if the clip was not exported by layer
+		self.layer_info = layer_info
+		#: list of the names of plugs without animation whose values were stored
+		self.static_targets = static_targets or list()
+		#: list of floats with the value of each static target in internal units
+		self.static_values = static_values or list()
+		#: list of tuple(name, curve_indices) of each take, see ``parse_take_info``. 
+		#: Takes share the curves they have in common, each curve index refers to 
+		#: ``curves``
+		self.takes = takes or list()
+		#: name of the active take, or None if there are no takes
+		self.active_take = active_take
+
+	def __len__(self):
+		return len(self.curves)
+
+	def __repr__(self):
+		return "%s(%r, %i curves)" % (type(self).__name__, self.name, len(self.curves))
+
+	def targets(self):
+		""":return: list of all target plug names of all curves"""
+		out = list()
+		for curve in self.curves:
+			out.extend(curve.targets)
+		# END for each curve
+		return out
+
+	def time_range(self):
+		""":return: tuple(first_key_time, last_key_time) of all curves
+		:raise ValueError: if there are no keys"""
+		ranges = [c.time_range() for c in self.curves if len(c)]
+		if not ranges:
+			raise ValueError("%r has no keys" % self)
+		return (min(r[0] for r in ranges), max(r[1] for r in ranges))
+
+
+#{ Readers
+
+def _read_ma( input_file ):
+	""":return: list of ClipData instances read from the given maya ascii file"""
+	fps, angle_factor, linear_factor = 24.0, math.pi / 180.0, 1.0
+	curves = dict()
+	handles = list()
+	handle_info = dict()		# handle name -> list of target strings
+	handle_chains = dict()		# handle name -> list of intermediate chain strings
+	handle_layers = dict()		# handle name -> layer info dict
+	handle_static = dict()		# handle name -> tuple(list of static targets, list of values)
+	handle_takes = dict()		# handle name -> list of takes
+	handle_active = dict()		# handle name -> name of active take
+	handle_curves = dict()		# handle name -> dict(logical index -> curve name)
+	current = None
+
+	data = open(input_file, 'rb').read()
+	for statement in _iter_statements(data):
+		cmd = statement[0]
+		args = statement[1:]
+		if cmd == 'setAttr':
+			if current is None:
+				continue
+			# END skip selected nodes
+			attr, first_index, type_name, values = _parse_set_attr(args)
+			if isinstance(current, _CurveRecord):
+				current.set_attr(attr, first_index, values)
+			elif attr == 'cifo' and type_name == 'stringArray':
+				# the first value is the amount of strings
+				handle_info[current] = values[1:]
+				if current not in handles:
+					handles.append(current)
+			elif attr == 'imif' and type_name == 'stringArray':
+				handle_chains[current] = values[1:]
+			elif attr == 'lyif' and type_name == 'stringArray' and len(values) > 1:
+				handle_layers[current] = parse_layer_info(values[1:])
+			elif attr == 'sttg' and type_name == 'stringArray':
+				handle_static.setdefault(current, (list(), list()))[0][:] = values[1:]
+			elif attr == 'stvl' and type_name == 'doubleArray':
+				handle_static.setdefault(current, (list(), list()))[1][:] = [float(v) for v in values[1:]]
+			elif attr == 'tkif' and type_name == 'stringArray':
+				handle_takes[current] = parse_take_info(values[1:])
+			elif attr == 'actk' and type_name == 'string' and values:
+				handle_active[current] = values[0] or None
+			# END handle node type
+		elif cmd == 'createNode':
+			node_type = args[0]
+			name = ''
+			if '-n' in args:
+				name = _unquote(args[args.index('-n') + 1])
+			# END get name
+			if node_type.startswith('animCurve'):
+				current = curves[name] = _CurveRecord(name, node_type)
+			elif node_type == 'network':
+				current = name
+			else:
+				current = None
+			# END handle node type
+		elif cmd == 'addAttr':
+			if isinstance(current, basestring) and ('"cifo"' in args or '"connectionInfo"' in args):
+				if current not in handles:
+					handles.append(current)
+			# END handle handle attribute
+		elif cmd in ('rename', 'lockNode'):
+			# these keep the current node
+			pass
+		elif cmd == 'connectAttr':
+			plugs = [a for a in args if not a.startswith('-')]
+			src_node, src_attr, src_index = _parse_plug(plugs[0])
+			dst_node, dst_attr, dst_index = _parse_plug(plugs[1])
+			if src_attr == 'msg' and dst_attr in ('ab', 'afb'):
+				connections = handle_curves.setdefault(dst_node, dict())
+				if dst_index is None:
+					dst_index = len(connections) and max(connections) + 1
+				# END handle next available
+				connections[dst_index] = src_node
+			# END handle curve connection
+		elif cmd == 'currentUnit':
+			for flag, value in zip(args[0::2], args[1::2]):
+				if flag in ('-t', '-time'):
+					fps = _fps(value)
+				elif flag in ('-a', '-angle'):
+					angle_factor = (value.startswith('deg') and math.pi / 180.0) or 1.0
+				elif flag in ('-l', '-linear'):
+					linear_factor = _cm_by_unit.get(value, 1.0)
+				# END handle flag
+			# END for each flag
+		else:
+			# select, requires, fileInfo, ... . setAttrs would affect other nodes
+			current = None
+		# END handle command
+	# END for each statement
+
+	out = list()
+	for handle in handles:
+		targets = handle_info.get(handle, list())
+		chains = handle_chains.get(handle, list())
+		connections = handle_curves.get(handle, dict())
+		clip_curves = list()
+		clip_chains = list()
+		clip_indices = dict()		# curve index -> index in clip_curves
+		for index, curve_name in enumerate(connections[i] for i in sorted(connections)):
+			record = curves.get(curve_name)
+			if record is None:
+				continue
+			# END skip unknown nodes
+			clip_indices[index] = len(clip_curves)
+
+			value_factor = 1.0
+			output_kind = record.curve_type[-1]
+			if output_kind == 'A':
+				value_factor = angle_factor
+			elif output_kind == 'L':
+				value_factor = linear_factor
+			# END handle output units
+
+			curve_targets = list()
+			if index < len(targets):
+				curve_targets = [t for t in targets[index].split(',') if t]
+			# END get targets
+			curve_chains = [''] * len(curve_targets)
+			if len(chains) == len(targets) and index < len(chains):
+				curve_chains = (chains[index].split(',') + curve_chains)[:len(curve_targets)]
+			# END get intermediate chains
+			clip_curves.append(record.to_curve_data(curve_targets, fps, value_factor))
+			clip_chains.append(curve_chains)
+		# END for each connected curve
+		static_targets, static_values = handle_static.get(handle, (list(), list()))
+		if len(static_targets) != len(static_values):
+			raise ValueError("Static pose of %s in %s is out of sync with its targets" % (handle, input_file))
+		# END check sync
+		takes = [(name, [clip_indices[i] for i in indices if i in clip_indices]) 
+					for name, indices in handle_takes.get(handle, list())]
+		out.append(ClipData(handle, clip_curves, fps, clip_chains, handle_layers.get(handle), 
+							static_targets, static_values, takes, handle_active.get(handle)))
+	# END for each handle
+	return out
+
+def _read_native( input_file ):
+	""":return: list of ClipData instances read from the given file written by ``ClipWriter``"""
+	fp = open(input_file, 'rb')
+	try:
+		if fp.read(len(_native_magic)) != _native_magic:
+			raise ValueError("%s is not a native animation file" % input_file)
+		# END check magic
+		
+		out = list()
+		while True:
+			header = fp.read(_block_header.size)
+			if not header:
+				break
+			# END end of file
+			if len(header) != _block_header.size:
+				raise ValueError("%s is truncated" % input_file)
+			# END check header
+			kind, size = _block_header.unpack(header)
+			payload = fp.read(size)
+			if len(payload) != size:
+				raise ValueError("%s is truncated" % input_file)
+			# END check payload
+			payload = zlib.decompress(payload)
+			
+			if kind == _kBlockClip:
+				info = json.loads(payload)
+				layer_info = info['layer_info']
+				if layer_info is not None:
+					layer_info = dict((str(k), (isinstance(v, basestring) and str(v)) or v) 
+										for k, v in layer_info.iteritems())
+				# END convert unicode
+				active_take = info.get('active_take')
+				if active_take is not None:
+					active_take = str(active_take)
+				# END convert unicode
+				out.append(ClipData(str(info['name']), fps=info['fps'], layer_info=layer_info,
+									static_targets=[str(t) for t in info['static_targets']],
+									static_values=info['static_values'], 
+									takes=[(str(n), i) for n, i in info.get('takes', list())], 
+									active_take=active_take))
+			elif kind == _kBlockCurves:
+				if not out:
+					raise ValueError("%s contains curves before the first clip" % input_file)
+				# END check order
+				curves, intermediates = _decode_curves(payload)
+				out[-1].curves.extend(curves)
+				out[-1].intermediates.extend(intermediates)
+			else:
+				raise ValueError("Unknown block %r in %s" % (kind, input_file))
+			# END handle block kind
+		# END for each block
+		return out
+	finally:
+		fp.close()
+	# END assure file is closed
+
+#} END readers
+
+
+class ClipWriter( object ):
+	"""Writes clips into a file of our native format, a sequence of zlib compressed 
+	blocks, using a pipeline. The caller adds chunks of curves in the main thread, 
+	which are encoded and compressed by a pool of worker threads, while a writer 
+	thread streams the compressed blocks to disk in the order they were added.
+	
+	This allows maya to keep extracting curve data while previous chunks are still 
+	being compressed and written, which is most notable on network storage.
+	
+	Curves with evenly spaced keys, like baked motion capture, are stored densely 
+	as first key time, step and values, unless they are weighted or use fixed tangents.
+	
+	Usage::
+	
+		writer = ClipWriter("clip.aio")
+		writer.begin_clip(ClipData("handle", fps=24.0))
+		writer.add_curves(curve_datas)
+		writer.close()
+	
+	:note: the file is written atomically, it only appears once ``close`` succeeded"""
+	
+	def __init__(self, output_file, threads=2, level=6, max_pending=8):
+		"""
+		:param output_file: path to the file to write
+		:param threads: amount of threads encoding and compressing the chunks
+		:param level: zlib compression level
+		:param max_pending: maximum amount of chunks waiting to be encoded. Once 
+			reached, ``add_curves`` blocks until the workers caught up"""
+		self._output_file = output_file
+		self._tmp_file = output_file + '.tmp'
+		self._level = level
+		self._error = None
+		self._num_blocks = 0
+		self._has_clip = False
+		self._closed = False
+		
+		self._fp = open(self._tmp_file, 'wb')
+		self._fp.write(_native_magic)
+		self._encode_queue = Queue(max(max_pending, 1))
+		self._write_queue = Queue()
+		self._encoders = [threading.Thread(target=self._encode_blocks) for i in xrange(max(threads, 1))]
+		self._writer = threading.Thread(target=self._write_blocks)
+		for thread in self._encoders + [self._writer]:
+			thread.setDaemon(True)
+			thread.start()
+		# END for each thread
+		
+	#{ Workers
+	
+	def _encode_blocks(self):
+		"""Encode and compress blocks until we receive None"""
+		while True:
+			item = self._encode_queue.get()
+			if item is None:
+				break
+			# END handle end of input
+			
+			index, kind, data = item
+			try:
+				if self._error is None:
+					if kind == _kBlockClip:
+						payload = _encode_clip(data)
+					else:
+						payload = _encode_curves(*data)
+					# END handle kind
+					payload = zlib.compress(payload, self._level)
+					self._write_queue.put((index, _block_header.pack(kind, len(payload)) + payload))
+					continue
+				# END if no error occurred
+			except Exception, e:
+				self._error = e
+			# END handle errors
+			# keep the writer's order intact
+			self._write_queue.put((index, ''))
+		# END for each item
+		
+	def _write_blocks(self):
+		"""Write blocks in order until we receive None"""
+		pending = dict()
+		next_index = 0
+		while True:
+			item = self._write_queue.get()
+			if item is None:
+				break
+			# END handle end of input
+			pending[item[0]] = item[1]
+			while next_index in pending:
+				try:
+					if self._error is None:
+						self._fp.write(pending[next_index])
+					# END skip writing after errors
+				except Exception, e:
+					self._error = e
+				# END handle errors
+				del(pending[next_index])
+				next_index += 1
+			# END for each block in order
+		# END for each block
+		
+	#} END workers
+	
+	def _submit(self, kind, data):
+		if self._closed:
+			raise ValueError("Cannot write to closed %s" % type(self).__name__)
+		# END check state
+		if self._error is not None:
+			raise IOError("Failed to write %s: %s" % (self._output_file, self._error))
+		# END fail early
+		self._encode_queue.put((self._num_blocks, kind, data))
+		self._num_blocks += 1
+		
+	def _shutdown(self):
+		"""Stop all threads once they processed the pending blocks, and close the file"""
+		self._closed = True
+		for thread in self._encoders:
+			self._encode_queue.put(None)
+		# END for each encoder
+		for thread in self._encoders:
+			thread.join()
+		# END for each encoder
+		self._write_queue.put(None)
+		self._writer.join()
+		self._fp.close()
+		
+	#{ Interface
+	
+	def begin_clip(self, clip):
+		"""Start a new clip, all curves added afterwards belong to it
+		
+		:param clip: ``ClipData`` instance, its name, fps, layer_info and static pose
+			are written, but not its curves"""
+		self._has_clip = True
+		self._submit(_kBlockClip, clip)
+		
+	def add_curves(self, curves, intermediates=None):
+		"""Add the given chunk of curves to the current clip
+		
+		:param curves: list of ``CurveData`` instances
+		:param intermediates: list of intermediate chains for each curve, see 
+			``ClipData.intermediates``, or None if all curves drive their targets directly
+		:raise IOError: if a previous chunk failed to be encoded or written"""
+		if not self._has_clip:
+			raise ValueError("Call begin_clip before adding curves")
+		# END check order
+		if intermediates is None:
+			intermediates = [[''] * len(c.targets) for c in curves]
+		# END default intermediates
+		self._submit(_kBlockCurves, (list(curves), list(intermediates)))
+		
+	def add_clip(self, clip):
+		"""Write the given ClipData including all its curves"""
+		self.begin_clip(clip)
+		self.add_curves(clip.curves, clip.intermediates)
+		
+	def close(self):
+		"""Wait for all pending chunks to be written and move the file into place
+		
+		:raise IOError: if a chunk failed to be encoded or written, the file is 
+			not written in that case"""
+		if self._closed:
+			return
+		# END handle multiple calls
+		self._shutdown()
+		if self._error is not None:
+			os.remove(self._tmp_file)
+			raise IOError("Failed to write %s: %s" % (self._output_file, self._error))
+		# END handle errors
+		if os.path.exists(self._output_file):
+			os.remove(self._output_file)
+		# END remove previous file
+		os.rename(self._tmp_file, self._output_file)
+		
+	def abort(self):
+		"""Stop writing and discard everything written so far"""
+		if self._closed:
+			return
+		# END handle multiple calls
+		self._error = self._error or ValueError("aborted")
+		self._shutdown()
+		os.remove(self._tmp_file)
+		
+	#} END interface
+
+
+#{ Interface
+
+def parse_layer_info( entries ):
+	""":return: dictionary with animation layer settings from the given list of 
+		'key=value' strings, as returned by ``format_layer_info``. The 'name' and 
+		'parent' of the layer are strings, its 'index' in the layer hierarchy and 
+		whether it is the 'root' layer are integers, all other settings are floats"""
+	info = dict()
+	for entry in entries:
+		key, value = entry.split('=', 1)
+		if key in ('index', 'root'):
+			value = int(float(value))
+		elif key not in ('name', 'parent'):
+			value = float(value)
+		# END convert value
+		info[key] = value
+	# END for each entry
+	return info
+
+def format_layer_info( info ):
+	""":return: sorted list of 'key=value' strings of the given layer settings dictionary"""
+	return ["%s=%s" % (key, value) for key, value in sorted(info.iteritems())]
+
+def parse_take_info( entries ):
+	""":return: list of tuple(name, curve_indices) of each take from the given list 
+		of 'name=index,index,...' strings, as returned by ``format_take_info``. 
+		Indices refer to the curves of the handle, which are shared by all takes"""
+	takes = list()
+	for entry in entries:
+		name, indices = entry.rsplit('=', 1)
+		takes.append((name, [int(i) for i in indices.split(',') if i]))
+	# END for each entry
+	return takes
+
+def format_take_info( takes ):
+	""":return: list of 'name=index,index,...' strings of the given list of 
+		tuple(name, curve_indices), in order"""
+	return ["%s=%s" % (name, ','.join(str(i) for i in indices)) for name, indices in takes]
+
+def is_native_file( path ):
+	""":return: True if the given path denotes a file in our native format, see ``ClipWriter``"""
+	return path.lower().endswith(_native_extension)
+
+def supports_file( input_file ):
+	""":return: True if the animation of the given file can be read by ``read_clips``"""
+	return input_file.lower().endswith('.ma') or is_native_file(input_file)
+
+def read_clips( input_file ):
+	"""Read the animation of all handles stored in the given file
+
+	:param input_file: path to a file written by ``AnimInOutLibrary.export``
+	:return: list of ``ClipData`` instances, one per stored handle
+	:raise ValueError: if the file format is not supported, i.e. mayaBinary files"""
+	if not supports_file(input_file):
+		raise ValueError("Cannot read animation from %s, only maya ascii and native files are supported" % input_file)
+	# END check format
+	if is_native_file(input_file):
+		return _read_native(input_file)
+	return _read_ma(input_file)
+
+#} END interface
@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""Contains a pure python representation of animation curves and an evaluator
+implementing maya's animation curve semantics.
+
+It allows to preview, compare, resample or pose stored animation without having
+maya evaluate the dependency graph. This module does not require maya"""
+__docformat__ = "restructuredtext"
+
+from bisect import bisect_right
+from array import array
+import hashlib
+import math
+
+__all__ = ('CurveData', 'evaluate')
+
+
+#{ Constants
+
+# Tangent types, matching the values of MFnAnimCurve.TangentType
+kTangentGlobal, kTangentFixed, kTangentLinear, kTangentFlat, kTangentSmooth, \
+kTangentStep, kTangentSlow, kTangentFast, kTangentClamped, kTangentPlateau, \
+kTangentStepNext = range(11)
+
+# Infinity types, matching the values of MFnAnimCurve.InfinityType
+kConstant = 0
+kLinear = 1
+kCycle = 3
+kCycleRelative = 4
+kOscillate = 5
+
+# segment kinds
+_kHermite, _kBezier, _kStep, _kStepNext = range(4)
+
+#} END constants
+
+
+#{ Utilities
+
+def _slope( x, y ):
+	""":return: slope of the tangent vector x, y - vertical tangents are treated as flat"""
+	if abs(x) < 1.0e-12:
+		return 0.0
+	return y / x
+
+def _solve_bezier( t, x0, bx, cx, dx ):
+	""":return: parameter s within [0, 1] at which the bezier polynomial
+		x(s) = x0 + dx*s + cx*s^2 + bx*s^3 equals t
+	:note: x(s) must be monotonic, which is assured by clamping the control points"""
+	# newton from a linear guess, bisection if it does not converge
+	s = 0.5
+	span = bx + cx + dx
+	if span:
+		s = min(max((t - x0) / span, 0.0), 1.0)
+	# END initial guess
+
+	for i in xrange(8):
+		err = x0 + s * (dx + s * (cx + s * bx)) - t
+		if abs(err) < 1.0e-9:
+			return s
+		# END converged
+		deriv = dx + s * (2.0 * cx + s * 3.0 * bx)
+		if abs(deriv) < 1.0e-12:
+			break
+		# END cannot continue
+		s -= err / deriv
+		if s < 0.0 or s > 1.0:
+			break
+		# END left the segment
+	# END for each newton iteration
+
+	lo, hi = 0.0, 1.0
+	for i in xrange(50):
+		s = (lo + hi) * 0.5
+		if x0 + s * (dx + s * (cx + s * bx)) < t:
+			lo = s
+		else:
+			hi = s
+		# END bisect
+	# END for each bisection step
+	return (lo + hi) * 0.5
+
+#} END utilities
+
+
+class CurveData( object ):
+	"""Pure data representation of an animation curve. Keys are stored in
+	parallel lists, the i'th entry of each list describes the i'th key.
+
+	* **times**: key times in frames, sorted ascending
+	* **values**: key values in internal units ( i.e. radians for angular curves )
+	* **in_types**, **out_types**: tangent types as ``kTangent...`` constant
+	* **in_x**, **in_y**, **out_x**, **out_y**: tangent vectors, x is measured in
+	  frames, y in internal units
+
+	The curve additionally knows its name, its node type, the names of the plugs
+	it drives, whether it is weighted and its pre- and post infinity types"""
+
+	def __init__(self, name='', curve_type='animCurveTU', targets=None, times=None, values=None,
+					in_types=None, out_types=None, in_x=None, in_y=None, out_x=None, out_y=None,
+					weighted=False, pre_infinity=kConstant, post_infinity=kConstant):
+		"""Initialize this instance. If the tangent vectors are not given, they will
+		be computed from the tangent types, which default to kTangentClamped"""
+		self.name = name
+		self.curve_type = curve_type
+		self.targets = targets or list()
+		self.times = times or list()
+		self.values = values or list()
+		num_keys = len(self.times)
+		if len(self.values) != num_keys:
+			raise ValueError("Need as many values as times, got %i and %i" % (len(self.values), num_keys))
+		# END verify values
+
+		self.in_types = in_types or [kTangentClamped] * num_keys
+		self.out_types = out_types or [kTangentClamped] * num_keys
+		self.weighted = weighted
+		self.pre_infinity = pre_infinity
+		self.post_infinity = post_infinity
+
+		if in_x is None or in_y is None or out_x is None or out_y is None:
+			self.resolve_tangents()
+		else:
+			self.in_x, self.in_y, self.out_x, self.out_y = in_x, in_y, out_x, out_y
+		# END handle tangents
+		self._segments = None
+
+	def __len__(self):
+		return len(self.times)
+
+	def __repr__(self):
+		return "%s(%r, %i keys)" % (type(self).__name__, self.name, len(self.times))
+
+	#{ Utilities
+
+	def _key_slope(self, index, tangent_type):
+		""":return: slope at the given key index as implied by the tangent type"""
+		times, values = self.times, self.values
+		last = len(times) - 1
+		if tangent_type in (kTangentFlat, kTangentStep, kTangentStepNext) or last < 1:
+			return 0.0
+		# END flat types
+
+		prev_index = max(index - 1, 0)
+		next_index = min(index + 1, last)
+		spline_slope = (values[next_index] - values[prev_index]) / (times[next_index] - times[prev_index])
+		if tangent_type == kTangentClamped:
+			# the tangent is flat if a neighbour has the same value, or if the spline 
+			# tangent would overshoot the value of a neighbour within its segment
+			v = values[index]
+			for neighbour in (prev_index, next_index):
+				if neighbour == index:
+					continue
+				# END skip missing neighbours at the ends
+				vn = values[neighbour]
+				if abs(vn - v) <= 1.0e-9 * max(abs(vn), abs(v), 1.0):
+					return 0.0
+				# END handle equal values
+				handle = v + spline_slope * (times[neighbour] - times[index]) / 3.0
+				if (handle - vn) * (v - vn) < 0.0:
+					return 0.0
+				# END handle overshoot
+			# END for each neighbour
+		elif tangent_type == kTangentPlateau and 0 < index < last:
+			vp, v, vn = values[index - 1], values[index], values[index + 1]
+			# extremes and keys equaling a neighbour are flattened to prevent overshooting
+			if (v - vp) * (vn - v) <= 0.0:
+				return 0.0
+			# END handle extreme
+		elif tangent_type == kTangentPlateau:
+			return 0.0
+		# END handle clamping
+		return spline_slope
+
+	def resolve_tangents(self):
+		"""Compute the tangent vectors of all keys from their tangent types, the way
+		maya would for non-fixed tangents. Fixed tangents are treated as clamped"""
+		times = self.times
+		num_keys = len(times)
+		self.in_x, self.in_y = [1.0] * num_keys, [0.0] * num_keys
+		self.out_x, self.out_y = [1.0] * num_keys, [0.0] * num_keys
+
+		for index in xrange(num_keys):
+			# tangent lengths are a third of the adjacent segment ( for weighted curves )
+			if index:
+				self.in_x[index] = (times[index] - times[index - 1])
+			if index + 1 < num_keys:
+				self.out_x[index] = (times[index + 1] - times[index])
+			# END handle lengths
+			if not index:
+				self.in_x[index] = self.out_x[index]
+			if index + 1 == num_keys:
+				self.out_x[index] = self.in_x[index]
+			# END handle ends
+
+			for types, xs, ys, neighbour in ((self.in_types, self.in_x, self.in_y, index - 1),
+											(self.out_types, self.out_x, self.out_y, index + 1)):
+				ttype = types[index]
+				if ttype == kTangentLinear and 0 <= neighbour < num_keys:
+					slope = (self.values[neighbour] - self.values[index]) / (times[neighbour] - times[index])
+				else:
+					slope = self._key_slope(index, ttype)
+				# END handle linear
+				ys[index] = slope * xs[index]
+			# END for each tangent
+		# END for each key
+		self._segments = None
+
+	def _segment(self, index):
+		""":return: cached coefficients of the segment starting at the key with the given index"""
+		if self._segments is None:
+			self._segments = [None] * max(len(self.times) - 1, 0)
+		# END init cache
+
+		segment = self._segments[index]
+		if segment is not None:
+			return segment
+		# END cache hit
+
+		t0, t1 = self.times[index], self.times[index + 1]
+		v0, v1 = self.values[index], self.values[index + 1]
+		out_type = self.out_types[index]
+		if out_type == kTangentStep:
+			segment = (_kStep, v0)
+		elif out_type == kTangentStepNext:
+			segment = (_kStepNext, v1)
+		elif self.weighted:
+			# control points lie at a third of the tangent vectors, clamped to the segment
+			# to keep x(s) monotonic
+			x1 = min(t0 + self.out_x[index] / 3.0, t1)
+			y1 = v0 + self.out_y[index] / 3.0
+			x2 = max(t1 - self.in_x[index + 1] / 3.0, t0)
+			y2 = v1 - self.in_y[index + 1] / 3.0
+			# power basis coefficients of x(s) and y(s)
+			segment = (_kBezier,
+						t0, t1 - t0 + 3.0 * (x1 - x2), 3.0 * (t0 - 2.0 * x1 + x2), 3.0 * (x1 - t0),
+						v0, v1 - v0 + 3.0 * (y1 - y2), 3.0 * (v0 - 2.0 * y1 + y2), 3.0 * (y1 - v0))
+		else:
+			dt = t1 - t0
+			m0 = _slope(self.out_x[index], self.out_y[index]) * dt
+			m1 = _slope(self.in_x[index + 1], self.in_y[index + 1]) * dt
+			segment = (_kHermite, t0, 1.0 / dt,
+						2.0 * (v0 - v1) + m0 + m1, 3.0 * (v1 - v0) - 2.0 * m0 - m1, m0, v0)
+		# END handle segment kind
+
+		self._segments[index] = segment
+		return segment
+
+	def _evaluate_sorted(self, samples, out):
+		"""Evaluate all given samples, walking our segments once instead of looking 
+		up the segment of each sample
+		
+		:param samples: list of tuple(time, out_index, offset) sorted by time. All 
+			times must be within our first and last key time
+		:param out: list receiving the value at each time plus its offset at the 
+			sample's out_index"""
+		times, values = self.times, self.values
+		last_index = len(times) - 1
+		index = bisect_right(times, samples[0][0]) - 1
+		segment_index = -1
+		kind = segment = None
+		for t, out_index, offset in samples:
+			while index < last_index and times[index + 1] <= t:
+				index += 1
+			# END advance to the segment containing t
+			if index >= last_index:
+				out[out_index] = values[-1] + offset
+				continue
+			# END handle last key
+			
+			if index != segment_index:
+				segment = self._segment(index)
+				kind = segment[0]
+				segment_index = index
+			# END fetch segment
+			
+			if kind == _kHermite:
+				u = (t - segment[1]) * segment[2]
+				value = segment[6] + u * (segment[5] + u * (segment[4] + u * segment[3]))
+			elif kind == _kBezier:
+				u = _solve_bezier(t, segment[1], segment[2], segment[3], segment[4])
+				value = segment[5] + u * (segment[8] + u * (segment[7] + u * segment[6]))
+			elif kind == _kStepNext and t <= times[index]:
+				value = values[index]
+			else:
+				value = segment[1]
+			# END handle kind
+			out[out_index] = value + offset
+		# END for each sample
+
+	def _evaluate_infinity(self, t, infinity, is_pre):
+		""":return: value at time t outside of our key range for the non-cyclic 
+			infinity types kConstant and kLinear"""
+		times, values = self.times, self.values
+		first, last = times[0], times[-1]
+		if infinity == kLinear and first != last:
+			if is_pre:
+				return values[0] + (t - first) * _slope(self.in_x[0], self.in_y[0])
+			return values[-1] + (t - last) * _slope(self.out_x[-1], self.out_y[-1])
+		# END handle linear extrapolation
+		if is_pre:
+			return values[0]
+		return values[-1]
+
+	def _cycle_time(self, t, infinity):
+		""":return: tuple(local_time, offset) with the time within our key range 
+			corresponding to time t outside of it for the given cyclic infinity type, 
+			and the amount to add to the value at local_time"""
+		times, values = self.times, self.values
+		first, last = times[0], times[-1]
+		length = last - first
+		cycle = math.floor((t - first) / length)
+		local_t = t - cycle * length
+		if infinity == kOscillate and int(cycle) % 2:
+			local_t = last - (local_t - first)
+		# END mirror every other cycle
+		
+		offset = 0.0
+		if infinity == kCycleRelative:
+			offset = cycle * (values[-1] - values[0])
+		# END handle relative cycles
+		# guard against rounding errors pushing the time out of the key range
+		return (min(max(local_t, first), last), offset)
+
+	#} END utilities
+
+	#{ Interface
+
+	def sampling(self, tolerance=1.0e-6):
+		""":return: tuple(first_key_time, step) if all keys are spaced evenly, like 
+			the keys of baked animation, or None otherwise. Curves need at least 
+			two keys to be sampled
+		:param tolerance: maximum difference in frames between a key time and its 
+			sampled time"""
+		times = self.times
+		if len(times) < 2:
+			return None
+		# END handle too few keys
+
+		start = times[0]
+		step = (times[-1] - start) / (len(times) - 1)
+		if step <= 0.0:
+			return None
+		# END handle invalid step
+		for index, time in enumerate(times):
+			if abs(time - (start + index * step)) > tolerance:
+				return None
+			# END check time
+		# END for each key
+		return (start, step)
+
+	def content_hash(self):
+		""":return: hex digest identifying the type, keys, tangents and infinity types 
+			of this curve, but not its name or targets. Curves with the same hash 
+			evaluate identically"""
+		sha = hashlib.sha1()
+		sha.update("%s %i %i %i\n" % (self.curve_type, self.weighted, self.pre_infinity, self.post_infinity))
+		for keys in (self.times, self.values, self.in_x, self.in_y, self.out_x, self.out_y):
+			sha.update(array('d', keys).tostring())
+		# END for each key attribute
+		for types in (self.in_types, self.out_types):
+			sha.update(array('i', types).tostring())
+		# END for each tangent type list
+		return sha.hexdigest()
+
+	def time_range(self):
+		""":return: tuple(first_key_time, last_key_time)
+		:raise ValueError: if there are no keys"""
+		if not self.times:
+			raise ValueError("%r has no keys" % self)
+		return (self.times[0], self.times[-1])
+
+	def evaluate(self, times):
+		""":return: list of values of this curve at the given times
+		:param times: iterable of times in frames, in any order"""
+		if not self.times:
+			raise ValueError("Cannot evaluate %r as it has no keys" % self)
+		# END handle empty curve
+
+		first, last = self.times[0], self.times[-1]
+		cyclic = (kCycle, kCycleRelative, kOscillate)
+		out = list()
+		samples = list()
+		for t in times:
+			infinity = None
+			if t < first:
+				infinity = self.pre_infinity
+			elif t > last:
+				infinity = self.post_infinity
+			# END find infinity
+			
+			if infinity is None:
+				samples.append((t, len(out), 0.0))
+				out.append(None)
+			elif infinity in cyclic and first != last:
+				local_t, offset = self._cycle_time(t, infinity)
+				samples.append((local_t, len(out), offset))
+				out.append(None)
+			else:
+				out.append(self._evaluate_infinity(t, infinity, t < first))
+			# END handle infinity
+		# END for each time
+		
+		if samples:
+			samples.sort()
+			self._evaluate_sorted(samples, out)
+		# END evaluate samples within the key range
+		return out
+
+	#} END interface
+
+
+#{ Interface
+
+def evaluate( curves, times ):
+	"""Evaluate all given curves at all given times at once
+
+	:param curves: iterable of ``CurveData`` instances
+	:param times: sequence of times in frames
+	:return: list of lists of values, one list per curve, each with one value per time"""
+	if not isinstance(times, (list, tuple)):
+		times = list(times)
+	# END assure we can iterate times multiple times
+	return [curve.evaluate(times) for curve in curves]
+
+#} END interface
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""Contains utilities to find the differences between two sets of animation,
+matching curves by the plugs they drive.
+
+It can be used as command line tool, run it with --help for more information"""
+__docformat__ = "restructuredtext"
+
+from animio.clip import supports_file, read_clips
+
+import sys
+
+__all__ = ('ChannelDiff', 'DiffReport', 'diff_curves', 'diff')
+
+
+#{ Utilities
+
+def _lists_close( a, b, tolerance ):
+	""":return: True if both sequences have the same length and all their items
+		differ by no more than tolerance"""
+	if len(a) != len(b):
+		return False
+	if a == b:
+		return True
+	# END quick checks
+	for x, y in zip(a, b):
+		if abs(x - y) > tolerance:
+			return False
+	# END for each item pair
+	return True
+
+def _keys_close( a, b, tolerance ):
+	""":return: True if the keys and tangents of both ``CurveData`` instances are
+		equal within the given tolerance"""
+	if a.weighted != b.weighted or a.pre_infinity != b.pre_infinity or \
+		a.post_infinity != b.post_infinity or a.in_types != b.in_types or a.out_types != b.out_types:
+		return False
+	# END compare curve attributes
+	for attr in ('times', 'values', 'in_x', 'in_y', 'out_x', 'out_y'):
+		if not _lists_close(getattr(a, attr), getattr(b, attr), tolerance):
+			return False
+	# END for each key array
+	return True
+
+def _sample_times( a, b ):
+	""":return: sorted list of times at which to compare both curves - all key times
+		and the middle of each segment between them, repeated one key range before 
+		and after it to cover a full cycle of the infinity of either curve"""
+	times = sorted(set(a.times).union(b.times))
+	samples = list()
+	for index, time in enumerate(times):
+		samples.append(time)
+		if index + 1 < len(times):
+			samples.append((time + times[index + 1]) * 0.5)
+		# END add segment middle
+	# END for each key time
+	
+	span = (times[-1] - times[0]) or 1.0
+	return [t - span for t in samples] + samples + [t + span for t in samples]
+
+def _target_map( curves ):
+	""":return: dict(target_plug_name: CurveData) of the given curves"""
+	out = dict()
+	for curve in curves:
+		for target in curve.targets:
+			out[target] = curve
+		# END for each target
+	# END for each curve
+	return out
+
+def _load_curves( item ):
+	""":return: list of ``CurveData`` instances of the given item, which may be
+		a file path, an object providing ``iter_curve_data``, or an iterable of
+		``CurveData`` instances"""
+	if isinstance(item, basestring) and supports_file(item):
+		out = list()
+		for clip in read_clips(item):
+			out.extend(clip.curves)
+		# END for each clip
+		return out
+	elif isinstance(item, basestring):
+		# requires maya, hence we import it only if needed
+		from animio.lib import AnimationHandle
+		ahref, handles = AnimationHandle.from_file(item)
+		try:
+			out = list()
+			for handle in handles:
+				out.extend(handle.iter_curve_data())
+			# END for each handle
+			return out
+		finally:
+			ahref.remove()
+		# END assure reference is removed
+	elif hasattr(item, 'iter_curve_data'):
+		return list(item.iter_curve_data())
+	# END handle item type
+	return list(item)
+
+#} END utilities
+
+
+class ChannelDiff( object ):
+	"""Describes how the animation of a single target plug differs, or how its 
+	keys differ if it was rekeyed without changing its shape"""
+
+	def __init__(self, target, curve_a, curve_b, keys_changed, max_deviation):
+		#: name of the target plug
+		self.target = target
+		#: name of the curve driving the target on either side
+		self.curve_a = curve_a
+		self.curve_b = curve_b
+		#: True if key times, values or tangents differ
+		self.keys_changed = keys_changed
+		#: the largest difference of the sampled values
+		self.max_deviation = max_deviation
+
+	def __repr__(self):
+		return "%s(%r, max_deviation=%g)" % (type(self).__name__, self.target, self.max_deviation)
+
+	def to_dict(self):
+		""":return: dictionary with all our information"""
+		return dict(target=self.target, curve_a=self.curve_a, curve_b=self.curve_b,
+					keys_changed=self.keys_changed, max_deviation=self.max_deviation)
+
+
+class DiffReport( object ):
+	"""Structured result of a comparison of animation a with animation b"""
+
+	def __init__(self):
+		#: sorted list of target names animated only in b
+		self.added = list()
+		#: sorted list of target names animated only in a
+		self.removed = list()
+		#: list of ChannelDiff instances sorted by target name
+		self.modified = list()
+		#: list of ChannelDiff instances sorted by target name, of targets whose keys, 
+		#: tangents or infinity types changed, but which still evaluate to the same 
+		#: values within the tolerance
+		self.rekeyed = list()
+		#: amount of targets whose animation did not change
+		self.num_unchanged = 0
+
+	def __nonzero__(self):
+		""":return: True if there are differences in the animation. Rekeyed targets 
+			do not count as their animation did not change"""
+		return bool(self.added or self.removed or self.modified)
+
+	def max_deviation(self):
+		""":return: the largest deviation of all modified channels"""
+		return max([0.0] + [c.max_deviation for c in self.modified])
+
+	def to_dict(self):
+		""":return: dictionary with all our information, suitable for serialization"""
+		return dict(added=self.added, removed=self.removed, num_unchanged=self.num_unchanged,
+					modified=[c.to_dict() for c in self.modified], 
+					rekeyed=[c.to_dict() for c in self.rekeyed])
+
+	def format(self):
+		""":return: human readable string describing all differences"""
+		lines = list()
+		for target in self.added:
+			lines.append("+ %s" % target)
+		for target in self.removed:
+			lines.append("- %s" % target)
+		for channel in self.modified:
+			lines.append("~ %s (max deviation %g)" % (channel.target, channel.max_deviation))
+		for channel in self.rekeyed:
+			lines.append("= %s (rekeyed)" % channel.target)
+		# END for each difference
+		lines.append("%i added, %i removed, %i modified, %i rekeyed, %i unchanged" %
+						(len(self.added), len(self.removed), len(self.modified), 
+						len(self.rekeyed), self.num_unchanged))
+		return '\n'.join(lines)
+
+
+#{ Interface
+
+def diff_curves( curves_a, curves_b, tolerance=1.0e-5 ):
+	"""Compare two sets of animation curves, matching them by their targets
+
+	:param curves_a: iterable of ``CurveData`` instances
+	:param curves_b: iterable of ``CurveData`` instances
+	:param tolerance: maximum difference at which key attributes and sampled values
+		are still considered equal
+	:return: ``DiffReport`` instance
+	:note: curves are compared by their keys, tangents and infinity types first. 
+		Targets of curves which differ are sampled, including the infinity before 
+		and after the keys, and reported as rekeyed if all samples are within 
+		the tolerance"""
+	map_a = _target_map(curves_a)
+	map_b = _target_map(curves_b)
+	report = DiffReport()
+	report.added = sorted(t for t in map_b if t not in map_a)
+	report.removed = sorted(t for t in map_a if t not in map_b)
+
+	# curves with multiple targets are compared only once per pair
+	compared = dict()
+	for target in sorted(t for t in map_a if t in map_b):
+		a, b = map_a[target], map_b[target]
+		pair = (id(a), id(b))
+		result = compared.get(pair)
+		if result is None:
+			keys_changed = not _keys_close(a, b, tolerance)
+			max_deviation = 0.0
+			if keys_changed and a.times and b.times:
+				samples = _sample_times(a, b)
+				for va, vb in zip(a.evaluate(samples), b.evaluate(samples)):
+					max_deviation = max(max_deviation, abs(va - vb))
+				# END for each sample
+			elif keys_changed:
+				# one of the curves has no keys at all
+				max_deviation = max([abs(v) for v in a.values + b.values] + [0.0])
+			# END compare values
+			result = compared[pair] = (keys_changed, max_deviation)
+		# END compute difference
+
+		keys_changed, max_deviation = result
+		if keys_changed and max_deviation > tolerance:
+			report.modified.append(ChannelDiff(target, a.name, b.name, keys_changed, max_deviation))
+		elif keys_changed:
+			report.rekeyed.append(ChannelDiff(target, a.name, b.name, keys_changed, max_deviation))
+		else:
+			report.num_unchanged += 1
+		# END handle result
+	# END for each common target
+	return report
+
+def diff( a, b, tolerance=1.0e-5 ):
+	"""Compare the animation of a with the one of b
+
+	:param a: path to a file written by ``AnimInOutLibrary.export``, or an
+		``AnimationHandle``, or an iterable of ``CurveData`` instances
+	:param b: see a
+	:param tolerance: see ``diff_curves``
+	:return: ``DiffReport`` instance
+	:note: loading files requires maya"""
+	return diff_curves(_load_curves(a), _load_curves(b), tolerance)
+
+#} END interface
+
+
+#{ Command Line
+
+def main( args ):
+	"""Compare two animation files and print the differences
+
+	:param args: command line arguments without the program name
+	:return: exit code, 0 if there are no differences, 1 if there are differences"""
+	from optparse import OptionParser
+	parser = OptionParser(usage="%prog [options] file_a file_b",
+							description="Print the differences between the animation of two AnimIO files")
+	parser.add_option("-t", "--tolerance", type="float", default=1.0e-5,
+						help="maximum difference at which values are considered equal")
+	parser.add_option("-j", "--json", action="store_true", default=False,
+						help="print the report as json")
+	options, files = parser.parse_args(args)
+	if len(files) != 2:
+		parser.error("Please specify exactly two files")
+	# END check arguments
+	
+	# files we cannot parse are referenced, which needs a maya session
+	maya_files = [f for f in files if not supports_file(f)]
+	if maya_files:
+		try:
+			import maya.standalone
+		except ImportError:
+			parser.error("Reading %s requires maya, please run this tool using mayapy" % ', '.join(maya_files))
+		# END handle missing maya
+		maya.standalone.initialize()
+	# END initialize maya
+
+	report = diff(files[0], files[1], options.tolerance)
+	if options.json:
+		import json
+		print json.dumps(report.to_dict(), indent=1)
+	else:
+		print report.format()
+	# END handle output format
+	return int(bool(report))
+
+#} END command line
+
+if __name__ == "__main__":
+	sys.exit(main(sys.argv[1:]))
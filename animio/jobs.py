@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""Contains a scheduler executing chunked jobs whenever the host application is idle.
+This allows long running operations, like the export or import of large amounts of
+animation, to report their progress and to be cancelled without blocking the user
+interface"""
+__docformat__ = "restructuredtext"
+
+import time
+import logging
+log = logging.getLogger("animio.jobs")
+
+__all__ = ('IdleEventLoop', 'MayaIdleEventLoop', 'ManualEventLoop', 'Job', 'JobScheduler')
+
+
+#{ Event Loops
+
+class IdleEventLoop( object ):
+	"""Interface of an event loop which repeatedly calls registered callbacks
+	while the application is idle"""
+
+	def add_idle_callback(self, callback):
+		"""Register the given callable to be called without arguments whenever
+		the application is idle
+
+		:return: id identifying the registered callback"""
+		raise NotImplementedError("To be implemented in subclass")
+
+	def remove_idle_callback(self, callback_id):
+		"""Deregister the callback with the given id as previously returned by
+		``add_idle_callback``"""
+		raise NotImplementedError("To be implemented in subclass")
+
+
+class MayaIdleEventLoop( IdleEventLoop ):
+	"""Uses maya's idle event to drive the callbacks"""
+
+	def add_idle_callback(self, callback):
+		import maya.cmds as cmds
+		return cmds.scriptJob(idleEvent=callback)
+
+	def remove_idle_callback(self, callback_id):
+		import maya.cmds as cmds
+		if cmds.scriptJob(exists=callback_id):
+			cmds.scriptJob(kill=callback_id, force=True)
+		# END if job still exists
+
+
+class ManualEventLoop( IdleEventLoop ):
+	"""Stand-in event loop for headless operation and testing - callbacks are only
+	called once ``process_events`` is invoked"""
+
+	def __init__(self):
+		self._callbacks = dict()
+		self._next_id = 0
+
+	def add_idle_callback(self, callback):
+		self._next_id += 1
+		self._callbacks[self._next_id] = callback
+		return self._next_id
+
+	def remove_idle_callback(self, callback_id):
+		self._callbacks.pop(callback_id, None)
+
+	def has_callbacks(self):
+		""":return: True if at least one callback is registered"""
+		return bool(self._callbacks)
+
+	def process_events(self, count=1):
+		"""Simulate count idle events, calling all registered callbacks each time
+
+		:return: number of idle events which actually reached at least one callback"""
+		processed = 0
+		for i in xrange(count):
+			if not self._callbacks:
+				break
+			# END bail out early
+			for callback in self._callbacks.values():
+				callback()
+			# END for each callback
+			processed += 1
+		# END for each event
+		return processed
+
+#} END event loops
+
+
+class Job( object ):
+	"""A unit of work implemented by a generator function. Each iteration of the
+	generator performs one chunk of work and yields the current progress as float
+	between 0.0 and 1.0.
+
+	:note: cancelling a job closes its generator, which allows it to revert
+		its changes in ``finally`` blocks"""
+
+	#{ States
+	kQueued, kRunning, kFinished, kCancelled, kFailed = range(5)
+	#} END states
+
+	def __init__(self, name, generator_func, *args, **kwargs):
+		"""Initialize this instance
+
+		:param name: name of the job as displayed to the user
+		:param generator_func: function returning a generator as described in the
+			class documentation when called with *args and **kwargs"""
+		self.name = name
+		self.progress = 0.0
+		self.state = self.kQueued
+		self.error = None
+		self._func = generator_func
+		self._args = args
+		self._kwargs = kwargs
+		self._gen = None
+
+	def __repr__(self):
+		return "%s(%r)" % (type(self).__name__, self.name)
+
+	#{ Interface
+
+	def step(self):
+		"""Perform the next chunk of work
+
+		:return: True if there is more work to be done, False if the job is done
+		:raise Exception: any exception raised by the job, which is marked
+			failed in that case"""
+		if self.is_done():
+			return False
+		# END handle finished jobs
+
+		if self._gen is None:
+			self._gen = self._func(*self._args, **self._kwargs)
+			self.state = self.kRunning
+		# END start job lazily
+
+		try:
+			self.progress = min(max(float(self._gen.next()), 0.0), 1.0)
+		except StopIteration:
+			self.progress = 1.0
+			self.state = self.kFinished
+			return False
+		except Exception, e:
+			self.error = e
+			self.state = self.kFailed
+			raise
+		# END handle step
+		return True
+
+	def cancel(self):
+		"""Stop the job, it will not do any more work"""
+		if self.is_done():
+			return
+		# END skip finished jobs
+
+		if self._gen is not None:
+			self._gen.close()
+		# END abort running generator
+		self.state = self.kCancelled
+
+	def is_done(self):
+		""":return: True if the job will not do any more work"""
+		return self.state in (self.kFinished, self.kCancelled, self.kFailed)
+
+	#} END interface
+
+
+class JobScheduler( object ):
+	"""Runs queued jobs one after another, processing as many chunks as fit into
+	the configured time slice each time the application is idle.
+
+	Callbacks registered in the ``progress_callbacks``, ``finished_callbacks``
+	and ``queue_callbacks`` lists are called with the affected job whenever it
+	made progress, when it is done or when the job queue changes respectively."""
+
+	def __init__(self, event_loop=None, time_slice=0.05):
+		"""Initialize this instance
+
+		:param event_loop: ``IdleEventLoop`` instance driving the scheduler,
+			defaults to the ``MayaIdleEventLoop``
+		:param time_slice: time in seconds we may spend working per idle event"""
+		if event_loop is None:
+			event_loop = MayaIdleEventLoop()
+		# END default event loop
+		self._loop = event_loop
+		self._queue = list()
+		self._callback_id = None
+		self.time_slice = time_slice
+
+		self.progress_callbacks = list()
+		self.finished_callbacks = list()
+		self.queue_callbacks = list()
+
+	#{ Utilities
+
+	def _notify(self, callbacks, job):
+		for callback in callbacks:
+			try:
+				callback(job)
+			except Exception:
+				log.error("Callback %r failed for job %r" % (callback, job), exc_info=True)
+			# END ignore callback errors
+		# END for each callback
+
+	def _update_registration(self):
+		"""Assure we only receive idle events while there is work to be done"""
+		if self._queue and self._callback_id is None:
+			self._callback_id = self._loop.add_idle_callback(self._on_idle)
+		elif not self._queue and self._callback_id is not None:
+			self._loop.remove_idle_callback(self._callback_id)
+			self._callback_id = None
+		# END handle registration
+
+	def _process_current(self):
+		"""Process the current job once and handle its completion
+
+		:return: True if the current job is still in progress"""
+		job = self._queue[0]
+		try:
+			more = job.step()
+		except Exception:
+			log.error("Job %r failed" % job, exc_info=True)
+			more = False
+		# END handle job failure
+
+		if more:
+			self._notify(self.progress_callbacks, job)
+			return True
+		# END handle progress
+
+		self._queue.pop(0)
+		self._notify(self.finished_callbacks, job)
+		self._notify(self.queue_callbacks, job)
+		return False
+
+	#} END utilities
+
+	#{ Callbacks
+
+	def _on_idle(self):
+		"""Perform as much work as fits into our time slice"""
+		start = time.time()
+		while self._queue:
+			self._process_current()
+			if time.time() - start >= self.time_slice:
+				break
+			# END time slice exhausted
+		# END while there is work
+		self._update_registration()
+
+	#} END callbacks
+
+	#{ Interface
+
+	def submit(self, job):
+		"""Queue the given job for execution
+
+		:return: job"""
+		self._queue.append(job)
+		self._update_registration()
+		self._notify(self.queue_callbacks, job)
+		return job
+
+	def cancel(self, job=None):
+		"""Cancel the given job, or the currently running one if job is None
+
+		:return: the cancelled job or None if there was nothing to cancel"""
+		if job is None:
+			if not self._queue:
+				return None
+			job = self._queue[0]
+		# END get current job
+
+		if job not in self._queue:
+			return None
+		# END handle unknown jobs
+
+		job.cancel()
+		self._queue.remove(job)
+		self._update_registration()
+		self._notify(self.finished_callbacks, job)
+		self._notify(self.queue_callbacks, job)
+		return job
+
+	def cancel_all(self):
+		"""Cancel all queued jobs, including the running one
+
+		:return: list of cancelled jobs"""
+		out = list()
+		while self._queue:
+			out.append(self.cancel(self._queue[-1]))
+		# END for each job
+		return out
+
+	def flush(self):
+		"""Run all queued jobs to completion, blocking the caller"""
+		while self._queue:
+			self._process_current()
+		# END while there are jobs
+		self._update_registration()
+
+	def current_job(self):
+		""":return: the job currently being processed, or None"""
+		if self._queue:
+			return self._queue[0]
+		return None
+
+	def jobs(self):
+		""":return: list of all jobs in the queue, the first one is the current one"""
+		return list(self._queue)
+
+	def is_busy(self):
+		""":return: True if there are jobs to be processed"""
+		return bool(self._queue)
+
+	#} END interface
@@ -3,63 +3,1102 @@
 of animation."""
 __docformat__ = "restructuredtext"
 
+from animio import _assure_mrv_is_available
+_assure_mrv_is_available()
+
+from animio.curve import CurveData
+from animio.cache import clip_cache
+from animio.clip import (ClipData, ClipWriter, is_native_file, parse_layer_info, format_layer_info, 
+						parse_take_info, format_take_info)
+from animio.shard import Manifest, is_manifest_file, shard_path, plan_shards, iter_load_shards, kByNamespace
+from animio.plan import AssignmentPlan, fingerprint
+
 import mrv.maya.nt as nt
 from mrv.maya.ns import Namespace
 from mrv.maya.ref import FileReference
 from mrv.maya.scene import Scene
-from mrv.maya.undo import UndoRecorder
+from mrv.maya.undo import UndoRecorder, DGModifier, Operation
 from mrv.path import Path
 
 import maya.OpenMayaAnim as apianim
 import maya.cmds as cmds
 
+from itertools import islice
+from bisect import bisect_left
 import logging
 log = logging.getLogger("animio.lib")
 
-__all__ = ('AnimInOutLibrary', 'AnimationHandle')
+__all__ = ('AnimInOutLibrary', 'AnimationHandle', 'Assignment', 'AnimationDiscovery', 'animation_discovery', 
+			'CurveHashes', 'curve_hashes')
+
+
+#{ Utilities
+
+def _unique_node_names( iter_plugs ):
+	""":return: list of unique names of the nodes of the given plugs, in order of 
+		their first occurrence. Null plugs are ignored
+	:param iter_plugs: iterable yielding MPlugs"""
+	mfndep = nt.api.MFnDependencyNode()
+	seen = set()
+	out = list()
+	for plug in iter_plugs:
+		if plug.isNull():
+			continue
+		# END skip null plugs
+		mfndep.setObject(plug.node())
+		name = mfndep.name()
+		if name not in seen:
+			seen.add(name)
+			out.append(name)
+		# END handle new name
+	# END for each plug
+	return out
+
+def _key_inputs( mfncurve ):
+	""":return: list of the inputs of all keys of the curve attached to the given 
+		MFnAnimCurve, which are times in the current time unit, or the unitless 
+		inputs of curves driven by other plugs"""
+	if mfncurve.isUnitlessInput():
+		return [mfncurve.unitlessInput(kindex) for kindex in xrange(mfncurve.numKeys())]
+	# END handle driven keys
+	unit = nt.api.MTime.uiUnit()
+	return [mfncurve.time(kindex).asUnits(unit) for kindex in xrange(mfncurve.numKeys())]
+
+def _double_array( values ):
+	""":return: MDoubleArray with the given floats, filled in one call"""
+	num_values = len(values)
+	if not num_values:
+		return nt.api.MDoubleArray()
+	# END handle empty lists
+	util = nt.api.MScriptUtil()
+	util.createFromList([float(v) for v in values], num_values)
+	return nt.api.MDoubleArray(util.asDoublePtr(), num_values)
+
+def _write_keys( mfncurve, times, values, in_types, out_types, change=None ):
+	"""Add the given keys to the curve attached to the given MFnAnimCurve. Existing 
+	keys at different times are kept, keys at the same time are overwritten. 
+	Keys are added in bulk, using one addKeys call per combination of tangent 
+	types, of which there usually is only one.
+	
+	:param times: sorted list of key times in the current time unit, or of the 
+		inputs of curves driven by other plugs
+	:param values: list of key values
+	:param in_types: list of in tangent types per key
+	:param out_types: list of out tangent types per key
+	:param change: if not None, MAnimCurveChange recording all edits to allow undo
+	:return: list with the index of each given key within the curve afterwards
+	:note: fixed tangents are recomputed by maya, see ``_write_curve_data``
+	:note: maya cannot add the keys of curves driven by other plugs in bulk"""
+	if not times:
+		return list()
+	# END nothing to do
+	existing_times = _key_inputs(mfncurve)
+	
+	if mfncurve.isUnitlessInput():
+		for input, value, in_type, out_type in zip(times, values, in_types, out_types):
+			if mfncurve.numKeys():
+				kindex = mfncurve.findClosest(input)
+				if mfncurve.unitlessInput(kindex) == input:
+					mfncurve.remove(kindex, change)
+				# END overwrite keys at the same input
+			# END if there are keys
+			mfncurve.addKey(input, value, in_type, out_type, change)
+		# END for each key
+	else:
+		keys_by_types = dict()
+		for kindex, types in enumerate(zip(in_types, out_types)):
+			keys_by_types.setdefault(types, list()).append(kindex)
+		# END for each key
+		
+		unit = nt.api.MTime.uiUnit()
+		for (in_type, out_type), kindices in keys_by_types.iteritems():
+			mtimes = nt.api.MTimeArray(len(kindices), nt.api.MTime())
+			for aindex, kindex in enumerate(kindices):
+				mtimes.set(nt.api.MTime(times[kindex], unit), aindex)
+			# END for each key
+			mfncurve.addKeys(mtimes, _double_array([values[k] for k in kindices]), 
+								in_type, out_type, True, change)
+		# END for each combination of tangent types
+	# END handle input type
+	
+	if not existing_times:
+		return range(len(times))
+	# END handle empty curves
+	merged_times = sorted(set(existing_times).union(times))
+	return [bisect_left(merged_times, time) for time in times]
+
+def _set_plug_value( mod, plug, value ):
+	"""Record an operation on the given MDGModifier which sets the numeric plug 
+	to the given value, which is given in internal units"""
+	attr = plug.attribute()
+	if attr.hasFn(nt.api.MFn.kEnumAttribute):
+		mod.newPlugValueInt(plug, int(round(value)))
+	elif attr.hasFn(nt.api.MFn.kNumericAttribute):
+		unit_type = nt.api.MFnNumericAttribute(attr).unitType()
+		if unit_type == nt.api.MFnNumericData.kBoolean:
+			mod.newPlugValueBool(plug, value >= 0.5)
+		elif unit_type in _integer_types:
+			mod.newPlugValueInt(plug, int(round(value)))
+		else:
+			mod.newPlugValueDouble(plug, value)
+		# END handle numeric types
+	else:
+		mod.newPlugValueDouble(plug, value)
+	# END handle attribute type
+
+def _unique_plug_name( plug ):
+	""":return: name of the given plug using the full path of its node if it is a 
+		dag node. Unlike the plug's name, it is unique within the scene"""
+	node = plug.node()
+	attr = plug.partialName(False, True, True, False, True, True)
+	if node.hasFn(nt.api.MFn.kDagNode):
+		return "%s.%s" % (nt.api.MFnDagNode(node).fullPathName(), attr)
+	# END handle dag nodes
+	return "%s.%s" % (nt.api.MFnDependencyNode(node).name(), attr)
+
+def _split_connected( assignments ):
+	""":return: tuple(list of assignments to connect, amount of skipped assignments). 
+		Assignments whose target is already connected to their source are skipped
+	:param assignments: iterable of tuple(source_plug, target_plug)"""
+	inputs = nt.api.MPlugArray()
+	out = list()
+	num_skipped = 0
+	for s_plug, t_plug in assignments:
+		t_plug.connectedTo(inputs, True, False)
+		if inputs.length() and inputs[0] == s_plug:
+			num_skipped += 1
+			continue
+		# END skip existing connections
+		out.append((s_plug, t_plug))
+	# END for each assignment
+	return (out, num_skipped)
+
+def _split_identical( assignments ):
+	""":return: tuple(list of assignments to apply, amount of skipped assignments). 
+		Assignments whose target is driven by another animation curve with the same 
+		content as their source curve are skipped, see ``CurveHashes``
+	:param assignments: iterable of tuple(source_plug, target_plug)"""
+	hashes = curve_hashes()
+	inputs = nt.api.MPlugArray()
+	out = list()
+	num_skipped = 0
+	for s_plug, t_plug in assignments:
+		t_plug.connectedTo(inputs, True, False)
+		if inputs.length():
+			tnode = inputs[0].node()
+			snode = s_plug.node()
+			if tnode != snode and tnode.hasFn(nt.api.MFn.kAnimCurve) and hashes.get(tnode) == hashes.get(snode):
+				num_skipped += 1
+				continue
+			# END skip identical curves
+		# END if target is connected
+		out.append((s_plug, t_plug))
+	# END for each assignment
+	return (out, num_skipped)
+
+def _read_curve_data( mfncurve, targets ):
+	""":return: ``CurveData`` instance describing all keys of the curve attached to 
+		the given MFnAnimCurve
+	:param targets: list of target plug names of the curve"""
+	unit = nt.api.MTime.uiUnit()
+	frames_per_second = nt.api.MTime(1.0, nt.api.MTime.kSeconds).asUnits(unit)
+	unitless = mfncurve.isUnitlessInput()
+	if unitless:
+		# tangents of curves driven by other plugs are measured in input units
+		frames_per_second = 1.0
+	# END handle driven keys
+	
+	xutil, yutil = nt.api.MScriptUtil(), nt.api.MScriptUtil()
+	xptr, yptr = xutil.asFloatPtr(), yutil.asFloatPtr()
+	getfloat = nt.api.MScriptUtil.getFloat
+	
+	num_keys = mfncurve.numKeys()
+	times, values = list(), list()
+	in_types, out_types = list(), list()
+	in_x, in_y, out_x, out_y = list(), list(), list(), list()
+	for kindex in xrange(num_keys):
+		if unitless:
+			times.append(mfncurve.unitlessInput(kindex))
+		else:
+			times.append(mfncurve.time(kindex).asUnits(unit))
+		# END handle input type
+		values.append(mfncurve.value(kindex))
+		in_types.append(mfncurve.inTangentType(kindex))
+		out_types.append(mfncurve.outTangentType(kindex))
+		
+		# tangent x values are given in seconds
+		mfncurve.getTangent(kindex, xptr, yptr, True)
+		in_x.append(getfloat(xptr) * frames_per_second)
+		in_y.append(getfloat(yptr))
+		mfncurve.getTangent(kindex, xptr, yptr, False)
+		out_x.append(getfloat(xptr) * frames_per_second)
+		out_y.append(getfloat(yptr))
+	# END for each key
+	
+	return CurveData(mfncurve.name(), mfncurve.typeName(), targets, times, values, 
+						in_types, out_types, in_x, in_y, out_x, out_y, mfncurve.isWeighted(), 
+						mfncurve.preInfinityType(), mfncurve.postInfinityType())
+
+def _write_curve_data( mfncurve, curve_data, fps, change=None ):
+	"""Write keys, tangents and infinity types of the given ``CurveData`` into the 
+	curve attached to the given MFnAnimCurve. Existing keys at other times are kept, 
+	keys at the same time are overwritten, see ``_write_keys``
+	
+	:param fps: frames per second of the time unit the key times are given in
+	:param change: see ``_write_keys``
+	:note: only fixed tangents are set explicitly, including their weights, all 
+		others are computed by maya
+	:note: the infinity types are only set if the written keys become the first 
+		or last keys of the curve. Curves become weighted if the curve data is"""
+	cd = curve_data
+	if not mfncurve.numKeys():
+		mfncurve.setIsWeighted(cd.weighted, change)
+	elif cd.weighted and not mfncurve.isWeighted():
+		mfncurve.setIsWeighted(True, change)
+	# END handle weights
+	
+	seconds_per_frame = 1.0
+	times = cd.times
+	if not mfncurve.isUnitlessInput():
+		seconds_per_frame = 1.0 / fps
+		time_factor = nt.api.MTime(seconds_per_frame, nt.api.MTime.kSeconds).asUnits(nt.api.MTime.uiUnit())
+		if time_factor != 1.0:
+			times = [t * time_factor for t in times]
+		# END convert time unit
+	# END handle input type
+	kindices = _write_keys(mfncurve, times, cd.values, cd.in_types, cd.out_types, change)
+	if not kindices:
+		return
+	# END nothing was written
+	
+	fixed = apianim.MFnAnimCurve.kTangentFixed
+	for index, (in_type, out_type) in enumerate(zip(cd.in_types, cd.out_types)):
+		if in_type != fixed and out_type != fixed:
+			continue
+		# END skip computed tangents
+		kindex = kindices[index]
+		mfncurve.setTangentsLocked(kindex, False, change)
+		if in_type == fixed:
+			mfncurve.setTangent(kindex, cd.in_x[index] * seconds_per_frame, cd.in_y[index], True, change)
+		if out_type == fixed:
+			mfncurve.setTangent(kindex, cd.out_x[index] * seconds_per_frame, cd.out_y[index], False, change)
+	# END for each key with fixed tangents
+	
+	if kindices[0] == 0:
+		mfncurve.setPreInfinityType(cd.pre_infinity, change)
+	if kindices[-1] == mfncurve.numKeys() - 1:
+		mfncurve.setPostInfinityType(cd.post_infinity, change)
+	# END handle infinity
+
+def _current_fps():
+	""":return: frames per second of the current time unit"""
+	return nt.api.MTime(1.0, nt.api.MTime.kSeconds).asUnits(nt.api.MTime.uiUnit())
+
+def _create_curves( curve_datas, fps=None, plugs=None ):
+	""":return: list of MObjects of new animation curves, one for each of the given 
+		``CurveData`` instances. All curves are created by a single undoable 
+		DGModifier, their keys are added in bulk, see ``_write_keys``, and recorded 
+		by an ``_AnimCurveChange``
+	:param fps: frames per second of the time unit the key times are given in, or 
+		None to use the current time unit
+	:param plugs: if not None, list with a plug for each curve data, which will be
+		driven by the respective new curve. The curve's type is derived from the plug 
+		and maya names the curve after it. Otherwise the curves remain unconnected 
+		and are named like their curve data, without namespace"""
+	if fps is None:
+		fps = _current_fps()
+	# END use current time unit
+	mod = DGModifier()
+	mfncurve = apianim.MFnAnimCurve()
+	objects = list()
+	for index, cd in enumerate(curve_datas):
+		if plugs is None:
+			curve_type = getattr(apianim.MFnAnimCurve, 'k' + cd.curve_type[0].upper() + cd.curve_type[1:])
+			obj = mfncurve.create(curve_type, mod)
+			mod.renameNode(obj, cd.name.split(':')[-1])
+		else:
+			obj = mfncurve.create(plugs[index], mod)
+		# END handle connection
+		objects.append(obj)
+	# END for each curve to create
+	mod.doIt()
+	
+	# the keys are recorded after the curves were created, hence they are undone first
+	change = _AnimCurveChange()
+	for obj, cd in zip(objects, curve_datas):
+		mfncurve.setObject(obj)
+		_write_curve_data(mfncurve, cd, fps, change.change)
+	# END for each curve
+	return objects
+
+def _is_intermediate( mfndep ):
+	""":return: True if the node attached to the given MFnDependencyNode passes 
+		animation through to other plugs, like pairBlends, mute nodes and the 
+		blend nodes of animation layers"""
+	type_name = mfndep.typeName()
+	return type_name in ('pairBlend', 'mute') or type_name.startswith('animBlendNode')
+	
+def _intermediate_output_name( input_name ):
+	""":return: long name of the output attribute of an intermediate node which 
+		is driven by the input attribute with the given long name, or None if the 
+		input does not pass its value through, like blend weights"""
+	if input_name == 'input':
+		# mute
+		return 'output'
+	elif input_name.startswith('input') and input_name[5:6] in ('A', 'B'):
+		# animBlendNode*, inputA -> output, inputAX -> outputX
+		return 'output' + input_name[6:]
+	elif input_name.startswith('in') and input_name[-1] in ('1', '2'):
+		# pairBlend, inTranslateX1 -> outTranslateX
+		return 'out' + input_name[2:-1]
+	# END handle node types
+	return None
+	
+
+class _AnimCurveChange( Operation ):
+	"""Undoable operation holding an MAnimCurveChange, which records the key edits 
+	done through MFnAnimCurve. Pass its ``change`` to the respective methods"""
+	
+	def __init__(self):
+		Operation.__init__(self)
+		self.change = apianim.MAnimCurveChange()
+		
+	def doIt(self):
+		self.change.redoIt()
+		
+	def undoIt(self):
+		self.change.undoIt()
+
+
+class _TargetResolver( object ):
+	"""Finds the plugs ultimately driven by animation curves, walking through 
+	intermediate nodes. The targets of each intermediate output are cached, hence 
+	curves sharing intermediates, like the curves of animation layers, cause them
+	to be traversed only once"""
+	
+	def __init__(self):
+		self._cache = dict()
+		self._mfndep = nt.api.MFnDependencyNode()
+		self._mfnattr = nt.api.MFnAttribute()
+	
+	def targets(self, output_plug):
+		""":return: list of tuple(target_plug_name, chain) of all plugs driven by 
+			the given output plug. chain is a tuple of the names of the intermediate 
+			input plugs on the way to the target, starting with the one connected 
+			to output_plug"""
+		mfndep = self._mfndep
+		out = list()
+		for dplug in output_plug.moutputs():
+			mfndep.setObject(dplug.node())
+			if not _is_intermediate(mfndep):
+				out.append((dplug.mfullyQualifiedName(), tuple()))
+				continue
+			# END handle final targets
+			
+			self._mfnattr.setObject(dplug.attribute())
+			output_name = _intermediate_output_name(self._mfnattr.name())
+			if output_name is None:
+				continue
+			# END skip weights and other controls
+			
+			key = mfndep.name() + '.' + output_name
+			targets = self._cache.get(key)
+			if targets is None:
+				# prevent endless recursion in case of cycles
+				self._cache[key] = list()
+				targets = self._cache[key] = self.targets(mfndep.findPlug(output_name))
+			# END traverse intermediate
+			
+			input_name = dplug.mfullyQualifiedName()
+			out.extend((target, (input_name, ) + chain) for target, chain in targets)
+		# END for each destination
+		return out
+
+def _to_objects( node_names ):
+	""":return: list of MObjects of the nodes with the given names"""
+	sellist = nt.api.MSelectionList()
+	for name in node_names:
+		sellist.add(name)
+	# END for each name
+	out = list()
+	for index in xrange(sellist.length()):
+		obj = nt.api.MObject()
+		sellist.getDependNode(index, obj)
+		out.append(obj)
+	# END for each item
+	return out
 
+def _split_selection( sellist, size ):
+	""":return: list of MSelectionLists with at most size items each, holding the 
+		items of the given MSelectionList in order"""
+	out = list()
+	for index in xrange(sellist.length()):
+		if not index % size:
+			out.append(nt.api.MSelectionList())
+		# END start new chunk
+		dag_path = nt.api.MDagPath()
+		try:
+			sellist.getDagPath(index, dag_path)
+			out[-1].add(dag_path)
+		except RuntimeError:
+			obj = nt.api.MObject()
+			sellist.getDependNode(index, obj)
+			out[-1].add(obj)
+		# END handle dag nodes
+	# END for each item
+	return out
+
+def _node_names( sellist ):
+	""":return: set of the names of the nodes in the given MSelectionList. Dag nodes 
+		are listed by their full and their partial path"""
+	mfndep = nt.api.MFnDependencyNode()
+	names = set()
+	for index in xrange(sellist.length()):
+		dag_path = nt.api.MDagPath()
+		try:
+			sellist.getDagPath(index, dag_path)
+			names.add(dag_path.fullPathName())
+			names.add(dag_path.partialPathName())
+		except RuntimeError:
+			obj = nt.api.MObject()
+			sellist.getDependNode(index, obj)
+			mfndep.setObject(obj)
+			names.add(mfndep.name())
+		# END handle dag nodes
+	# END for each item
+	return names
+
+def _read_static_channels( sellist ):
+	""":return: tuple(target_plug_names, values) of all keyable scalar channels of 
+		the nodes in the given MSelectionList which are neither connected nor locked. 
+		Values are given in internal units
+	:note: all channels are listed by a single command, their values are read 
+		through the api as getAttr cannot query plugs of multiple nodes at once"""
+	node_names = _node_names(sellist)
+	if not node_names:
+		return (list(), list())
+	# END handle empty selection
+	
+	# listAnimatable includes the channels of shapes below transforms, which we 
+	# only want if they are given explicitly
+	plug_sel_list = nt.api.MSelectionList()
+	for plug_name in cmds.listAnimatable(list(node_names)) or list():
+		if plug_name.split('.', 1)[0] not in node_names:
+			continue
+		# END skip channels of other nodes
+		try:
+			plug_sel_list.add(plug_name)
+		except RuntimeError:
+			continue
+		# END skip plugs which do not exist yet
+	# END for each channel
+	
+	plug = nt.api.MPlug()
+	targets = list()
+	values = list()
+	for index in xrange(plug_sel_list.length()):
+		try:
+			plug_sel_list.getPlug(index, plug)
+		except RuntimeError:
+			continue
+		# END skip items which are no plugs
+		if plug.isDestination() or plug.isLocked() or plug.isCompound() or plug.isArray():
+			continue
+		# END skip driven and non-scalar channels
+		try:
+			values.append(plug.asDouble())
+		except RuntimeError:
+			continue
+		# END skip non-numeric channels
+		targets.append(plug.mfullyQualifiedName())
+	# END for each channel
+	return (targets, values)
+
+#{ Animation Layers
+
+# settings of animation layers stored on handles exported by layer. Lock must be last
+_layer_attributes = ('weight', 'mute', 'solo', 'override', 'rotationAccumulationMode', 
+					'scaleAccumulationMode', 'lock')
+
+def _iter_layers():
+	""":return: iterator yielding the names of all animation layers, starting 
+		with the root layer, parents come before their children. It yields nothing 
+		if there are no animation layers"""
+	root = cmds.animLayer(q=True, root=True)
+	if not root:
+		return
+	# END handle scenes without layers
+	layers = [root]
+	for layer in layers:
+		yield layer
+		layers.extend(cmds.animLayer(layer, q=True, children=True) or list())
+	# END for each layer
+	
+def _read_layer_info( layer, index, is_root ):
+	""":return: dictionary with the settings of the given animation layer, see 
+		``animio.clip.parse_layer_info``"""
+	info = dict(name=layer, index=index, root=int(is_root), 
+				parent=(not is_root and cmds.animLayer(layer, q=True, parent=True)) or '')
+	for attr in _layer_attributes:
+		if cmds.attributeQuery(attr, node=layer, exists=True):
+			info[attr] = float(cmds.getAttr("%s.%s" % (layer, attr)))
+		# END if maya version has the setting
+	# END for each setting
+	return info
+	
+def _layer_blend_channels( type_name ):
+	""":return: list of tuple(input_name, output_name) of the plugs of an animation 
+		layer blend node of the given type which take the layer's animation and 
+		pass it on"""
+	if type_name == 'animBlendNodeAdditiveRotation':
+		return [('inputB' + axis, 'output' + axis) for axis in 'XYZ']
+	# END handle compound rotations
+	return [('inputB', 'output')]
+	
+#} END animation layers
+
+_integer_types = (	nt.api.MFnNumericData.kByte, nt.api.MFnNumericData.kChar, 
+					nt.api.MFnNumericData.kShort, nt.api.MFnNumericData.kInt, 
+					nt.api.MFnNumericData.kLong )
+
+#} END utilities
+
+
+class AnimationDiscovery( object ):
+	"""Finds the animation curves driving node sets and the plugs they drive in 
+	a single pass, and memoizes the result per node set.
+	
+	Results are invalidated whenever connections change, nodes are renamed or removed, 
+	or a scene is opened, using maya callbacks which are only registered while results 
+	are memoized, as they are called for every change in the scene. 
+	Connections of message attributes, like the ones of AnimationHandles to their 
+	curves, do not invalidate the results.
+	
+	:note: use ``animation_discovery`` to obtain the instance shared by all users"""
+	
+	def __init__(self, max_entries=64):
+		""":param max_entries: maximum amount of node sets to remember, once 
+			exceeded, all results are discarded"""
+		self._max_entries = max_entries
+		self._cache = dict()
+		self._callback_ids = list()
+		self._hits = self._misses = self._invalidations = 0
+		
+	def __len__(self):
+		return len(self._cache)
+		
+	#{ Callbacks
+	
+	def _on_connection(self, src_plug, dst_plug, made, client_data):
+		if self._cache and src_plug.partialName() != 'msg':
+			self.invalidate()
+		# END if animation flow changed
+		
+	def _on_change(self, *args):
+		if self._cache:
+			self.invalidate()
+		# END if there is something to invalidate
+		
+	def _register_callbacks(self):
+		if self._callback_ids:
+			return
+		# END already registered
+		api = nt.api
+		self._callback_ids = [
+			api.MDGMessage.addConnectionCallback(self._on_connection), 
+			api.MDGMessage.addNodeRemovedCallback(self._on_change, "dependNode"), 
+			api.MNodeMessage.addNameChangedCallback(api.MObject(), self._on_change), 
+			api.MSceneMessage.addCallback(api.MSceneMessage.kBeforeNew, self._on_change), 
+			api.MSceneMessage.addCallback(api.MSceneMessage.kBeforeOpen, self._on_change)]
+		
+	#} END callbacks
+	
+	#{ Interface
+	
+	def get(self, iter_nodes):
+		""":return: list of tuple(curve, targets) for each animation curve driving 
+			the given nodes. curve is the MObject of the curve, targets a list of 
+			tuple(target_plug_name, chain) as described in ``_TargetResolver.targets``
+		:param iter_nodes: see ``AnimationHandle.set_animation``
+		:note: the target lists are shared and must not be altered"""
+		sellist = nt.toSelectionList(iter_nodes)
+		key = frozenset(_node_names(sellist))
+		result = self._cache.get(key)
+		if result is not None:
+			self._hits += 1
+			return list(result)
+		# END cache hit
+		
+		self._misses += 1
+		resolver = _TargetResolver()
+		mfndep = nt.api.MFnDependencyNode()
+		result = list()
+		for apinode in nt.AnimCurve.findAnimation(sellist, asNode=False):
+			mfndep.setObject(apinode)
+			result.append((apinode, resolver.targets(mfndep.findPlug('o'))))
+		# END for each curve
+		
+		if len(self._cache) >= self._max_entries:
+			self._cache.clear()
+		# END limit size
+		self._register_callbacks()
+		self._cache[key] = result
+		return list(result)
+		
+	def invalidate(self):
+		"""Forget all results and deregister our maya callbacks until results are 
+		memoized again"""
+		self.remove_callbacks()
+		self._invalidations += 1
+		
+	def remove_callbacks(self):
+		"""Deregister our maya callbacks and forget all results. Callbacks are 
+		registered again once the next result is memoized by ``get``"""
+		for callback_id in self._callback_ids:
+			nt.api.MMessage.removeCallback(callback_id)
+		# END for each callback
+		self._callback_ids = list()
+		self._cache.clear()
+		
+	def stats(self):
+		""":return: dictionary with the amount of 'hits', 'misses' and 'invalidations'
+			as well as the amount of memoized node sets as 'entries'"""
+		return dict(hits=self._hits, misses=self._misses, invalidations=self._invalidations, 
+					entries=len(self._cache))
+		
+	#} END interface
 
 
+#{ Interface
+
+_discovery = None
+
+def animation_discovery():
+	""":return: the ``AnimationDiscovery`` instance shared by all users in this process"""
+	global _discovery
+	if _discovery is None:
+		_discovery = AnimationDiscovery()
+	# END create on demand
+	return _discovery
+
+#} END interface
+
+
+class CurveHashes( object ):
+	"""Memoizes the content hashes of the animation curves in the scene, see 
+	``animio.curve.CurveData.content_hash``, which allows to find out whether two 
+	curves are identical without reading their keys each time.
+	
+	Hashes are invalidated whenever curves are edited or removed, or a scene is opened, 
+	using maya callbacks which are registered on first use. As edits through the api 
+	do not trigger these callbacks, the amount of keys is verified as well, and code 
+	editing curves through the api should call ``discard``
+	
+	:note: use ``curve_hashes`` to obtain the instance shared by all users"""
+	
+	def __init__(self, max_entries=250000):
+		""":param max_entries: maximum amount of hashes to remember, once exceeded, 
+			all hashes are discarded"""
+		self._max_entries = max_entries
+		self._cache = dict()
+		self._callback_ids = list()
+		self._mfncurve = apianim.MFnAnimCurve()
+		self._hits = self._misses = 0
+		
+	def __len__(self):
+		return len(self._cache)
+		
+	#{ Callbacks
+	
+	def _on_edited(self, curves, client_data):
+		for index in xrange(curves.length()):
+			self.discard(curves[index])
+		# END for each edited curve
+		
+	def _on_removed(self, node, client_data):
+		self.discard(node)
+		
+	def _on_scene(self, client_data):
+		self._cache.clear()
+		
+	def _register_callbacks(self):
+		if self._callback_ids:
+			return
+		# END already registered
+		api = nt.api
+		self._callback_ids = [
+			apianim.MAnimMessage.addAnimCurveEditedCallback(self._on_edited), 
+			api.MDGMessage.addNodeRemovedCallback(self._on_removed, "animCurve"), 
+			api.MSceneMessage.addCallback(api.MSceneMessage.kBeforeNew, self._on_scene), 
+			api.MSceneMessage.addCallback(api.MSceneMessage.kBeforeOpen, self._on_scene)]
+		
+	#} END callbacks
+	
+	#{ Interface
+	
+	def get(self, curve):
+		""":return: content hash of the given animation curve MObject"""
+		mfncurve = self._mfncurve
+		mfncurve.setObject(curve)
+		num_keys = mfncurve.numKeys()
+		handle = nt.api.MObjectHandle(curve)
+		key = handle.hashCode()
+		entry = self._cache.get(key)
+		if entry is not None and entry[1] == num_keys and entry[0].isValid() and entry[0].object() == curve:
+			self._hits += 1
+			return entry[2]
+		# END cache hit
+		
+		self._misses += 1
+		self._register_callbacks()
+		digest = _read_curve_data(mfncurve, list()).content_hash()
+		if len(self._cache) >= self._max_entries:
+			self._cache.clear()
+		# END limit size
+		self._cache[key] = (handle, num_keys, digest)
+		return digest
+		
+	def discard(self, curve):
+		"""Forget the hash of the given animation curve MObject, if we have one"""
+		self._cache.pop(nt.api.MObjectHandle(curve).hashCode(), None)
+		
+	def invalidate(self):
+		"""Forget all hashes"""
+		self._cache.clear()
+		
+	def remove_callbacks(self):
+		"""Deregister our maya callbacks and forget all hashes. Callbacks are 
+		registered again on the next call to ``get``"""
+		for callback_id in self._callback_ids:
+			nt.api.MMessage.removeCallback(callback_id)
+		# END for each callback
+		self._callback_ids = list()
+		self._cache.clear()
+		
+	def stats(self):
+		""":return: dictionary with the amount of 'hits' and 'misses' as well as the 
+			amount of memoized hashes as 'entries'"""
+		return dict(hits=self._hits, misses=self._misses, entries=len(self._cache))
+		
+	#} END interface
+
+
+#{ Interface
+
+_hashes = None
+
+def curve_hashes():
+	""":return: the ``CurveHashes`` instance shared by all users in this process"""
+	global _hashes
+	if _hashes is None:
+		_hashes = CurveHashes()
+	# END create on demand
+	return _hashes
+
+#} END interface
+
+
+class Assignment( object ):
+	"""Compact record of an assignment of a managed animation curve to a target plug, 
+	as yielded by ``AnimationHandle.iter_assignment_records``.
+	
+	* **curve_index**: physical index of the curve in the affectedBy array of its handle
+	* **source**: output plug of the curve, shared by all records of the curve
+	* **target_name**: name of the target plug
+	
+	The target plug is created and kept once ``target`` is accessed. Records can be 
+	unpacked into tuple(source_plug, target_plug) like the items of ``iter_assignments``, 
+	which creates a target plug without keeping it"""
+	__slots__ = ('curve_index', 'source', 'target_name', '_target')
+	
+	# shared list to resolve target names
+	_sellist = nt.api.MSelectionList()
+	
+	def __init__(self, curve_index, source, target_name, target=None):
+		self.curve_index = curve_index
+		self.source = source
+		self.target_name = target_name
+		self._target = target
+		
+	def __iter__(self):
+		yield self.source
+		yield self._plug()
+		
+	def __len__(self):
+		return 2
+		
+	def __getitem__(self, index):
+		if index in (0, -2):
+			return self.source
+		elif index in (1, -1):
+			return self._plug()
+		# END handle index
+		raise IndexError("Assignment index out of range: %r" % index)
+		
+	def __repr__(self):
+		return "Assignment(%i, %r)" % (self.curve_index, self.target_name)
+		
+	def _plug(self):
+		""":return: our target plug, which is only kept if it existed already
+		:raise RuntimeError: if the target plug does not exist"""
+		if self._target is not None:
+			return self._target
+		# END use existing plug
+		sellist = self._sellist
+		sellist.clear()
+		sellist.add(self.target_name)
+		plug = nt.api.MPlug()
+		sellist.getPlug(0, plug)
+		sellist.clear()
+		return plug
+		
+	@property
+	def target(self):
+		""":return: MPlug of our target, created on first access"""
+		if self._target is None:
+			self._target = self._plug()
+		# END create plug
+		return self._target
+		
+
 class AnimInOutLibrary( object ):
 	"""contains default implementation for animation export and import"""
 	
 	#{ Export/Import/Load
 	@classmethod
 	@notundoable
-	def export(cls, destination_file, iter_nodes,  **kwargs):
+	def export(cls, destination_file, iter_nodes, layers=False, static=False, **kwargs):
 		"""Export animation retrieved from the given node iterator to the destination_file.
 		
-		:param destination_file: file to which to export the animation to
+		:param destination_file: file to which to export the animation to. Files with 
+			the extension of our native format are written by ``AnimationHandle.iter_write_native``, 
+			shard manifests by ``AnimationHandle.iter_write_shards``, all others by ``Scene.export``
 		:param iter_nodes: iterator yielding nodes in a format compatible to ``AnimationHandle.set_animation``
-		:param **kwargs: passed to ``Scene.export``
-		:raise ValueError: if the passed in nodes have no animation
+		:param layers: if True, the animation is grouped by animation layer, one handle 
+			per layer, storing the layer's weight and modes. ``iter_import`` rebuilds 
+			the layers. See ``AnimationHandle.create_layer_handles``
+		:param static: if True, the values of all keyable channels without animation 
+			are stored as well, see ``AnimationHandle.set_static_pose``. ``iter_import`` 
+			restores them. As unanimated channels belong to no layer, the pose is 
+			stored once, on the first handle, which is the one of the root layer if 
+			it animates any of the nodes
+		:param **kwargs: passed to ``Scene.export``, ``AnimationHandle.iter_write_native`` 
+			or ``AnimationHandle.iter_write_shards``
+		:raise ValueError: if the passed in nodes have no animation, and no static 
+			channels if static is True
 		:return: destination_file as Path"""
-		rec = UndoRecorder()
-		rec.startRecording()
-		tmphandle = AnimationHandle()
-		tmphandle.set_animation(iter_nodes)
-		rec.stopRecording()
+		for progress in cls.iter_export(destination_file, iter_nodes, layers, static, **kwargs):
+			pass
+		# END for each export step
+		return Path(destination_file)
 		
-		try:
+	@classmethod
+	def iter_export(cls, destination_file, iter_nodes, layers=False, static=False, 
+					nodes_per_step=500, **kwargs):
+		"""Generator performing the export in steps, see ``export`` for a description 
+		of the arguments.
+		
+		The animation of the nodes is searched in steps of nodes_per_step nodes, files 
+		of our native format and shard manifests are written in chunks of curves. 
+		Maya files and animation layers are handled in one step each.
+		
+		:param nodes_per_step: amount of nodes whose animation is searched per step
+		:return: generator yielding the progress of the export as float between 0.0 and 1.0
+		:note: closing the generator before it is exhausted reverts all changes 
+			without writing the destination_file. Only the changes of each step are 
+			recorded, hence edits made by the user in between steps are kept"""
+		sellist = nt.toSelectionList(iter_nodes)
+		records = list()
+		def record(func, *args):
+			rec = UndoRecorder()
+			rec.startRecording()
 			try:
-				tmphandle.iter_animation().next()
-			except StopIteration:
+				return func(*args)
+			finally:
+				rec.stopRecording()
+				records.append(rec)
+			# END stop recording before yielding control
+		# END recording helper
+		
+		try:
+			if layers:
+				handles = record(AnimationHandle.create_layer_handles, sellist)
+			else:
+				chunks = _split_selection(sellist, nodes_per_step)
+				curve_targets = list()
+				seen = set()
+				for step, chunk in enumerate(chunks):
+					for curve, targets in animation_discovery().get(chunk):
+						key = nt.api.MObjectHandle(curve).hashCode()
+						if key not in seen:
+							seen.add(key)
+							curve_targets.append((curve, targets))
+						# END skip curves animating nodes of previous steps
+					# END for each curve
+					yield (step + 1.0) / len(chunks) * 0.5
+				# END for each step
+				tmphandle = record(AnimationHandle)
+				record(tmphandle._set_curves, curve_targets)
+				handles = [tmphandle]
+			# END create handles
+			num_static = 0
+			if static:
+				if not handles:
+					handles = [record(AnimationHandle)]
+				# END create a handle for the pose if no layer animates the nodes
+				num_static = record(handles[0].set_static_pose, sellist)
+			# END store static pose
+			
+			if not num_static and not [h for h in handles if h.affectedBy.numElements()]:
 				raise ValueError("Given nodes did not have any animation")
 			# END check for animation
+			yield 0.5
 			
-			tmphandle.to_file(destination_file)
-			return Path(destination_file)
+			if is_native_file(destination_file) or is_manifest_file(destination_file):
+				writer = AnimationHandle.iter_write_native
+				if is_manifest_file(destination_file):
+					writer = AnimationHandle.iter_write_shards
+				# END handle shards
+				for progress in writer(handles, destination_file, **kwargs):
+					yield 0.5 + progress * 0.5
+				# END for each chunk
+			else:
+				AnimationHandle.handles_to_file(handles, destination_file, **kwargs)
+			# END handle format
+			yield 1.0
 		finally:
-			rec.undo()
+			for rec in reversed(records):
+				rec.undo()
+			# END for each recorded step
 		# END revert to previous state
 		
-	
+	@classmethod
+	def iter_import(cls, input_file, converter=None, predicate=None, chunk_size=2500, 
+					time_offset=0.0, time_scale=1.0, start_time=None, mode=None, pose=None, 
+					reference=True, namespaces=None, skip_identical=False, insert_gap=1.0):
+		"""Generator loading the animation stored in input_file and applying it 
+		to its targets in chunks.
+		
+		:param input_file: file previously written by ``export``
+		:param converter: passed to ``AnimationHandle.iter_assignments``
+		:param predicate: passed to ``AnimationHandle.iter_assignments``
+		:param chunk_size: amount of assignments to connect per step
+		:param time_offset: passed to ``AnimationHandle.iter_apply_animation``
+		:param time_scale: passed to ``AnimationHandle.iter_apply_animation``
+		:param start_time: if not None, the imported animation will be moved to 
+			start at the given time, overriding the time_offset
+		:param mode: passed to ``AnimationHandle.iter_apply_animation``, defaults 
+			to ``AnimationHandle.kConnect``. It does not affect animation exported 
+			by layer, which is applied to its layers using ``AnimationHandle.apply_layer``
+		:param pose: if not None, only the pose at the given time is applied using
+			``AnimationHandle.apply_pose``, which ignores time_offset, time_scale and mode. 
+			Static poses stored by ``export`` are applied in any case
+		:param reference: if True, input_file will be referenced and stays in the scene. 
+			Otherwise only the animation data is read from the file, see 
+			``animio.clip.read_clips``, and the curves are created directly. The 
+			data is kept in the process wide ``animio.cache.clip_cache``. 
+			Once done, no handles or references remain, only the curves which 
+			were connected to their targets. Files of our native format and shard 
+			manifests are never referenced
+		:param namespaces: if input_file is a shard manifest and this is not None, 
+			only the shards animating any of the given namespaces are loaded, 
+			see ``animio.shard.iter_load_shards``. Shards are read serially within this 
+			process, as worker processes would be copies of the maya session
+		:param skip_identical: passed to ``AnimationHandle.iter_apply_animation``, if True, 
+			targets already carrying identical animation are left untouched
+		:param insert_gap: passed to ``AnimationHandle.iter_apply_animation``
+		:return: generator yielding the progress of the import as float between 0.0 and 1.0
+		:raise ValueError: if skip_identical is used in kInsert mode"""
+		if mode is None:
+			mode = AnimationHandle.kConnect
+		# END default mode
+		if skip_identical and mode == AnimationHandle.kInsert:
+			raise ValueError("Identical targets cannot be skipped when inserting animation")
+		# END check arguments
+		reference = reference and not is_native_file(input_file) and not is_manifest_file(input_file)
+		if reference:
+			ahref, handles = AnimationHandle.from_file(input_file)
+			handles = list(handles)
+		elif is_manifest_file(input_file):
+			handles = list()
+			for shard_index, clips in iter_load_shards(input_file, namespaces):
+				handles.extend(AnimationHandle.from_clip(clip) for clip in clips)
+			# END for each shard
+		else:
+			handles = [AnimationHandle.from_clip(clip) for clip in clip_cache().get(input_file)]
+		# END load handles
+		
+		# rebuild layers from the root downwards
+		handles.sort(key=lambda h: (h.layer_info() or dict()).get('index', 0))
+		
+		try:
+			animated = [h for h in handles if h.affectedBy.numElements()]
+			if start_time is not None and animated:
+				time_offset = start_time - min(h.time_range()[0] for h in animated)
+			# END compute offset
+			yield 0.0
+			
+			for hindex, handle in enumerate(handles):
+				handle.apply_static_pose(predicate, converter)
+				if not handle.affectedBy.numElements():
+					yield (hindex + 1.0) / len(handles)
+					continue
+				# END handle handles with static channels only
+				
+				if pose is not None:
+					handle.apply_pose(pose, predicate, converter)
+					yield (hindex + 1.0) / len(handles)
+					continue
+				# END handle pose
+				
+				if handle.layer_info() is not None:
+					handle.apply_layer(converter, predicate, time_offset, time_scale)
+					yield (hindex + 1.0) / len(handles)
+					continue
+				# END handle layers
+				
+				for progress in handle.iter_apply_animation(converter, predicate, chunk_size, 
+															time_offset, time_scale, mode, 
+															skip_identical=skip_identical, 
+															insert_gap=insert_gap):
+					yield (hindex + progress) / len(handles)
+				# END for each chunk
+			# END for each handle
+		finally:
+			if not reference:
+				cls._delete_clip_handles(handles)
+			# END remove temporary handles
+		# END assure we clean up
+		
 	#} END Export/Import/Load
 	
 	#{ Query
 	
 	#} END query
 	
+	@classmethod
+	@notundoable
+	def _delete_clip_handles( cls, handles ):
+		"""Delete the given handles created by ``AnimationHandle.from_clip`` as well 
+		as all their curves which do not drive anything"""
+		curves = list()
+		for handle in handles:
+			curves.extend(handle.iter_animation(asNode=False))
+			handle.delete()
+		# END for each handle
+		
+		mfndep = nt.api.MFnDependencyNode()
+		unused = list()
+		for curve in curves:
+			mfndep.setObject(curve)
+			if not mfndep.findPlug('o').isSource():
+				unused.append(mfndep.name())
+			# END if curve is not connected
+		# END for each curve
+		if unused:
+			cmds.delete(unused)
+		# END delete unused curves
+	
 	def _create_plug_node( self ):
 		raise NotImplementedError("todo")
 	
@@ -69,9 +1108,45 @@ class AnimationHandle( nt.Network ):
 	
 	_l_connection_info_attr = 'connectionInfo'
 	_s_connection_info_attr = 'cifo'
+	_l_intermediate_info_attr = 'intermediateInfo'
+	_s_intermediate_info_attr = 'imif'
+	_l_layer_info_attr = 'layerInfo'
+	_s_layer_info_attr = 'lyif'
+	_l_static_targets_attr = 'staticTargets'
+	_s_static_targets_attr = 'sttg'
+	_l_static_values_attr = 'staticValues'
+	_s_static_values_attr = 'stvl'
+	_l_take_info_attr = 'takeInfo'
+	_s_take_info_attr = 'tkif'
+	_l_active_take_attr = 'activeTake'
+	_s_active_take_attr = 'actk'
+	_l_retime_info_attr = 'retimeInfo'
+	_s_retime_info_attr = 'rtif'
 	_k_separator = ','
+	_k_chain_separator = '>'
 	_networktype = nt.api.MFn.kAffect
 	
+	#{ Apply Modes
+	# connect the managed curves to the targets
+	kConnect = "connect"
+	# replace the keys of target curves within the range of the managed animation
+	kReplace = "replace"
+	# move target keys behind the range of the managed animation to make room for it
+	kInsert = "insert"
+	#} END apply modes
+	
+	#{ Pose Times
+	kFirstPose = "first"
+	kLastPose = "last"
+	#} END pose times
+	
+	#{ Priority Rules
+	# the first handle animating a target wins
+	kFirstWins = "first_wins"
+	# the last handle animating a target wins, as if all handles were applied in order
+	kLastWins = "last_wins"
+	#} END priority rules
+	
 	def __new__( cls, *args ): 
 		if not args:
 			return cls.create()
@@ -111,24 +1186,104 @@ class AnimationHandle( nt.Network ):
 			# END if asNode
 		# END iterator
 		
-	def iter_assignments( self, predicate=None, converter=None):
+	def iter_curve_data( self ):
+		""":return: iterator yielding a ``CurveData`` instance for each managed animation
+			curve, its targets are the stored target plug names. If we have takes, 
+			only the curves of the active take are yielded"""
+		for curve_data, chains in self._iter_curve_data_and_chains(self._take_indices()):
+			yield curve_data
+		# END for each curve
+		
+	def _iter_curve_data_and_chains( self, indices=None ):
+		""":return: iterator yielding tuple(CurveData, chains) for each managed animation 
+			curve, chains is a list with the intermediate chain string of each target
+		:param indices: if not None, sorted list of the indices of the curves to read"""
+		target_lists = [names.split(self._k_separator) for names in 
+						self.findPlug(self._s_connection_info_attr).masData().array()]
+		chain_lists = self._intermediate_chains(target_lists)
+		mfncurve = apianim.MFnAnimCurve()
+		affected_by = self.affectedBy
+		if indices is None:
+			indices = xrange(affected_by.numElements())
+		# END read all curves
+		for index in indices:
+			miplug = affected_by.elementByPhysicalIndex(index).minput()
+			if miplug.isNull():
+				continue
+			# END skip disconnected curves
+			
+			mfncurve.setObject(miplug.node())
+			chains = (chain_lists and chain_lists[index]) or [''] * len(target_lists[index])
+			pairs = [(t, c) for t, c in zip(target_lists[index], chains) if t]
+			yield (_read_curve_data(mfncurve, [t for t, c in pairs]), [c for t, c in pairs])
+		# END for each managed curve
+		
+	def iter_assignments( self, predicate=None, converter=None, intermediates=True ):
 		""":return: iterator yielding source-target assignments as plugs in a tuple(source_plug, target_plug) 
 		:param converter: if not None, the function returns the desired target plug name to use 
 			instead of the given plug name. Its called as follows: (string) convert(source_plug, target_plugname).
+			If it returns None, the target is skipped. If the converter provides a 
+			``map_names(names)`` method, like ``animio.mapping.MappingTable``, it will be 
+			called once with all target names instead, returning the converted names
 		:param predicate: if not None, after the converter function has been applied, 
 			(bool) predicate(source_plug, target_plugname) returns True for each plug to be yielded  
-		:note: for now, if target_plug does not exist we just print a message and continue"""
+		:note: for now, if target_plug does not exist we just print a message and continue
+		:param intermediates: if True and the curve drove the target through intermediate 
+			nodes, like pairBlends, the converted name of the intermediate input plug 
+			it was connected to will be yielded instead of the target if it exists. 
+			Otherwise the final target is yielded"""
+		for assignment in self._iter_assignments(predicate, converter, intermediates, True):
+			yield (assignment.source, assignment._target)
+		# END for each assignment
+		
+	def iter_assignment_records( self, predicate=None, converter=None, intermediates=True ):
+		"""Lightweight version of ``iter_assignments``
+		
+		:return: iterator yielding an ``Assignment`` for each source-target assignment. 
+			Target plugs are only created once they are accessed, records of the same 
+			curve share their source plug
+		:param predicate: see ``iter_assignments``
+		:param converter: see ``iter_assignments``
+		:param intermediates: see ``iter_assignments``
+		:note: unlike ``iter_assignments``, the existence of the targets is not checked 
+			up front, as it would look up each target name a second time once the 
+			target plug is created. Accessing the target of a record whose target 
+			does not exist raises a RuntimeError"""
+		return self._iter_assignments(predicate, converter, intermediates, False, False)
+		
+	def _iter_assignments( self, predicate, converter, intermediates, materialize, check=True ):
+		""":return: iterator yielding an ``Assignment`` for each assignment, see 
+			``iter_assignments`` for the parameters
+		:param materialize: if True, the target plug of each record is created right away
+		:param check: if True, assignments whose target does not exist are skipped. 
+			Must be True if materialize is True"""
 		# get target strings as array
 		# mrv provides this:
 		target_plug_names = self.findPlug(self._s_connection_info_attr).masData().array()
 		
 		assert len(target_plug_names) == len(self.affectedBy), "Number of animation nodes out of sync with their stored targets"
 		
+		target_lists = [names.split(self._k_separator) for names in target_plug_names]
+		chain_lists = intermediates and self._intermediate_chains(target_lists)
+		map_names = getattr(converter, 'map_names', None)
+		if map_names is not None:
+			mapped = iter(map_names([name for names in target_lists for name in names]))
+			target_lists = [[mapped.next() for name in names] for names in target_lists]
+			converter = None
+		# END convert all names at once
+		
 		# make iterator yielding source and target plug objects
 		plug_sel_list = nt.api.MSelectionList()
 		mfndep = nt.api.MFnDependencyNode()
+		take_indices = self._take_indices()
+		if take_indices is not None:
+			take_indices = set(take_indices)
+		# END prepare lookup
 		for index, anim_node_dest_plug in enumerate(self.affectedBy):
-			target_plug_name_list = target_plug_names[index].split(self._k_separator)
+			if take_indices is not None and index not in take_indices:
+				continue
+			# END skip curves of other takes
+			target_plug_name_list = target_lists[index]
 			anim_node_msg_plug=anim_node_dest_plug.minput()
 			if anim_node_msg_plug.isNull():
 				log.warn("no animation curve found on %s" % anim_node_dest_plug.mfullyQualifiedName())
@@ -144,20 +1299,49 @@ class AnimationHandle( nt.Network ):
 					tplug_name = converter(anim_node_otp_plug, tplug_name)
 				# END handle converter
 				
+				if tplug_name is None:
+					continue
+				# END skip unmapped targets
+				
 				if predicate and not predicate(anim_node_otp_plug, tplug_name):
 					continue
 				# END filter
 				
-				actual_plug = nt.api.MPlug()
-				try:
-					plug_sel_list.add(tplug_name)
-				except:
-					log.warn("target plug named %s does not exist" % tplug_name)
-					continue
-				# END check if plug exists
+				chain = chain_lists and chain_lists[index][tindex]
+				if chain:
+					input_name = chain.split(self._k_chain_separator)[0]
+					if map_names is not None:
+						input_name = map_names([input_name])[0]
+					elif converter:
+						input_name = converter(anim_node_otp_plug, input_name)
+					# END convert intermediate
+					
+					try:
+						plug_sel_list.add(input_name)
+						tplug_name = input_name
+					except:
+						pass
+					# END use intermediate if it exists
+				# END handle intermediates
 				
-				plug_sel_list.getPlug(tindex, actual_plug)
-				yield (anim_node_otp_plug, actual_plug)
+				if check:
+					try:
+						if not plug_sel_list.length():
+							plug_sel_list.add(tplug_name)
+						# END add unless intermediate was added
+					except:
+						log.warn("target plug named %s does not exist" % tplug_name)
+						plug_sel_list.clear()
+						continue
+					# END check if plug exists
+				# END check target
+				
+				actual_plug = None
+				if materialize:
+					actual_plug = nt.api.MPlug()
+					plug_sel_list.getPlug(0, actual_plug)
+				# END create plug right away
+				yield Assignment(index, anim_node_otp_plug, tplug_name, actual_plug)
 				# END for each plugname to convert
 								
 				# make sure it doesnt build up
@@ -166,6 +1350,21 @@ class AnimationHandle( nt.Network ):
 		# END iterating  
 	
 	
+	def _intermediate_chains( self, target_lists ):
+		""":return: list with a list of intermediate chain strings for each list of 
+			target names in target_lists, or None if we have no valid chains"""
+		if not self.hasAttribute(self._s_intermediate_info_attr):
+			return None
+		# END handle handles of previous versions
+		
+		chain_lists = [chains.split(self._k_separator) for chains in 
+						self.findPlug(self._s_intermediate_info_attr).masData().array()]
+		if [len(c) for c in chain_lists] != [len(t) for t in target_lists]:
+			log.warn("Ignored intermediate information of %s as it is out of sync with the targets" % self)
+			return None
+		# END check sync
+		return chain_lists
+	
 	#} END iteration
 	
 	#{ Edit
@@ -177,11 +1376,30 @@ class AnimationHandle( nt.Network ):
 		:param kwargs: Passed to ``createNode`` method of mrv"""
 		mynode = nt.createNode(name, "network", **kwargs)
 		
-		# add our custom attribute
+		# add our custom attributes
 		attr = nt.TypedAttribute.create(cls._l_connection_info_attr, cls._s_connection_info_attr,
 							nt.api.MFnData.kStringArray, nt.StringArrayData.create(list()))
 		mynode.addAttribute(attr)
-		return cls(mynode.object())
+		handle = cls(mynode.object())
+		handle._assure_intermediate_info_attr()
+		return handle
+		
+	def _assure_intermediate_info_attr( self ):
+		"""Add the attribute storing the intermediate chains of our targets if 
+		it does not exist yet, as on handles written by previous versions"""
+		if self.hasAttribute(self._s_intermediate_info_attr):
+			return
+		# END nothing to do
+		attr = nt.TypedAttribute.create(self._l_intermediate_info_attr, self._s_intermediate_info_attr,
+							nt.api.MFnData.kStringArray, nt.StringArrayData.create(list()))
+		self.addAttribute(attr)
+		
+	def _set_targets( self, target_plug_strings, chain_strings ):
+		"""Store the given lists of target plug names and intermediate chains,
+		one string per managed curve"""
+		self.findPlug(self._s_connection_info_attr).setMObject(nt.StringArrayData.create(target_plug_strings))
+		self._assure_intermediate_info_attr()
+		self.findPlug(self._s_intermediate_info_attr).setMObject(nt.StringArrayData.create(chain_strings))
 		
 	@undoable
 	def clear( self ):
@@ -192,8 +1410,10 @@ class AnimationHandle( nt.Network ):
 		# END for each array item to disconnect
 		
 		# clear connection data
-		dplug = self.findPlug(self._s_connection_info_attr)
-		dplug.setMObject(nt.StringArrayData.create(list()))
+		self._set_targets(list(), list())
+		if self.hasAttribute(self._s_take_info_attr):
+			self._set_take_info(list(), None)
+		# END forget takes
 	
 	@undoable
 	def set_animation( self, iter_nodes ):
@@ -204,9 +1424,19 @@ class AnimationHandle( nt.Network ):
 			to nodes connected to animation.
 		:note: Will not raise if the nodes do not have any animation
 		:note: Heavily optimized for speed, hence we work directly with the 
-			apiObjects, skipping the mrv layer as we are in a tight loop here"""
+			apiObjects, skipping the mrv layer as we are in a tight loop here
+		:note: the curves and their targets are obtained from the shared 
+			``AnimationDiscovery``, hence repeated calls with the same nodes do not 
+			search the animation again unless the scene changed"""
+		self._set_curves(animation_discovery().get(iter_nodes))
+		
+	def _set_curves( self, curve_targets ):
+		"""Manage the given animation curves, replacing the previous ones
+		
+		:param curve_targets: list of tuple(curve, targets) as returned by 
+			``AnimationDiscovery.get``"""
 		self.clear()
-		anim_nodes = nt.AnimCurve.findAnimation(iter_nodes, asNode=False)
+		anim_nodes = [curve for curve, targets in curve_targets]
 		mfndep = nt.api.MFnDependencyNode()
 		def iter_plugs():
 			affected_by_plug = self.affectedBy
@@ -221,55 +1451,1168 @@ class AnimationHandle( nt.Network ):
 		
 		# add current connection info
 		# NOTE: We know that the anim-node is connected to something
-		# as this is the reason we retrieved it in the first place
-		# TODO: Deal with intermediate nodes
+		# as this is the reason we retrieved it in the first place. 
+		# Intermediate nodes were walked through, their input plugs are stored
+		# alongside the final targets
 		target_plug_strings = list()
-		for apinode in anim_nodes:
-			mfndep.setObject(apinode)
-			outputs = mfndep.findPlug('o').moutputs()
-			target_plug_strings.append(self._k_separator.join(p.mfullyQualifiedName() for p in outputs))
+		chain_strings = list()
+		for apinode, targets in curve_targets:
+			target_plug_strings.append(self._k_separator.join(t for t, c in targets))
+			chain_strings.append(self._k_separator.join(self._k_chain_separator.join(c) for t, c in targets))
 		# END for each node
-		self.findPlug(self._s_connection_info_attr).setMObject(nt.StringArrayData.create(target_plug_strings))
+		self._set_targets(target_plug_strings, chain_strings)
 	
 	@undoable
-	def apply_animation( self, converter=None ):
+	def apply_animation( self, converter=None, time_offset=0.0, time_scale=1.0, mode=kConnect, 
+							skip_identical=False, insert_gap=1.0, predicate=None ):
 		"""Apply the stored animation by (re)connecting the animation nodes to their
 			respective target plugs
 		:param: converter see ``iter_assignments``
 			This allows you to perform any modifications to the target before it will be
 			connected.
-		:note: Will break existing destination connections"""
+		:param time_offset: amount of frames by which to move the keys of the applied 
+			animation, relative to the keys as they were stored
+		:param time_scale: factor by which to scale the key times of the applied 
+			animation relative to the keys as they were stored, using the first stored 
+			key of all managed animation as pivot. It is applied before the offset
+		:param mode: one of our apply modes:
+		
+			* **kConnect**: connect the managed curves to the targets
+			* **kReplace**: merge the keys into the animation curves of the targets, 
+			  removing their keys within the key range of the respective managed curve
+			* **kInsert**: merge the keys into the animation curves of the targets, 
+			  moving all their keys at or after the first key of the respective 
+			  managed curve behind its last key
+			
+			Targets without animation curves receive new ones in both merge modes. 
+			Tangents, weights and infinity types of the managed curves are merged 
+			as well
+		:param skip_identical: if True, targets driven by an animation curve with the 
+			same keys as the managed curve are skipped, see ``CurveHashes``. This is 
+			useful when updating animation which mostly exists already. It cannot be 
+			used in kInsert mode, as skipped targets would not make room for the 
+			inserted animation and go out of sync with the others
+		:param insert_gap: amount of frames between the last inserted key and the 
+			keys moved behind it in kInsert mode. It keeps the key at the insertion 
+			point from being overwritten by the last inserted key
+		:param predicate: see ``iter_assignments``
+		:return: tuple(num_changed, num_skipped) with the amount of assignments which 
+			were connected or merged, and the amount of assignments which were skipped 
+			as their target was connected to their source already, or to an identical 
+			curve if skip_identical is True
+		:note: Will break existing destination connections in kConnect mode
+		:note: offset and scale are applied to all managed animation curves, but only 
+			their difference to the offset and scale of the previous application, see 
+			``_retime``. Applying the animation repeatedly with the same offset does 
+			not move the keys again"""
+		stats = dict()
+		for progress in self.iter_apply_animation(converter, predicate, time_offset=time_offset, 
+													time_scale=time_scale, mode=mode, stats=stats, 
+													skip_identical=skip_identical, insert_gap=insert_gap):
+			pass
+		# END for each chunk
+		return (stats['changed'], stats['skipped'])
+		
+	def iter_apply_animation( self, converter=None, predicate=None, chunk_size=None, 
+								time_offset=0.0, time_scale=1.0, mode=kConnect, stats=None, 
+								skip_identical=False, insert_gap=1.0 ):
+		"""Generator version of ``apply_animation`` which connects the assignments 
+		in chunks.
+		
+		:param converter: see ``iter_assignments``
+		:param predicate: see ``iter_assignments``
+		:param chunk_size: amount of assignments to connect per step, or None to 
+			connect all of them in one step
+		:param time_offset: see ``apply_animation``
+		:param time_scale: see ``apply_animation``
+		:param mode: see ``apply_animation``
+		:param stats: if not None, dictionary which receives the amount of 'changed' 
+			and 'skipped' assignments, see ``apply_animation``
+		:param skip_identical: see ``apply_animation``
+		:param insert_gap: see ``apply_animation``
+		:return: generator yielding the approximate progress as float between 0.0 and 1.0
+		:raise ValueError: if the mode is invalid, or skip_identical is used in kInsert mode
+		:note: in kConnect mode, the current inputs of all targets of a chunk are checked 
+			first, only targets which are not yet connected to their source are connected"""
+		if mode not in (self.kConnect, self.kReplace, self.kInsert):
+			raise ValueError("Invalid apply mode: %r" % mode)
+		if skip_identical and mode == self.kInsert:
+			raise ValueError("Identical targets cannot be skipped when inserting animation")
+		# END check mode
+		
+		target_strings = self.findPlug(self._s_connection_info_attr).masData().array()
+		take_indices = self._take_indices()
+		if take_indices is None:
+			take_indices = xrange(len(target_strings))
+		# END use all curves
+		num_targets = 0
+		for index in take_indices:
+			num_targets += len(target_strings[index].split(self._k_separator))
+		# END for each curve's targets
+		
+		iterator = self.iter_assignments(predicate=predicate, converter=converter)
+		return self._iter_apply_assignments(iterator, num_targets, chunk_size, time_offset, 
+											time_scale, mode, stats, skip_identical, insert_gap)
+		
+	def _iter_apply_assignments( self, iterator, num_targets, chunk_size, time_offset, 
+									time_scale, mode, stats, skip_identical=False, insert_gap=1.0 ):
+		"""Apply the assignments of the given iterator in chunks, see ``iter_apply_animation``
+		
+		:param iterator: iterator yielding tuple(source_plug, target_plug)
+		:param num_targets: expected amount of assignments, used to compute the progress
+		:return: generator yielding the approximate progress as float between 0.0 and 1.0"""
+		num_targets = float(num_targets) or 1.0
+		self._retime(time_offset, time_scale)
 		
 		# do actual connection ( best case is 38k connections per second )
-		iterator = self.iter_assignments(converter=converter)
-		nt.api.MPlug.mconnectMultiToMulti(iterator, force=True)
 		
+		if stats is None:
+			stats = dict()
+		# END default stats
+		stats['changed'] = stats['skipped'] = 0
+		num_done = 0
+		
+		if mode != self.kConnect:
+			iterator = list(iterator)
+			if skip_identical:
+				iterator, num_done = _split_identical(iterator)
+				stats['skipped'] += num_done
+			# END skip identical curves
+			self._prepare_merge(iterator, mode, insert_gap)
+			iterator = iter(iterator)
+		# END prepare targets
+		
+		while True:
+			chunk = list(islice(iterator, chunk_size))
+			if not chunk:
+				break
+			# END no more assignments
+			
+			if mode == self.kConnect:
+				pending, num_skipped = _split_connected(chunk)
+				if skip_identical:
+					pending, num_identical = _split_identical(pending)
+					num_skipped += num_identical
+				# END skip identical curves
+				if pending:
+					nt.api.MPlug.mconnectMultiToMulti(pending, force=True)
+				# END connect changed assignments
+				stats['changed'] += len(pending)
+				stats['skipped'] += num_skipped
+			else:
+				self._merge_keys(chunk)
+				stats['changed'] += len(chunk)
+			# END handle mode
+			num_done += len(chunk)
+			yield min(num_done / num_targets, 1.0)
+		# END for each chunk
+		
+	def plan( self, converter=None, predicate=None, intermediates=True ):
+		""":return: ``AssignmentPlan`` with the assignments of our managed curves 
+			to their converted and filtered targets, which can be applied many times 
+			using ``execute``, and be written to disk
+		:param converter: see ``iter_assignments``
+		:param predicate: see ``iter_assignments``
+		:param intermediates: see ``iter_assignments``
+		:note: only targets which exist at the time the plan is created are contained"""
+		plan = AssignmentPlan(self.name(), self._fingerprint())
+		for assignment in self._iter_assignments(predicate, converter, intermediates, False):
+			plan.add(assignment.curve_index, assignment.target_name)
+		# END for each assignment
+		return plan
+		
+	@undoable
+	def execute( self, plan, time_offset=0.0, time_scale=1.0, mode=kConnect, insert_gap=1.0 ):
+		"""Apply the assignments of the given plan, as created by ``plan``. Converters
+		and predicates are not run again.
+		
+		:param plan: ``AssignmentPlan`` created by this handle, or by a handle 
+			managing the same targets, possibly read from disk
+		:param time_offset: see ``apply_animation``
+		:param time_scale: see ``apply_animation``
+		:param mode: see ``apply_animation``
+		:param insert_gap: see ``apply_animation``
+		:return: see ``apply_animation``"""
+		stats = dict()
+		for progress in self.iter_execute(plan, time_offset=time_offset, time_scale=time_scale, 
+											mode=mode, stats=stats, insert_gap=insert_gap):
+			pass
+		# END for each chunk
+		return (stats['changed'], stats['skipped'])
+		
+	def iter_execute( self, plan, chunk_size=None, time_offset=0.0, time_scale=1.0, 
+						mode=kConnect, stats=None, insert_gap=1.0 ):
+		"""Generator version of ``execute``, see ``iter_apply_animation`` for the parameters
+		
+		:return: generator yielding the approximate progress as float between 0.0 and 1.0
+		:raise ValueError: if the plan does not fit our managed animation
+		:note: the plugs the plan's target names resolve to are kept in the plan, hence 
+			executing it again on this handle does not look up any names, unless 
+			one of the involved nodes was deleted in the meanwhile. Call 
+			``plan.invalidate()`` if the target attributes changed otherwise"""
+		if mode not in (self.kConnect, self.kReplace, self.kInsert):
+			raise ValueError("Invalid apply mode: %r" % mode)
+		# END check mode
+		
+		assignments = self._resolve_plan(plan)
+		return self._iter_apply_assignments(iter(assignments), len(assignments), chunk_size, 
+											time_offset, time_scale, mode, stats, insert_gap=insert_gap)
+		
+	def _fingerprint( self ):
+		""":return: fingerprint of our stored targets, see ``animio.plan.fingerprint``"""
+		chain_strings = list()
+		if self.hasAttribute(self._s_intermediate_info_attr):
+			chain_strings = self.findPlug(self._s_intermediate_info_attr).masData().array()
+		# END handle handles of previous versions
+		return fingerprint(self.findPlug(self._s_connection_info_attr).masData().array(), chain_strings)
+		
+	def _resolve_plan( self, plan ):
+		""":return: list of tuple(source_plug, target_plug) of the assignments of the 
+			given plan, which are cached in the plan while all involved nodes exist
+		:raise ValueError: if the plan does not fit our managed animation"""
+		if plan.resolved is not None:
+			owner, node_handles, assignments = plan.resolved
+			if owner.isValid() and owner.object() == self.object():
+				for node_handle in node_handles:
+					if not node_handle.isValid():
+						break
+					# END stop at deleted nodes
+				else:
+					return assignments
+				# END check nodes
+			# END check owner
+		# END handle cached plugs
+		
+		if plan.fingerprint != self._fingerprint():
+			raise ValueError("Plan of %s does not fit the animation managed by %s" % (plan.handle, self))
+		# END check plan
+		
+		# resolve the output plug of each curve once
+		mfndep = nt.api.MFnDependencyNode()
+		affected_by = self.affectedBy
+		num_curves = affected_by.numElements()
+		sources = dict()
+		for index in set(plan.curves):
+			if index >= num_curves:
+				continue
+			# END skip curves we do not have
+			miplug = affected_by.elementByPhysicalIndex(index).minput()
+			if miplug.isNull():
+				log.warn("no animation curve found on %s" % affected_by.elementByPhysicalIndex(index).mfullyQualifiedName())
+				continue
+			# END skip disconnected curves
+			mfndep.setObject(miplug.node())
+			sources[index] = mfndep.findPlug('o')
+		# END for each curve
+		
+		plug_sel_list = nt.api.MSelectionList()
+		nodes = dict()
+		assignments = list()
+		for index, target in plan:
+			s_plug = sources.get(index)
+			if s_plug is None:
+				continue
+			# END skip missing curves
+			
+			try:
+				plug_sel_list.add(target)
+			except:
+				log.warn("target plug named %s does not exist" % target)
+				continue
+			# END check if plug exists
+			t_plug = nt.api.MPlug()
+			plug_sel_list.getPlug(0, t_plug)
+			plug_sel_list.clear()
+			
+			for plug in (s_plug, t_plug):
+				node_handle = nt.api.MObjectHandle(plug.node())
+				nodes[node_handle.hashCode()] = node_handle
+			# END for each node
+			assignments.append((s_plug, t_plug))
+		# END for each assignment
+		
+		plan.resolved = (nt.api.MObjectHandle(self.object()), nodes.values(), assignments)
+		return assignments
+		
+	@classmethod
+	@undoable
+	def apply_many( cls, handles, converter=None, predicate=None, priority=kLastWins ):
+		"""Connect the managed animation of all given handles to their targets at once, 
+		using a single connection pass. If multiple curves animate the same target, 
+		the priority rule decides which one gets connected.
+		
+		:param handles: iterable of AnimationHandles
+		:param converter: see ``iter_assignments``
+		:param predicate: see ``iter_assignments``
+		:param priority: one of our priority rules:
+		
+			* **kLastWins**: the curve of the last handle wins, which matches the result 
+			  of calling ``apply_animation`` on each handle in order
+			* **kFirstWins**: the curve of the first handle wins
+			
+		:return: list of conflicts, sorted by target plug name, as tuple(target_plug_name, 
+			winning_curve_name, list_of_losing_curve_names). Target plugs are named 
+			using the full path of their node. The losing curves are sorted by precedence
+		:note: Will break existing destination connections"""
+		if priority not in (cls.kFirstWins, cls.kLastWins):
+			raise ValueError("Invalid priority rule: %r" % priority)
+		# END check priority
+		
+		handles = list(handles)
+		if priority == cls.kLastWins:
+			handles.reverse()
+		# END handle priority
+		
+		winners = dict()
+		losers = dict()
+		order = list()
+		for handle in handles:
+			for s_plug, t_plug in handle.iter_assignments(predicate=predicate, converter=converter):
+				key = _unique_plug_name(t_plug)
+				if key in winners:
+					losers.setdefault(key, list()).append(s_plug)
+					continue
+				# END handle conflict
+				winners[key] = (s_plug, t_plug)
+				order.append(key)
+			# END for each assignment
+		# END for each handle
+		
+		pending, num_skipped = _split_connected(winners[key] for key in order)
+		if pending:
+			nt.api.MPlug.mconnectMultiToMulti(pending, force=True)
+		# END connect changed assignments
+		
+		mfndep = nt.api.MFnDependencyNode()
+		def curve_name(plug):
+			mfndep.setObject(plug.node())
+			return mfndep.name()
+		# END utility
+		
+		conflicts = list()
+		for key in sorted(losers):
+			conflicts.append((key, curve_name(winners[key][0]), [curve_name(p) for p in losers[key]]))
+		# END for each conflict
+		return conflicts
+		
+	def _retime_info( self ):
+		""":return: tuple(time_offset, time_scale, pivot) currently applied to our 
+			managed curves, pivot is None if they were never retimed"""
+		if not self.hasAttribute(self._s_retime_info_attr):
+			return (0.0, 1.0, None)
+		# END handle handles which were never retimed
+		values = self.findPlug(self._s_retime_info_attr).masData().array()
+		if values.length() != 3:
+			return (0.0, 1.0, None)
+		# END handle unset values
+		return (values[0], values[1], values[2])
+		
+	def _retime( self, time_offset, time_scale ):
+		"""Offset and scale the keys of all managed curves at once, such that they 
+		end up moved by time_offset and scaled by time_scale relative to the keys 
+		as they were stored. Only the difference to the previous retime is applied, 
+		hence calling it repeatedly with the same values does not change the keys.
+		
+		:param time_offset: amount of frames to move the stored keys by
+		:param time_scale: factor by which to scale the stored key times, the first 
+			stored key of all curves is the pivot
+		:note: the applied offset and scale are kept in an attribute, which is set 
+			by command to be undone in order with the key edits"""
+		offset, scale, pivot = self._retime_info()
+		if offset == time_offset and scale == time_scale:
+			return
+		# END nothing to do
+		
+		affected_by = self.affectedBy
+		curve_names = _unique_node_names(affected_by.elementByPhysicalIndex(i).minput() 
+											for i in xrange(affected_by.numElements()))
+		if not curve_names:
+			return
+		# END nothing to retime
+		if pivot is None:
+			pivot = cmds.findKeyframe(curve_names, which="first")
+		# END remember the first stored key
+		
+		# let maya work on all curves in one go - calling the api for each key 
+		# would be much slower. The current keys are scaled around the moved pivot
+		if time_scale != scale:
+			cmds.scaleKey(curve_names, timeScale=time_scale / scale, timePivot=pivot + offset)
+		# END scale
+		if time_offset != offset:
+			cmds.keyframe(curve_names, edit=True, relative=True, timeChange=time_offset - offset, option="over")
+		# END offset
+		
+		if not self.hasAttribute(self._s_retime_info_attr):
+			cmds.addAttr(self.name(), longName=self._l_retime_info_attr, 
+							shortName=self._s_retime_info_attr, dataType="doubleArray")
+		# END add attribute
+		cmds.setAttr("%s.%s" % (self.name(), self._s_retime_info_attr), 
+						3, time_offset, time_scale, pivot, type="doubleArray")
+		
+	@undoable
+	def apply_pose( self, time=kFirstPose, predicate=None, converter=None ):
+		"""Set the target plugs to the values of the managed animation at the given time, 
+		without connecting or creating any animation curves. All values are written 
+		in one batch.
+		
+		:param time: time in frames at which to evaluate the animation, or one of
+			kFirstPose or kLastPose to use the first or last key of the managed animation
+		:param predicate: see ``iter_assignments``
+		:param converter: see ``iter_assignments``
+		:return: amount of plugs which were set
+		:note: targets which are connected are skipped as their value would be 
+			overwritten by their input anyway
+		:note: curves with unitless input, like driven keys, are evaluated at the 
+			current value of their input instead of the given time. Their targets 
+			are skipped if the input is not connected to a driver"""
+		if time == self.kFirstPose:
+			time = self.time_range()[0]
+		elif time == self.kLastPose:
+			time = self.time_range()[1]
+		# END handle special times
+		
+		mtime = nt.api.MTime(time, nt.api.MTime.uiUnit())
+		mfncurve = apianim.MFnAnimCurve()
+		mod = DGModifier()
+		last_plug = value = None
+		num_set = 0
+		for s_plug, t_plug in self.iter_assignments(predicate=predicate, converter=converter):
+			if t_plug.isDestination():
+				log.warn("Skipped %s as it is connected" % t_plug.mfullyQualifiedName())
+				continue
+			# END skip connected targets
+			
+			# the assignments of a curve come in a row, sharing the same source plug, 
+			# hence we evaluate each curve only once
+			if s_plug is not last_plug:
+				mfncurve.setObject(s_plug.node())
+				if mfncurve.isUnitlessInput():
+					value = None
+					input_plug = mfncurve.findPlug("input")
+					if input_plug.isDestination():
+						value = mfncurve.evaluate(input_plug.asDouble())
+					# END evaluate at the driver's value
+				else:
+					value = mfncurve.evaluate(mtime)
+				# END handle input type
+				last_plug = s_plug
+			# END evaluate curve
+			
+			if value is None:
+				log.warn("Skipped %s as its curve has no driver" % t_plug.mfullyQualifiedName())
+				continue
+			# END skip undriven curves
+			
+			_set_plug_value(mod, t_plug, value)
+			num_set += 1
+		# END for each assignment
+		mod.doIt()
+		return num_set
+	
+	#{ Static Pose
+	
+	@undoable
+	def set_static_pose( self, iter_nodes ):
+		"""Store the values of all keyable channels of the given nodes which are 
+		neither animated nor otherwise connected as one array of values alongside 
+		a table of their target plug names. A previous static pose is replaced.
+		
+		:param iter_nodes: see ``set_animation``
+		:return: amount of stored channels
+		:note: locked channels are skipped"""
+		targets, values = _read_static_channels(nt.toSelectionList(iter_nodes))
+		self._set_static_pose_data(targets, values)
+		return len(targets)
+		
+	def static_pose( self ):
+		""":return: tuple(list of target plug names, list of values in internal units) 
+			of our static pose, both lists are empty if there is none"""
+		if not self.hasAttribute(self._s_static_targets_attr):
+			return (list(), list())
+		# END handle handles without static pose
+		targets = list(self.findPlug(self._s_static_targets_attr).masData().array())
+		value_array = self.findPlug(self._s_static_values_attr).masData().array()
+		values = [value_array[i] for i in xrange(value_array.length())]
+		assert len(targets) == len(values), "Static pose values out of sync with their targets"
+		return (targets, values)
+		
+	def apply_static_pose( self, predicate=None, converter=None ):
+		"""Set the channels of our static pose to their stored values. All values 
+		are written in one batch.
+		
+		:param predicate: see ``iter_assignments``, the source plug passed to it is null
+		:param converter: see ``iter_assignments``, the source plug passed to it is null
+		:return: amount of plugs which were set
+		:note: targets which do not exist, are locked or are connected are skipped"""
+		targets, values = self.static_pose()
+		null_plug = nt.api.MPlug()
+		map_names = getattr(converter, 'map_names', None)
+		if map_names is not None:
+			targets = map_names(targets)
+		elif converter:
+			targets = [converter(null_plug, name) for name in targets]
+		# END convert names
+		
+		mod = DGModifier()
+		plug_sel_list = nt.api.MSelectionList()
+		num_set = 0
+		for name, value in zip(targets, values):
+			if name is None or (predicate and not predicate(null_plug, name)):
+				continue
+			# END filter
+			
+			plug = nt.api.MPlug()
+			plug_sel_list.clear()
+			try:
+				plug_sel_list.add(name)
+			except:
+				log.warn("target plug named %s does not exist" % name)
+				continue
+			# END check if plug exists
+			plug_sel_list.getPlug(0, plug)
+			
+			if plug.isDestination() or plug.isLocked():
+				log.warn("Skipped %s as it is connected or locked" % name)
+				continue
+			# END skip driven targets
+			_set_plug_value(mod, plug, value)
+			num_set += 1
+		# END for each static channel
+		mod.doIt()
+		return num_set
+		
+	def _set_static_pose_data( self, targets, values ):
+		"""Store the given list of target plug names and the list of their values"""
+		if not self.hasAttribute(self._s_static_targets_attr):
+			attr = nt.TypedAttribute.create(self._l_static_targets_attr, self._s_static_targets_attr,
+								nt.api.MFnData.kStringArray, nt.StringArrayData.create(list()))
+			self.addAttribute(attr)
+			attr = nt.TypedAttribute.create(self._l_static_values_attr, self._s_static_values_attr,
+								nt.api.MFnData.kDoubleArray, 
+								nt.api.MFnDoubleArrayData().create(nt.api.MDoubleArray()))
+			self.addAttribute(attr)
+		# END add attributes
+		
+		value_array = nt.api.MDoubleArray()
+		for value in values:
+			value_array.append(value)
+		# END for each value
+		self.findPlug(self._s_static_targets_attr).setMObject(nt.StringArrayData.create(targets))
+		self.findPlug(self._s_static_values_attr).setMObject(nt.api.MFnDoubleArrayData().create(value_array))
+	
+	#} END static pose
+	
+	@classmethod
+	def _target_curve( cls, source_plug, target_plug ):
+		""":return: MObject of the animation curve driving the target_plug, or None
+			if it is not driven by an animation curve or by the source curve itself"""
+		tinput = target_plug.minput()
+		if tinput.isNull():
+			return None
+		# END unconnected target
+		
+		tnode = tinput.node()
+		if not tnode.hasFn(nt.api.MFn.kAnimCurve) or tnode == source_plug.node():
+			return None
+		return tnode
+	
+	@classmethod
+	def _prepare_merge( cls, assignments, mode, insert_gap=1.0 ):
+		"""Make room for the keys of the given assignments on their target curves, 
+		according to the given merge mode. Each target curve makes room for the key 
+		range of its own source curve, target curves sharing the same range are 
+		edited by a single command
+		
+		:param insert_gap: see ``apply_animation``"""
+		mfndep = nt.api.MFnDependencyNode()
+		mfncurve = apianim.MFnAnimCurve()
+		targets_by_range = dict()
+		for s, t in assignments:
+			tnode = cls._target_curve(s, t)
+			if tnode is None:
+				continue
+			# END skip targets without curves
+			mfncurve.setObject(s.node())
+			inputs = _key_inputs(mfncurve)
+			if not inputs:
+				continue
+			# END skip empty sources
+			flag = (mfncurve.isUnitlessInput() and 'float') or 'time'
+			mfndep.setObject(tnode)
+			targets_by_range.setdefault((flag, inputs[0], inputs[-1]), list()).append(mfndep.name())
+		# END for each assignment
+		
+		for (flag, first, last), target_names in targets_by_range.iteritems():
+			if mode == cls.kInsert:
+				# shift all keys behind the incoming range
+				kwargs = {flag : ("%f:" % first,), flag + 'Change' : (last - first) + insert_gap}
+				cmds.keyframe(target_names, edit=True, relative=True, option="over", **kwargs)
+			else:
+				cmds.cutKey(target_names, clear=True, **{flag : (first, last)})
+			# END handle mode
+		# END for each range
+	
+	@classmethod
+	def _merge_keys( cls, assignments ):
+		"""Write the keys of all source curves into the curves driving the target plugs,
+		creating new curves on unanimated targets. Tangents and infinity types are 
+		copied as well, see ``_write_curve_data``. All edits are undoable"""
+		src_fn = apianim.MFnAnimCurve()
+		dst_fn = apianim.MFnAnimCurve()
+		hashes = curve_hashes()
+		fps = _current_fps()
+		change = _AnimCurveChange()
+		unanimated = list()
+		for s_plug, t_plug in assignments:
+			tnode = cls._target_curve(s_plug, t_plug)
+			if tnode is None:
+				tinput = t_plug.minput()
+				if not tinput.isNull():
+					if tinput.node() == s_plug.node():
+						continue
+					# END skip curves which already drive their target
+					log.warn("Cannot merge animation into %s as it is driven by %s" % (t_plug.mfullyQualifiedName(), tinput.mfullyQualifiedName()))
+					continue
+				# END handle non-curve inputs
+				unanimated.append((s_plug, t_plug))
+				continue
+			# END handle unanimated targets
+			
+			dst_fn.setObject(tnode)
+			src_fn.setObject(s_plug.node())
+			_write_curve_data(dst_fn, _read_curve_data(src_fn, list()), fps, change.change)
+			hashes.discard(tnode)
+		# END for each assignment
+		
+		# unanimated targets receive copies of their source curves, created at once
+		if unanimated:
+			_create_curves(cls._source_curve_data(s for s, t in unanimated), 
+							plugs=[t for s, t in unanimated])
+		# END handle unanimated targets
+		
+	@classmethod
+	def _source_curve_data( cls, source_plugs ):
+		""":return: list of ``CurveData`` instances of the curves of the given plugs, 
+			with key times in the current time unit"""
+		return cls._curve_data(s_plug.node() for s_plug in source_plugs)
+		
+	@classmethod
+	def _curve_data( cls, curves ):
+		""":return: list of ``CurveData`` instances of the given animation curve MObjects, 
+			with key times in the current time unit"""
+		mfncurve = apianim.MFnAnimCurve()
+		out = list()
+		for curve in curves:
+			mfncurve.setObject(curve)
+			out.append(_read_curve_data(mfncurve, list()))
+		# END for each curve
+		return out
+	
 	#} END edit
 	
+	#{ Animation Layers
+	
+	@classmethod
+	@undoable
+	def create_layer_handles( cls, iter_nodes ):
+		"""Create one handle per animation layer, managing the curves of the layer 
+		which animate the given nodes, and storing the layer's settings, see ``layer_info``
+		
+		:param iter_nodes: see ``set_animation``
+		:return: list of new handles, handles of parent layers come before the ones 
+			of their children. Layers without animation of the given nodes are skipped. 
+			If there are no animation layers, a single handle managing all animation 
+			of the nodes is returned"""
+		sellist = nt.toSelectionList(iter_nodes)
+		layers = list(_iter_layers())
+		if not layers:
+			handle = cls.create()
+			handle.set_animation(sellist)
+			return [handle]
+		# END handle scenes without layers
+		
+		curves_by_layer = dict()
+		layered = set()
+		for layer in layers[1:]:
+			curves_by_layer[layer] = cmds.animLayer(layer, q=True, animCurves=True) or list()
+			layered.update(curves_by_layer[layer])
+		# END for each layer
+		
+		# the root layer has all curves which are not part of another layer
+		mfndep = nt.api.MFnDependencyNode()
+		root_curves = set(cmds.animLayer(layers[0], q=True, animCurves=True) or list())
+		for apinode, targets in animation_discovery().get(sellist):
+			mfndep.setObject(apinode)
+			root_curves.add(mfndep.name())
+		# END for each curve
+		curves_by_layer[layers[0]] = sorted(root_curves - layered)
+		
+		# keep the curves animating the given nodes, all layers share the resolver
+		# as their curves run through the same blend nodes
+		node_names = _node_names(sellist)
+		resolver = _TargetResolver()
+		handles = list()
+		for index, layer in enumerate(layers):
+			curves = list()
+			for apinode in _to_objects(curves_by_layer[layer]):
+				mfndep.setObject(apinode)
+				targets = resolver.targets(mfndep.findPlug('o'))
+				for target, chain in targets:
+					if target.split('.', 1)[0] in node_names:
+						curves.append((apinode, targets))
+						break
+					# END if curve animates the nodes
+				# END for each target
+			# END for each curve of the layer
+			
+			if not curves:
+				continue
+			# END skip unaffected layers
+			handle = cls.create(layer + "Handle")
+			handle._set_curves(curves)
+			handle.set_layer_info(_read_layer_info(layer, index, index == 0))
+			handles.append(handle)
+		# END for each layer
+		return handles
+		
+	def layer_info( self ):
+		""":return: dictionary with the settings of the animation layer our curves 
+			were exported from, see ``animio.clip.parse_layer_info``, or None if 
+			this handle was not created by ``create_layer_handles``"""
+		if not self.hasAttribute(self._s_layer_info_attr):
+			return None
+		# END handle regular handles
+		entries = self.findPlug(self._s_layer_info_attr).masData().array()
+		if not len(entries):
+			return None
+		# END handle empty info
+		return parse_layer_info(entries)
+		
+	@undoable
+	def set_layer_info( self, info ):
+		"""Store the given dictionary of animation layer settings, or remove them if None"""
+		if not self.hasAttribute(self._s_layer_info_attr):
+			attr = nt.TypedAttribute.create(self._l_layer_info_attr, self._s_layer_info_attr,
+								nt.api.MFnData.kStringArray, nt.StringArrayData.create(list()))
+			self.addAttribute(attr)
+		# END add attribute
+		entries = (info is not None and format_layer_info(info)) or list()
+		self.findPlug(self._s_layer_info_attr).setMObject(nt.StringArrayData.create(entries))
+		
+	@undoable
+	def apply_layer( self, converter=None, predicate=None, time_offset=0.0, time_scale=1.0 ):
+		"""Apply the managed animation to the animation layer it was exported from, 
+		creating the layer if needed. All targets are added to the layer at once, 
+		and the curves are connected to the layer's blend nodes in a single pass, 
+		replacing the curves the layer created for them.
+		
+		:param converter: see ``iter_assignments``
+		:param predicate: see ``iter_assignments``
+		:param time_offset: see ``apply_animation``
+		:param time_scale: see ``apply_animation``
+		:return: name of the layer
+		:raise ValueError: if we do not store layer information, see ``layer_info``
+		:note: the root layer's animation is applied using ``apply_animation``
+		:note: if the parent layer does not exist, the layer is created below the root layer"""
+		info = self.layer_info()
+		if info is None:
+			raise ValueError("%s does not store animation layer information" % self)
+		# END check info
+		if info['root']:
+			self.apply_animation(converter, time_offset, time_scale, predicate=predicate)
+			return cmds.animLayer(q=True, root=True) or info['name']
+		# END handle root layer
+		
+		layer = self._assure_layer(info)
+		assignments = list(self.iter_assignments(predicate, converter, intermediates=False))
+		if assignments:
+			cmds.animLayer(layer, edit=True, attribute=[t.mfullyQualifiedName() for s, t in assignments])
+			
+			inputs = self._layer_inputs(layer)
+			pairs = list()
+			for s_plug, t_plug in assignments:
+				input_plug = inputs.get(t_plug.mfullyQualifiedName())
+				if input_plug is None:
+					log.warn("%s was not added to layer %s" % (t_plug.mfullyQualifiedName(), layer))
+					continue
+				# END skip unlayered targets
+				pairs.append((s_plug, input_plug))
+			# END for each assignment
+			
+			sources = _unique_node_names(s for s, i in pairs)
+			placeholders = [n for n in _unique_node_names(i.minput() for s, i in pairs) if n not in sources]
+			self._retime(time_offset, time_scale)
+			pairs, num_skipped = _split_connected(pairs)
+			if pairs:
+				nt.api.MPlug.mconnectMultiToMulti(pairs, force=True)
+			# END connect changed assignments
+			if placeholders:
+				cmds.delete(placeholders)
+			# END remove replaced curves
+		# END handle assignments
+		
+		for attr in _layer_attributes:
+			if attr in info:
+				value = info[attr]
+				if attr != 'weight':
+					value = int(value)
+				# END handle enumerations
+				cmds.setAttr("%s.%s" % (layer, attr), value)
+			# END if setting was stored
+		# END for each setting
+		return layer
+		
+	@classmethod
+	def _assure_layer( cls, info ):
+		""":return: name of the unlocked animation layer described by the given layer info, 
+			which is created if it does not exist"""
+		layer = info['name']
+		if cmds.objExists(layer) and cmds.nodeType(layer) == 'animLayer':
+			cmds.setAttr(layer + ".lock", 0)
+			return layer
+		# END use existing layer
+		
+		kwargs = dict(override=bool(info.get('override')))
+		parent = info.get('parent')
+		if parent and cmds.objExists(parent):
+			kwargs['parent'] = parent
+		# END handle parent
+		return cmds.animLayer(layer, **kwargs)
+		
+	@classmethod
+	def _layer_inputs( cls, layer ):
+		""":return: dict(target_plug_name: input_plug) mapping the final targets of the 
+			given animation layer to the inputs of its blend nodes taking the layer's animation"""
+		mfndep = nt.api.MFnDependencyNode()
+		resolver = _TargetResolver()
+		out = dict()
+		for apinode in _to_objects(cmds.animLayer(layer, q=True, blendNodes=True) or list()):
+			mfndep.setObject(apinode)
+			for input_name, output_name in _layer_blend_channels(mfndep.typeName()):
+				input_plug = mfndep.findPlug(input_name)
+				for target, chain in resolver.targets(mfndep.findPlug(output_name)):
+					out[target] = input_plug
+				# END for each target
+			# END for each channel
+		# END for each blend node
+		return out
+	
+	#} END animation layers
+	
+	#{ Takes
+	
+	def takes( self ):
+		""":return: list of the names of our takes, in the order they were added"""
+		return [name for name, indices in self._take_info()]
+		
+	def active_take( self ):
+		""":return: name of the active take, or None if we have no takes"""
+		if not self.hasAttribute(self._s_active_take_attr):
+			return None
+		# END handle handles without takes
+		return self.findPlug(self._s_active_take_attr).asString() or None
+		
+	def _take_info( self ):
+		""":return: list of tuple(name, curve_indices) of each of our takes, see 
+			``animio.clip.parse_take_info``"""
+		if not self.hasAttribute(self._s_take_info_attr):
+			return list()
+		# END handle handles without takes
+		return parse_take_info(self.findPlug(self._s_take_info_attr).masData().array())
+		
+	def _take_indices( self ):
+		""":return: sorted list of the physical indices of the curves of the active 
+			take, or None if we have no takes and all curves are to be used"""
+		active = self.active_take()
+		if active is None:
+			return None
+		# END handle handles without takes
+		for name, indices in self._take_info():
+			if name == active:
+				return sorted(indices)
+		# END for each take
+		return None
+		
+	def _set_take_info( self, takes, active ):
+		"""Store the given list of tuple(name, curve_indices) and the name of the 
+		active take, which may be None if there are no takes"""
+		if not self.hasAttribute(self._s_take_info_attr):
+			attr = nt.TypedAttribute.create(self._l_take_info_attr, self._s_take_info_attr,
+								nt.api.MFnData.kStringArray, nt.StringArrayData.create(list()))
+			self.addAttribute(attr)
+			attr = nt.TypedAttribute.create(self._l_active_take_attr, self._s_active_take_attr,
+								nt.api.MFnData.kString, nt.api.MFnStringData().create(''))
+			self.addAttribute(attr)
+		# END add attributes
+		self.findPlug(self._s_take_info_attr).setMObject(nt.StringArrayData.create(format_take_info(takes)))
+		self.findPlug(self._s_active_take_attr).setString(active or '')
+		
+	@notundoable
+	def add_take( self, name, iter_nodes ):
+		"""Store the current animation of the given nodes as a new take. 
+		
+		All takes share one pool of managed curves. Curves whose keys, targets and 
+		intermediates equal those of a curve in the pool are shared, only curves 
+		which differ are copied into the pool, hence each take costs as much as its 
+		differences to the previous takes. Curves are compared by their content 
+		hash, see ``CurveHashes``.
+		
+		:param name: unique name of the take
+		:param iter_nodes: see ``set_animation``
+		:return: tuple(num_shared, num_stored) with the amount of curves shared with 
+			other takes, and the amount of curves copied into the pool
+		:raise ValueError: if a take with the given name exists, or if we manage 
+			curves which do not belong to any take, like after ``set_animation``. 
+			Call ``clear`` first in that case
+		:note: the first take becomes the active take
+		:note: the pool holds private copies of the animation, which are not connected 
+			to any target. Use ``set_active_take`` to put a take onto the targets, 
+			connecting the pool curves with ``apply_animation`` would make edits alter 
+			the take"""
+		takes = self._take_info()
+		if name in [n for n, indices in takes]:
+			raise ValueError("%s has a take named %r already" % (self, name))
+		# END check name
+		
+		target_strings = list(self.findPlug(self._s_connection_info_attr).masData().array())
+		chain_strings = list()
+		if self.hasAttribute(self._s_intermediate_info_attr):
+			chain_strings = list(self.findPlug(self._s_intermediate_info_attr).masData().array())
+		# END get chains
+		if len(chain_strings) != len(target_strings):
+			chain_strings = [''] * len(target_strings)
+		# END handle missing chains
+		
+		if len(set(i for n, indices in takes for i in indices)) != len(target_strings):
+			raise ValueError("%s manages curves which do not belong to a take" % self)
+		# END check pool
+		
+		# curves are shared if they animate the same targets with the same keys
+		hashes = curve_hashes()
+		pool = dict()
+		for index, curve in enumerate(self.iter_animation(asNode=False)):
+			pool.setdefault((target_strings[index], chain_strings[index], hashes.get(curve)), index)
+		# END for each pooled curve
+		
+		indices = list()
+		new_curves = list()
+		num_curves = len(target_strings)
+		for curve, targets in animation_discovery().get(iter_nodes):
+			target_string = self._k_separator.join(t for t, c in targets)
+			chain_string = self._k_separator.join(self._k_chain_separator.join(c) for t, c in targets)
+			key = (target_string, chain_string, hashes.get(curve))
+			index = pool.get(key)
+			if index is None:
+				index = pool[key] = num_curves + len(new_curves)
+				new_curves.append(curve)
+				target_strings.append(target_string)
+				chain_strings.append(chain_string)
+			# END store differing curve
+			indices.append(index)
+		# END for each animated curve
+		
+		if new_curves:
+			copies = _create_curves(self._curve_data(new_curves))
+			mfndep = nt.api.MFnDependencyNode()
+			def iter_plugs():
+				affected_by_plug = self.affectedBy
+				for pindex, apinode in enumerate(copies):
+					mfndep.setObject(apinode)
+					yield (mfndep.findPlug('msg'), affected_by_plug.elementByLogicalIndex(num_curves + pindex))
+				# END for each pair to yield
+			# END iterator helper
+			nt.api.MPlug.mconnectMultiToMulti(iter_plugs(), force=False)
+			self._set_targets(target_strings, chain_strings)
+		# END store new curves
+		
+		takes.append((name, indices))
+		self._set_take_info(takes, self.active_take() or name)
+		return (len(indices) - len(new_curves), len(new_curves))
+		
+	@notundoable
+	def set_active_take( self, name, apply=True ):
+		"""Make the take with the given name the active one, which is used by all 
+		methods applying or querying our animation
+		
+		:param apply: if True, the animation of the take is put onto its targets. 
+			Only targets driven by curves with different keys are changed, targets 
+			whose curves are identical to the take's curves are skipped, see 
+			``CurveHashes``. Unanimated targets receive copies of the take's curves
+		:return: tuple(num_changed, num_skipped) with the amount of targets which 
+			received the keys of the take, and the amount of targets which had them 
+			already
+		:raise ValueError: if there is no take with the given name
+		:note: keys of differing target curves are replaced rather than connecting 
+			the take's curves, which keeps the stored takes unaffected by later edits"""
+		takes = self._take_info()
+		if name not in [n for n, indices in takes]:
+			raise ValueError("%s has no take named %r" % (self, name))
+		# END check name
+		self._set_take_info(takes, name)
+		if not apply:
+			return (0, 0)
+		# END handle switch only
+		
+		hashes = curve_hashes()
+		changed = list()
+		unanimated = list()
+		num_skipped = 0
+		for s_plug, t_plug in self.iter_assignments():
+			tinput = t_plug.minput()
+			if tinput.isNull():
+				unanimated.append((s_plug, t_plug))
+				continue
+			# END handle unanimated targets
+			
+			tnode = tinput.node()
+			snode = s_plug.node()
+			if not tnode.hasFn(nt.api.MFn.kAnimCurve):
+				log.warn("Cannot apply take %r to %s as it is driven by %s" % (name, t_plug.mfullyQualifiedName(), tinput.mfullyQualifiedName()))
+				continue
+			# END handle non-curve inputs
+			if tnode == snode or hashes.get(tnode) == hashes.get(snode):
+				num_skipped += 1
+				continue
+			# END skip identical curves
+			changed.append((snode, tnode))
+		# END for each assignment
+		
+		# replace all keys of differing curves, keeping the curves and their connections
+		src_fn = apianim.MFnAnimCurve()
+		dst_fn = apianim.MFnAnimCurve()
+		fps = _current_fps()
+		for snode, tnode in changed:
+			src_fn.setObject(snode)
+			dst_fn.setObject(tnode)
+			for kindex in reversed(xrange(dst_fn.numKeys())):
+				dst_fn.remove(kindex)
+			# END for each key to remove
+			_write_curve_data(dst_fn, _read_curve_data(src_fn, list()), fps)
+			hashes.discard(tnode)
+		# END for each differing curve
+		
+		if unanimated:
+			_create_curves(self._source_curve_data(s for s, t in unanimated), 
+							plugs=[t for s, t in unanimated])
+		# END handle unanimated targets
+		return (len(changed) + len(unanimated), num_skipped)
+		
+	@notundoable
+	def remove_take( self, name ):
+		"""Remove the take with the given name, deleting the curves of the pool 
+		which are not used by any other take
+		
+		:raise ValueError: if there is no take with the given name
+		:note: if the take was active, the first remaining take becomes active"""
+		takes = self._take_info()
+		remaining = [(n, indices) for n, indices in takes if n != name]
+		if len(remaining) == len(takes):
+			raise ValueError("%s has no take named %r" % (self, name))
+		# END check name
+		
+		active = self.active_take()
+		if active == name:
+			active = (remaining and remaining[0][0]) or None
+		# END choose new active take
+		
+		used = sorted(set(i for n, indices in remaining for i in indices))
+		curves = list(self.iter_animation(asNode=False))
+		target_strings = self.findPlug(self._s_connection_info_attr).masData().array()
+		chain_strings = [''] * len(target_strings)
+		if self.hasAttribute(self._s_intermediate_info_attr):
+			chain_strings = self.findPlug(self._s_intermediate_info_attr).masData().array()
+		# END get chains
+		
+		mfndep = nt.api.MFnDependencyNode()
+		used_set = set(used)
+		unused_names = list()
+		for index, curve in enumerate(curves):
+			if index not in used_set:
+				mfndep.setObject(curve)
+				unused_names.append(mfndep.name())
+			# END remember unused curve
+		# END for each curve
+		
+		# keep the pool compact, remapping the indices of the remaining takes
+		remap = dict((index, new_index) for new_index, index in enumerate(used))
+		self._set_curves([(curves[i], list()) for i in used])
+		self._set_targets([target_strings[i] for i in used], [chain_strings[i] for i in used])
+		self._set_take_info([(n, [remap[i] for i in indices]) for n, indices in remaining], active)
+		if unused_names:
+			cmds.delete(unused_names)
+		# END delete unused curves
+	
+	#} END takes
+	
+	#{ Query
+	
+	def time_range( self ):
+		""":return: tuple(first_key_time, last_key_time) of all managed animation, 
+			or of the animation of the active take if we have takes
+		:raise ValueError: if we do not manage any animation"""
+		affected_by = self.affectedBy
+		take_indices = self._take_indices()
+		if take_indices is None:
+			take_indices = xrange(affected_by.numElements())
+		# END use all curves
+		curve_names = _unique_node_names(affected_by.elementByPhysicalIndex(i).minput() for i in take_indices)
+		if not curve_names:
+			raise ValueError("%s does not manage any animation" % self)
+		# END handle empty handle
+		return (cmds.findKeyframe(curve_names, which="first"), 
+				cmds.findKeyframe(curve_names, which="last"))
+	
+	#} END query
+	
 	#{ Utilities
 	@undoable
-	def paste_animation( self, sTimeRange=tuple(), tTimeRange=tuple(), option="fitInsert", predicate=None, converter=None ):
+	def paste_animation( self, sTimeRange=tuple(), tTimeRange=tuple(), option="fitInsert", predicate=None, converter=None, 
+							skip_identical=False ):
 		"""paste the stored animation to their respective target animation curves, if target does not exist it will be created
 		:param sTimeRange: tuple of timerange passed to copyKey
 		:param tTimeRange: tuple of timerange passed to pasteKey
 		:param option: option on how to paste forwarded to pasteKey (useful: "fitInsert", "fitReplace", "scaleInsert", "scaleReplace")
 		:param predicate and converter: passed to ``iter_assignments``, see documentation there
+		:param skip_identical: if True, targets whose animation curve has the same keys 
+			as their source curve are skipped, see ``CurveHashes``. It cannot be used 
+			with inserting options, as skipped targets would not make room for the 
+			pasted keys
+		:return: tuple(num_changed, num_skipped) with the amount of targets which received
+			keys, and the amount of targets skipped as their curve was identical
+		:raise ValueError: if skip_identical is used with an inserting option
 		:todo: handle if range is out of curve (error:nothing to paste from) - should paste the pose in this range"""
-		iter_plugs=self.iter_assignments(predicate=predicate, converter=converter)
+		if skip_identical and option.lower().endswith("insert"):
+			raise ValueError("Identical targets cannot be skipped when pasting with option %r" % option)
+		# END check arguments
+		assignments = list(self.iter_assignments(predicate=predicate, converter=converter))
+		animated = [a for a in assignments if apianim.MAnimUtil.isAnimated(a[1])]
+		unanimated = [a for a in assignments if not apianim.MAnimUtil.isAnimated(a[1])]
+		num_skipped = 0
+		if skip_identical:
+			animated, num_skipped = _split_identical(animated)
+		# END skip identical curves
+		
+		# create the curves of all unanimated targets at once. Without time ranges, 
+		# they are plain copies of their source curves, hence there is nothing to paste
+		paste = animated
+		if unanimated:
+			if not sTimeRange and not tTimeRange:
+				_create_curves(self._source_curve_data(s for s, t in unanimated), 
+								plugs=[t for s, t in unanimated])
+			else:
+				_create_curves([CurveData() for a in unanimated], plugs=[t for s, t in unanimated])
+				paste = animated + unanimated
+			# END handle time ranges
+		# END create missing curves
 		
 		# get animCurves form plugs and copy pate
-		for s_plug, t_plug in iter_plugs:
+		for s_plug, t_plug in paste:
 			s_animcrv=s_plug.mwn()
-			
-			if apianim.MAnimUtil.isAnimated(t_plug):
-				t_animcrv=t_plug.minput().mwn()
-			else:
-				t_animcrv=nt.Node(apianim.MFnAnimCurve().create(t_plug))
-			# END get new or existing animCurve
-				
+			t_animcrv=t_plug.minput().mwn()
 			cmds.copyKey(s_animcrv, time=sTimeRange, option="curve"  )
 			cmds.pasteKey(t_animcrv, time=tTimeRange, option=option)
 		 # END for each assignment
+		return (len(animated) + len(unanimated), num_skipped)
 			
 	#} END Utilities
 	
@@ -286,6 +2629,42 @@ class AnimationHandle( nt.Network ):
 		ahref=FileReference.create(input_file, loadReferenceDepth="topOnly")
 		refns=ahref.namespace()
 		return (ahref, cls.iter_instances(predicate = lambda x: x.namespace() == refns))
+		
+	@classmethod
+	@notundoable
+	def from_clip( cls, clip ):
+		"""Create the animation curves described by the given clip and a new 
+		AnimationHandle managing them, without referencing any file
+		
+		:return: new AnimationHandle
+		:param clip: ``ClipData`` instance, as returned by ``animio.clip.read_clips``
+		:note: key times are converted from the clip's time unit into the current one"""
+		handle = cls.create(clip.name.split(':')[-1] or "animationHandle")
+		curves = _create_curves(clip.curves, clip.fps)
+		
+		mfndep = nt.api.MFnDependencyNode()
+		def iter_plugs():
+			affected_by_plug = handle.affectedBy
+			for pindex, apinode in enumerate(curves):
+				mfndep.setObject(apinode)
+				yield (mfndep.findPlug('msg'), affected_by_plug.elementByLogicalIndex(pindex))
+			# END for each pair to yield
+		# END iterator helper
+		nt.api.MPlug.mconnectMultiToMulti(iter_plugs(), force=False)
+		
+		target_plug_strings = [cls._k_separator.join(cd.targets) for cd in clip.curves]
+		chain_strings = [cls._k_separator.join(chains) for chains in clip.intermediates]
+		handle._set_targets(target_plug_strings, chain_strings)
+		if clip.layer_info is not None:
+			handle.set_layer_info(clip.layer_info)
+		# END handle layers
+		if clip.static_targets:
+			handle._set_static_pose_data(clip.static_targets, clip.static_values)
+		# END handle static pose
+		if clip.takes:
+			handle._set_take_info(clip.takes, clip.active_take)
+		# END handle takes
+		return handle
 	
 	@notundoable
 	def to_file( self, output_file, **kwargs ):
@@ -295,11 +2674,166 @@ class AnimationHandle( nt.Network ):
 		:param output_file: Path object or path string to export file.
 			Parent directories will be created as needed
 		:param kwargs: passed to the ``Scene.export`` method"""
+		return self.handles_to_file([self], output_file, **kwargs)
+		
+	@classmethod
+	@notundoable
+	def handles_to_file( cls, handles, output_file, **kwargs ):
+		"""export the given AnimationHandles and all their managed nodes into one file
+		
+		:return: path to exported file
+		:param output_file: see ``to_file``. If it has the extension of our native 
+			format, see ``animio.clip.is_native_file``, ``iter_write_native`` is used. 
+			For shard manifests, see ``animio.shard.is_manifest_file``, ``iter_write_shards`` 
+			is used
+		:param kwargs: passed to the ``Scene.export`` method, or to ``iter_write_native``
+			or ``iter_write_shards`` when writing native files"""
+		if is_native_file(output_file) or is_manifest_file(output_file):
+			writer = (is_native_file(output_file) and cls.iter_write_native) or cls.iter_write_shards
+			for progress in writer(handles, output_file, **kwargs):
+				pass
+			# END for each chunk
+			return Path(output_file)
+		# END handle native files
+		
 		# build selectionlist for export
-		exp_slist = nt.toSelectionList(self.iter_animation(asNode=0))     
-		exp_slist.add(self.object())
+		exp_slist = nt.api.MSelectionList()
+		for handle in handles:
+			for apinode in handle.iter_animation(asNode=0):
+				exp_slist.add(apinode)
+			# END for each curve
+			exp_slist.add(handle.object())
+		# END for each handle
 		return Scene.export(output_file, exp_slist, **kwargs ) 
 			
+	@classmethod
+	def iter_write_native( cls, handles, output_file, chunk_size=250, threads=2 ):
+		"""Generator writing the animation of the given handles into a file of our 
+		native compressed format, which can be read by ``animio.clip.read_clips``.
+		
+		Curve data is extracted in chunks in the calling thread, as it requires maya, 
+		while previous chunks are encoded, compressed and written by the threads 
+		of an ``animio.clip.ClipWriter``.
+		
+		:param handles: iterable of AnimationHandles
+		:param output_file: path to the file to write, parent directories will be 
+			created as needed
+		:param chunk_size: amount of curves to extract per step
+		:param threads: amount of threads encoding and compressing chunks
+		:return: generator yielding the progress as float between 0.0 and 1.0
+		:note: closing the generator before it is exhausted discards the file"""
+		handles = list(handles)
+		parent_dir = Path(output_file).dirname()
+		if parent_dir and not parent_dir.isdir():
+			parent_dir.makedirs()
+		# END create parent directories
+		
+		fps = _current_fps()
+		num_curves = float(sum(h.affectedBy.numElements() for h in handles)) or 1.0
+		num_done = 0
+		writer = ClipWriter(output_file, threads)
+		try:
+			for handle in handles:
+				static_targets, static_values = handle.static_pose()
+				writer.begin_clip(ClipData(handle.name(), fps=fps, layer_info=handle.layer_info(), 
+											static_targets=static_targets, static_values=static_values, 
+											takes=handle._take_info(), active_take=handle.active_take()))
+				iterator = handle._iter_curve_data_and_chains()
+				while True:
+					chunk = list(islice(iterator, chunk_size))
+					if not chunk:
+						break
+					# END no more curves
+					writer.add_curves([c for c, i in chunk], [i for c, i in chunk])
+					num_done += len(chunk)
+					yield min(num_done / num_curves, 1.0)
+				# END for each chunk
+			# END for each handle
+			writer.close()
+		except:
+			writer.abort()
+			raise
+		# END discard file on error
+		yield 1.0
+			
+	@classmethod
+	def iter_write_shards( cls, handles, manifest_file, shard_by=kByNamespace, max_curves=20000, 
+							chunk_size=250, threads=2 ):
+		"""Generator writing the animation of the given handles into multiple files 
+		of our native format, as well as a manifest describing them, see ``animio.shard``. 
+		Each shard is written by ``animio.clip.ClipWriter``, a handle whose curves 
+		are distributed into multiple shards is stored as one clip per shard.
+		
+		:param handles: iterable of AnimationHandles
+		:param manifest_file: path to the manifest, the shards are written next to it
+		:param shard_by: see ``animio.shard.plan_shards``
+		:param max_curves: see ``animio.shard.plan_shards``
+		:param chunk_size: see ``iter_write_native``
+		:param threads: see ``iter_write_native``
+		:return: generator yielding the progress as float between 0.0 and 1.0
+		:note: the manifest is written last, closing the generator early leaves 
+			it untouched"""
+		handles = list(handles)
+		parent_dir = Path(manifest_file).dirname()
+		if parent_dir and not parent_dir.isdir():
+			parent_dir.makedirs()
+		# END create parent directories
+		
+		handle_targets = list()
+		for handle in handles:
+			handle_targets.append([[n for n in names.split(cls._k_separator) if n] for names in 
+									handle.findPlug(cls._s_connection_info_attr).masData().array()])
+		# END for each handle
+		plan = plan_shards(handle_targets, shard_by, max_curves)
+		
+		fps = _current_fps()
+		num_curves = float(sum(len(indices) for shard in plan for h, indices in shard)) or 1.0
+		num_done = 0
+		manifest = Manifest()
+		has_static_pose = set()
+		for sindex, shard in enumerate(plan):
+			path = shard_path(manifest_file, sindex)
+			writer = ClipWriter(path, threads)
+			try:
+				for hindex, indices in shard:
+					handle = handles[hindex]
+					static_targets, static_values = list(), list()
+					if hindex not in has_static_pose:
+						static_targets, static_values = handle.static_pose()
+						has_static_pose.add(hindex)
+					# END store static pose only once
+					
+					# take indices refer to the curves of this shard
+					shard_indices = dict((index, local) for local, index in enumerate(indices))
+					takes = [(name, [shard_indices[i] for i in take_indices if i in shard_indices]) 
+								for name, take_indices in handle._take_info()]
+					writer.begin_clip(ClipData(handle.name(), fps=fps, layer_info=handle.layer_info(), 
+												static_targets=static_targets, static_values=static_values, 
+												takes=takes, active_take=handle.active_take()))
+					
+					iterator = handle._iter_curve_data_and_chains(indices)
+					while True:
+						chunk = list(islice(iterator, chunk_size))
+						if not chunk:
+							break
+						# END no more curves
+						writer.add_curves([c for c, i in chunk], [i for c, i in chunk])
+						num_done += len(chunk)
+						yield min(num_done / num_curves, 1.0)
+					# END for each chunk
+				# END for each handle part
+				writer.close()
+			except:
+				writer.abort()
+				raise
+			# END discard shard on error
+			
+			manifest.add_shard(Path(path).basename(), [handles[h].name() for h, indices in shard], 
+								[handle_targets[h][i] for h, indices in shard for i in indices])
+		# END for each shard
+		manifest.write(manifest_file)
+		yield 1.0
+	
 	def delete( self ):
 		"""AnimationHandle will disapear without a trace, no matter if it was created in
 		the current file or if it came from a referenced file"""
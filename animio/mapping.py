@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Contains mapping tables which retarget animation between rigs with different
+naming schemes.
+
+A table consists of exact plug name pairs and wildcard rules. It can be used
+wherever a converter is accepted, see ``AnimationHandle.iter_assignments``.
+Tables are stored in text files, one rule per line::
+
+	# comments and empty lines are ignored
+	hero:hand_L.rotateZ -> rig:handLeft.rotateZ
+	hero:*_L.* -> rig:*Left.*
+
+Each ``*`` matches any amount of characters, ``?`` matches a single character.
+The n'th ``*`` of the target is replaced by the text matched by the n'th ``*`` of
+the source. Exact pairs take precedence over wildcard rules, which are tried in
+order. This module does not require maya"""
+__docformat__ = "restructuredtext"
+
+import re
+import os
+
+__all__ = ('MappingTable', )
+
+
+#{ Utilities
+
+def _compile_pattern( pattern ):
+	""":return: compiled regular expression matching the given wildcard pattern,
+		capturing the text matched by each ``*``"""
+	parts = list()
+	for char in pattern:
+		if char == '*':
+			parts.append('(.*)')
+		elif char == '?':
+			parts.append('.')
+		else:
+			parts.append(re.escape(char))
+		# END handle char
+	# END for each char
+	return re.compile(''.join(parts) + '$')
+
+def _is_wildcard( pattern ):
+	return '*' in pattern or '?' in pattern
+
+#} END utilities
+
+
+class MappingTable( object ):
+	"""Maps source plug names to target plug names using exact pairs and wildcard rules.
+
+	Instances are callable like converters, and provide ``map_names`` to map many
+	names at once"""
+	kSeparator = "->"
+
+	# cache of tables read from files: realpath -> (size, mtime, table)
+	_file_cache = dict()
+
+	def __init__(self, rules=tuple(), strict=False):
+		"""
+		:param rules: iterable of tuple(source_pattern, target_pattern)
+		:param strict: if True, names which are not matched by any rule map to None,
+			which causes them to be skipped. Otherwise they are kept unchanged"""
+		self.strict = strict
+		self._exact = dict()
+		self._rules = list()
+		self._resolved = dict()
+		for source, target in rules:
+			self.add_rule(source, target)
+		# END for each rule
+
+	def __len__(self):
+		return len(self._exact) + len(self._rules)
+
+	def __call__(self, source_plug, target_plug_name):
+		"""Converter interface, the source plug is ignored"""
+		return self.map_name(target_plug_name)
+
+	#{ Edit
+
+	def add_rule(self, source, target):
+		"""Add a mapping from source to target, which may contain wildcards
+		:raise ValueError: if the target has more ``*`` than the source, or if
+			the target contains ``?``"""
+		if '?' in target or target.count('*') > source.count('*'):
+			raise ValueError("Cannot fill the wildcards of target %r from %r" % (target, source))
+		# END check target
+
+		if _is_wildcard(source):
+			self._rules.append((source, target, _compile_pattern(source), target.split('*')))
+		else:
+			self._exact[source] = target
+		# END handle rule type
+		self._resolved.clear()
+
+	#} END edit
+
+	#{ Interface
+
+	def map_name(self, name):
+		""":return: target name for the given source name, see ``strict``"""
+		try:
+			return self._resolved[name]
+		except KeyError:
+			pass
+		# END cache lookup
+
+		result = self._exact.get(name)
+		if result is None:
+			for source, target, regex, target_parts in self._rules:
+				match = regex.match(name)
+				if match is None:
+					continue
+				# END no match
+				groups = match.groups()
+				result = target_parts[0]
+				for index, part in enumerate(target_parts[1:]):
+					result += groups[index] + part
+				# END for each wildcard to fill
+				break
+			# END for each rule
+		# END handle wildcards
+
+		if result is None and not self.strict:
+			result = name
+		# END handle unmapped names
+		self._resolved[name] = result
+		return result
+
+	def map_names(self, names):
+		""":return: list of target names for the given iterable of source names"""
+		resolved = self._resolved
+		map_name = self.map_name
+		out = list()
+		for name in names:
+			result = resolved.get(name, resolved)
+			if result is resolved:
+				result = map_name(name)
+			# END resolve uncached names
+			out.append(result)
+		# END for each name
+		return out
+
+	def rules(self):
+		""":return: list of tuple(source, target) of all rules, exact pairs first"""
+		return sorted(self._exact.iteritems()) + [(s, t) for s, t, r, p in self._rules]
+
+	#} END interface
+
+	#{ File IO
+
+	@classmethod
+	def from_string(cls, data, strict=False):
+		""":return: new table with the rules of the given string, see module documentation
+		:raise ValueError: if a line cannot be parsed"""
+		table = cls(strict=strict)
+		for lineno, line in enumerate(data.splitlines()):
+			line = line.strip()
+			if not line or line.startswith('#'):
+				continue
+			# END skip comments
+			tokens = line.split(cls.kSeparator)
+			if len(tokens) != 2 or not tokens[0].strip() or not tokens[1].strip():
+				raise ValueError("Line %i: expected 'source %s target', got %r" % (lineno + 1, cls.kSeparator, line))
+			# END check syntax
+			table.add_rule(tokens[0].strip(), tokens[1].strip())
+		# END for each line
+		return table
+
+	def to_string(self):
+		""":return: string with all our rules, suitable for ``from_string``"""
+		return ''.join("%s %s %s\n" % (s, self.kSeparator, t) for s, t in self.rules())
+
+	@classmethod
+	def from_file(cls, path, strict=False):
+		""":return: table with the rules of the file at path. Tables are cached,
+			and only read again once the file changed. The returned table is
+			shared and must not be altered"""
+		key = os.path.realpath(path)
+		stat = os.stat(key)
+		entry = cls._file_cache.get((key, strict))
+		if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime:
+			return entry[2]
+		# END cache hit
+
+		table = cls.from_string(open(key, 'rb').read(), strict)
+		cls._file_cache[(key, strict)] = (stat.st_size, stat.st_mtime, table)
+		return table
+
+	def to_file(self, path):
+		"""Write our rules into the file at path"""
+		open(path, 'wb').write(self.to_string())
+
+	#} END file io
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Contains assignment plans, which store the outcome of converting and filtering
+the targets of an ``AnimationHandle`` so that the same assignments can be applied
+many times without running converters and predicates again.
+
+A plan consists of parallel arrays holding the physical index of the managed curve
+and the resolved target plug name of each assignment. Plans are written to and read
+from json files, see ``AssignmentPlan.write``. This module does not require maya"""
+__docformat__ = "restructuredtext"
+
+from array import array
+import hashlib
+import json
+
+__all__ = ('AssignmentPlan', 'fingerprint')
+
+
+#{ Constants
+
+_plan_version = 1
+
+#} END constants
+
+
+#{ Interface
+
+def fingerprint( target_strings, chain_strings ):
+	""":return: string identifying the given stored targets and intermediate chains
+		of a handle, which changes whenever the handle manages different animation
+	:param target_strings: list with the target string of each managed curve
+	:param chain_strings: list with the intermediate chain string of each managed curve"""
+	sha = hashlib.sha1()
+	sha.update('\n'.join(target_strings))
+	sha.update('\0')
+	sha.update('\n'.join(chain_strings))
+	return sha.hexdigest()
+
+#} END interface
+
+
+class AssignmentPlan( object ):
+	"""Assignments of the managed curves of a handle to target plugs, as created
+	by ``AnimationHandle.plan`` and applied by ``AnimationHandle.execute``.
+
+	* **handle**: name of the handle the plan was created for
+	* **fingerprint**: fingerprint of the handle's targets at the time the plan
+	  was created, see ``fingerprint``
+	* **curves**: array with the physical index of the managed curve of each assignment
+	* **targets**: list with the target plug name of each assignment
+
+	:note: ``resolved`` holds the plugs the plan was resolved to by the handle
+		executing it, it is not written to disk"""
+	__slots__ = ('handle', 'fingerprint', 'curves', 'targets', 'resolved')
+
+	def __init__(self, handle, fingerprint, curves=tuple(), targets=tuple()):
+		if len(curves) != len(targets):
+			raise ValueError("Need as many curve indices as targets, got %i and %i" % (len(curves), len(targets)))
+		# END check sync
+		self.handle = handle
+		self.fingerprint = fingerprint
+		self.curves = array('l', curves)
+		self.targets = list(targets)
+		self.resolved = None
+
+	def __len__(self):
+		return len(self.targets)
+
+	def __iter__(self):
+		""":return: iterator yielding tuple(curve_index, target_plug_name) for each assignment"""
+		return iter(zip(self.curves, self.targets))
+
+	def __eq__(self, other):
+		if not isinstance(other, AssignmentPlan):
+			return False
+		# END handle other types
+		return (self.handle == other.handle and self.fingerprint == other.fingerprint and
+				self.curves == other.curves and self.targets == other.targets)
+
+	def __ne__(self, other):
+		return not self == other
+
+	#{ Interface
+
+	def add(self, curve_index, target):
+		"""Add an assignment of the curve with the given physical index to the
+		target plug with the given name"""
+		self.curves.append(curve_index)
+		self.targets.append(target)
+		self.resolved = None
+
+	def invalidate(self):
+		"""Forget the plugs this plan was resolved to, they will be resolved
+		again by name on the next execution"""
+		self.resolved = None
+
+	#} END interface
+
+	#{ File IO
+
+	@classmethod
+	def read(cls, plan_file):
+		""":return: AssignmentPlan read from the given file
+		:raise ValueError: if the file is no plan or of an unsupported version"""
+		fp = open(plan_file, 'rb')
+		try:
+			try:
+				data = json.load(fp)
+			except ValueError:
+				raise ValueError("%s is not an assignment plan" % plan_file)
+			# END handle invalid files
+		finally:
+			fp.close()
+		# END assure file is closed
+		if not isinstance(data, dict) or data.get('version') != _plan_version:
+			raise ValueError("%s is not an assignment plan of version %i" % (plan_file, _plan_version))
+		# END check version
+		return cls(str(data['handle']), str(data['fingerprint']), data['curves'],
+					[str(t) for t in data['targets']])
+
+	def write(self, plan_file):
+		"""Write the plan into the given file"""
+		fp = open(plan_file, 'wb')
+		try:
+			json.dump(dict(version=_plan_version, handle=self.handle, fingerprint=self.fingerprint,
+							curves=self.curves.tolist(), targets=self.targets), fp)
+		finally:
+			fp.close()
+		# END assure file is closed
+
+	#} END file io
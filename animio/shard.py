@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""Contains sharded animation exports, which split huge exports into multiple
+files in our native format, see ``animio.clip.ClipWriter``, alongside a manifest
+listing the handles, namespaces and targets of each shard.
+
+Shards can be read concurrently by worker processes outside of maya, and 
+selective loads only read the shards animating the namespaces of interest. This module does not
+require maya"""
+__docformat__ = "restructuredtext"
+
+from animio import _default_processes, _process_pool
+from animio.clip import read_clips, _namespace
+
+import fnmatch
+import json
+import os
+
+__all__ = ('Manifest', 'is_manifest_file', 'shard_path', 'plan_shards', 'iter_load_shards',
+			'kByNamespace', 'kByCount')
+
+
+#{ Constants
+
+# curves of each namespace go into their own shards
+kByNamespace = "namespace"
+# curves are distributed into shards of at most the given amount of curves, in order
+kByCount = "count"
+
+_manifest_extension = '.aiom'
+_manifest_version = 1
+
+#} END constants
+
+
+#{ Interface
+
+def is_manifest_file( path ):
+	""":return: True if the given path denotes a shard manifest"""
+	return path.lower().endswith(_manifest_extension)
+
+def shard_path( manifest_file, index ):
+	""":return: path of the shard with the given index belonging to the given manifest"""
+	return "%s.%04i.aio" % (os.path.splitext(manifest_file)[0], index)
+
+def plan_shards( handle_targets, by=kByNamespace, max_curves=20000 ):
+	"""Distribute the curves of multiple handles into shards
+
+	:param handle_targets: list with an entry per handle, which is a list with the
+		list of target plug names of each of its curves
+	:param by: kByNamespace to put the curves of each namespace into separate shards,
+		using the namespace of a curve's first target, or kByCount to fill shards in order
+	:param max_curves: maximum amount of curves per shard, larger namespaces are
+		split into multiple shards
+	:return: list of shards, each being a list of tuple(handle_index, curve_indices).
+		Handles without curves are put into the first shard, so that their remaining
+		data is not lost
+	:raise ValueError: if by or max_curves are invalid"""
+	if by not in (kByNamespace, kByCount):
+		raise ValueError("Invalid shard mode: %r" % by)
+	if max_curves < 1:
+		raise ValueError("Shards need to hold at least one curve, got %i" % max_curves)
+	# END check arguments
+
+	# group curves, keeping the order of the first occurrence of each group
+	groups = list()
+	group_by_key = dict()
+	empty_handles = list()
+	for hindex, curve_targets in enumerate(handle_targets):
+		if not curve_targets:
+			empty_handles.append(hindex)
+		# END remember handles without curves
+		for cindex, targets in enumerate(curve_targets):
+			key = None
+			if by == kByNamespace:
+				key = (targets and _namespace(targets[0])) or ''
+			# END get group key
+			group = group_by_key.get(key)
+			if group is None:
+				group = group_by_key[key] = list()
+				groups.append(group)
+			# END create group
+			group.append((hindex, cindex))
+		# END for each curve
+	# END for each handle
+
+	shards = list()
+	for group in groups:
+		for start in xrange(0, len(group), max_curves):
+			shard = list()
+			for hindex, cindex in group[start:start + max_curves]:
+				if not shard or shard[-1][0] != hindex:
+					shard.append((hindex, list()))
+				# END start new handle part
+				shard[-1][1].append(cindex)
+			# END for each curve
+			shards.append(shard)
+		# END for each slice
+	# END for each group
+
+	if empty_handles:
+		if not shards:
+			shards.append(list())
+		# END assure we have a shard
+		shards[0][0:0] = [(hindex, list()) for hindex in empty_handles]
+	# END handle empty handles
+	return shards
+
+def iter_load_shards( manifest_file, namespaces=None, processes=None ):
+	"""Read the shards of the given manifest, concurrently if possible
+
+	:param manifest_file: path to a manifest
+	:param namespaces: if not None, only shards containing any of the given
+		namespaces are read, see ``Manifest.select``
+	:param processes: amount of worker processes reading the shards, if None,
+		one per cpu is used. If 0, all shards are read in this process
+	:note: within maya, shards are always read serially in this process, as 
+		workers would be copies of the maya session
+	:return: iterator yielding tuple(shard_index, list of ClipData instances),
+		in the order of the shards"""
+	manifest = Manifest.read(manifest_file)
+	indices = manifest.select(namespaces)
+	paths = [manifest.shard_file(manifest_file, index) for index in indices]
+	if processes is None:
+		processes = _default_processes()
+	# END get amount of processes
+	processes = min(processes, len(paths))
+
+	pool = None
+	if processes > 1:
+		pool = _process_pool(processes)
+	# END start workers
+	if pool is None:
+		for index, path in zip(indices, paths):
+			yield (index, read_clips(path))
+		# END for each shard
+		return
+	# END read in this process
+
+	try:
+		for index, clips in zip(indices, pool.imap(read_clips, paths)):
+			yield (index, clips)
+		# END for each shard
+	finally:
+		pool.close()
+		pool.join()
+	# END assure workers are shut down
+
+#} END interface
+
+
+class Manifest( object ):
+	"""Lists the shards of a sharded export. Each shard is described by a dictionary
+	with the following keys:
+
+	* **file**: name of the shard file, relative to the manifest
+	* **handles**: names of the handles whose curves the shard holds
+	* **namespaces**: sorted namespaces of all targets
+	* **targets**: target plug names of all curves
+	* **num_curves**: amount of curves"""
+
+	def __init__(self, shards=None):
+		self.shards = shards or list()
+
+	def __len__(self):
+		return len(self.shards)
+
+	#{ Interface
+
+	def add_shard(self, file_name, handles, curve_targets):
+		"""Add a shard description
+
+		:param file_name: name of the shard file, relative to the manifest
+		:param handles: list of handle names
+		:param curve_targets: list with the list of target plug names of each curve"""
+		targets = [t for names in curve_targets for t in names]
+		self.shards.append(dict(file=file_name, handles=list(handles),
+								namespaces=sorted(set(_namespace(t) for t in targets)),
+								targets=targets, num_curves=len(curve_targets)))
+
+	def shard_file(self, manifest_file, index):
+		""":return: path to the shard with the given index"""
+		return os.path.join(os.path.dirname(manifest_file), self.shards[index]['file'])
+
+	def select(self, namespaces=None, pattern=None):
+		""":return: sorted list of indices of the shards matching all given filters
+		:param namespaces: if not None, iterable of namespaces, shards need to
+			contain at least one of them
+		:param pattern: if not None, glob pattern matching target plug names,
+			shards need to contain at least one matching target"""
+		if namespaces is not None:
+			namespaces = set(namespaces)
+		# END prepare lookup
+		out = list()
+		for index, shard in enumerate(self.shards):
+			if namespaces is not None and not namespaces.intersection(shard['namespaces']):
+				continue
+			if pattern is not None and not fnmatch.filter(shard['targets'], pattern):
+				continue
+			out.append(index)
+		# END for each shard
+		return out
+
+	def namespaces(self):
+		""":return: sorted list of all namespaces of all shards"""
+		return sorted(set(ns for shard in self.shards for ns in shard['namespaces']))
+
+	#} END interface
+
+	#{ File IO
+
+	@classmethod
+	def read(cls, manifest_file):
+		""":return: Manifest read from the given file
+		:raise ValueError: if the file is no manifest or of an unsupported version"""
+		fp = open(manifest_file, 'rb')
+		try:
+			try:
+				data = json.load(fp)
+			except ValueError:
+				raise ValueError("%s is not a shard manifest" % manifest_file)
+			# END handle invalid files
+		finally:
+			fp.close()
+		# END assure file is closed
+		if not isinstance(data, dict) or data.get('version') != _manifest_version:
+			raise ValueError("%s is not a shard manifest of version %i" % (manifest_file, _manifest_version))
+		# END check version
+
+		shards = list()
+		for shard in data['shards']:
+			shards.append(dict(file=str(shard['file']), handles=[str(h) for h in shard['handles']],
+								namespaces=[str(n) for n in shard['namespaces']],
+								targets=[str(t) for t in shard['targets']],
+								num_curves=shard['num_curves']))
+		# END for each shard
+		return cls(shards)
+
+	def write(self, manifest_file):
+		"""Write the manifest into the given file"""
+		fp = open(manifest_file, 'wb')
+		try:
+			json.dump(dict(version=_manifest_version, shards=self.shards), fp)
+		finally:
+			fp.close()
+		# END assure file is closed
+
+	#} END file io
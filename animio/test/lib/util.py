@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 import os
+from animio import _assure_mrv_is_available
+_assure_mrv_is_available()
+
 import mrv.maya as mrvmaya
 from mrv.test.maya import save_for_debugging 
 
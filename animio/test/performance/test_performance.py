@@ -2,10 +2,13 @@
 """Performance Testing"""
 from animio.test.lib import *
 from animio.lib import *
+from animio.lib import _create_curves
+from animio.curve import CurveData
 
 import mrv.maya.nt as nt
 
 import maya.OpenMayaAnim as apianim 
+import maya.cmds as cmds
 
 import time
 import sys
@@ -28,9 +31,10 @@ class TestPerformance( unittest.TestCase ):
 		
 		# apply animation, worst case ( as it is already connected )
 		st = time.time()
-		ah.apply_animation()
+		num_changed, num_skipped = ah.apply_animation()
 		elapsed = time.time() - st
-		print >>sys.stderr, "Re-Applied animation onto same existing animation of roughly 21k nodes in %f s" % elapsed
+		print >>sys.stderr, "Re-Applied animation onto same existing animation of roughly 21k nodes in %f s (%i skipped)" % (elapsed, num_skipped)
+		assert num_changed == 0 and num_skipped
 		
 		# clear animation
 		st = time.time()
@@ -51,9 +55,25 @@ class TestPerformance( unittest.TestCase ):
 		
 		# apply animation, best case as it is not yet connected
 		st = time.time()
-		ah.apply_animation()
+		num_changed, num_skipped = ah.apply_animation()
+		assert num_skipped == 0
 		elapsed = time.time() - st
 		print >>sys.stderr, "Applied animation of roughly 21k nodes in %f s" % elapsed
 		
-		
-		
+	def test_curve_factory(self):
+		num_keys = 10
+		times = [float(t) for t in range(1, num_keys + 1)]
+		tangents = [1.0] * num_keys
+		for num_curves in (1000, 10000, 100000):
+			cmds.file(new=True, force=True)
+			curve_datas = [CurveData("curve%i" % i, "animCurveTU", times=times, values=[float(i)] * num_keys, 
+									in_x=tangents, in_y=tangents, out_x=tangents, out_y=tangents) 
+							for i in xrange(num_curves)]
+			
+			st = time.time()
+			curves = _create_curves(curve_datas)
+			elapsed = time.time() - st
+			assert len(curves) == num_curves
+			print >>sys.stderr, "Created %i curves with %i keys in %f s (%f keys / s)" % (num_curves, num_curves * num_keys, elapsed, (num_curves * num_keys) / elapsed)
+		# END for each amount of curves
+		cmds.file(new=True, force=True)
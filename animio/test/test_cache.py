@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Test the clip cache without maya"""
+from animio.cache import *
+from animio.clip import ClipData
+from animio.curve import CurveData
+
+import unittest
+import tempfile
+import shutil
+import os
+
+
+class TestCache( unittest.TestCase ):
+
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+		self.loaded = list()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def _loader(self, path):
+		"""Returns a clip with as many keys as the file has bytes"""
+		self.loaded.append(path)
+		num_keys = os.path.getsize(path)
+		curve = CurveData("curve", times=range(num_keys), values=[0.0] * num_keys)
+		return [ClipData(os.path.basename(path), [curve])]
+
+	def _make_file(self, name, size):
+		path = os.path.join(self.tmpdir, name)
+		open(path, 'wb').write('x' * size)
+		return path
+
+	def test_base( self ):
+		cache = ClipCache(loader=self._loader)
+		assert len(cache) == 0
+		self.failUnlessRaises(OSError, cache.get, os.path.join(self.tmpdir, "missing"))
+
+		a = self._make_file("a", 10)
+		clips = cache.get(a)
+		assert len(clips[0].curves[0]) == 10
+		assert a in cache and len(cache) == 1
+
+		# repeated access hits the cache
+		assert cache.get(a) is clips
+		assert cache.get(os.path.join(self.tmpdir, ".", "a")) is clips
+		stats = cache.stats()
+		assert stats['hits'] == 2 and stats['misses'] == 1 and stats['entries'] == 1
+		assert stats['nbytes'] > 0 and len(self.loaded) == 1
+
+		# changes to the file invalidate the entry
+		self._make_file("a", 20)
+		clips = cache.get(a)
+		assert len(clips[0].curves[0]) == 20
+		assert cache.stats()['invalidations'] == 1 and len(self.loaded) == 2
+
+		assert cache.invalidate(a) == 1 and a not in cache
+		assert cache.invalidate(a) == 0
+		cache.get(a)
+		assert cache.invalidate() == 1 and len(cache) == 0 and cache.stats()['nbytes'] == 0
+
+		cache.reset_stats()
+		assert cache.stats()['hits'] == cache.stats()['misses'] == 0
+
+	def test_eviction( self ):
+		cache = ClipCache(loader=self._loader)
+		paths = [self._make_file(str(i), 10) for i in range(3)]
+		for path in paths:
+			cache.get(path)
+		# END for each path
+		entry_size = cache.stats()['nbytes'] / 3
+
+		# use the first path, making the second one the least recently used one
+		cache.get(paths[0])
+		assert cache.paths() == [os.path.realpath(p) for p in (paths[0], paths[2], paths[1])]
+
+		cache.set_max_bytes(entry_size * 2)
+		assert paths[1] not in cache and len(cache) == 2
+		assert cache.stats()['evictions'] == 1
+
+		# new entries evict the oldest ones
+		cache.get(paths[1])
+		assert paths[2] not in cache and paths[0] in cache
+
+		# a budget of 0 disables caching
+		cache.set_max_bytes(0)
+		assert len(cache) == 0
+		cache.get(paths[0])
+		assert len(cache) == 0 and cache.max_bytes() == 0
+
+		# there is a shared instance
+		assert clip_cache() is clip_cache()
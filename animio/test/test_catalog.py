@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Test the animation file catalog without maya"""
+from animio.catalog import *
+from animio.test.test_clip import _ma_export
+from animio.shard import Manifest, shard_path
+from animio.clip import ClipData, ClipWriter
+from animio.curve import CurveData
+
+import unittest
+import sqlite3
+import tempfile
+import shutil
+import time
+import os
+
+
+class TestCatalog( unittest.TestCase ):
+
+	def setUp(self):
+		self.tmpdir = os.path.realpath(tempfile.mkdtemp())
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def _write_clip(self, name, namespace, offset=0):
+		"""Write a clip animating the given namespace, moved by offset frames"""
+		data = _ma_export.replace('"cube.', '"%s:cube.' % namespace)
+		data = data.replace('"  1 0 11', '"  %i 0 %i' % (1 + offset, 11 + offset))
+		data = data.replace('\t\t21 0;', '\t\t%i 0;' % (21 + offset))
+		path = os.path.join(self.tmpdir, name)
+		if not os.path.isdir(os.path.dirname(path)):
+			os.makedirs(os.path.dirname(path))
+		# END create directories
+		open(path, 'wb').write(data)
+		return path
+
+	def test_scan_and_query( self ):
+		a = self._write_clip("a.ma", "hero")
+		b = self._write_clip(os.path.join("sub", "b.ma"), "villain", offset=100)
+		self._write_clip("notes.txt", "none")
+
+		catalog = Catalog()
+		result = catalog.scan(self.tmpdir, processes=0)
+		assert result['added'] == [a, b]
+		assert not result['updated'] and not result['removed'] and not result['failed']
+		assert len(catalog) == 2 and catalog.files() == [a, b]
+
+		# queries
+		assert catalog.find_target("*:cube.rotateY") == [(a, "animationHandle"), (b, "animationHandle")]
+		assert catalog.find_target("hero:*") == [(a, "animationHandle")]
+		assert catalog.find_target("cone.translateX") == [(a, "animationHandle"), (b, "animationHandle")]
+		assert catalog.find_target("*.scaleX") == []
+		assert catalog.find_target("cube.rotateY") == []
+		assert catalog.find_target("villain:cube.*") == [(b, "animationHandle")]
+		assert catalog.find_target("*:cu?e.rotateY") == [(a, "animationHandle"), (b, "animationHandle")]
+		
+		# plug names with a literal node name are looked up in the index
+		plan = catalog._conn.execute("EXPLAIN QUERY PLAN SELECT * FROM targets WHERE node = ? AND attribute = ?",
+										("cube", "rotateY")).fetchall()
+		assert "targets_node" in str(plan)
+		assert catalog.find_namespace("villain") == [(b, "animationHandle")]
+		assert catalog.namespaces() == ['', 'hero', 'villain']
+		assert catalog.find_range(0, 5) == [(a, "animationHandle")]
+		assert catalog.find_range(50, 200) == [(b, "animationHandle")]
+		assert catalog.find_range(21, 101) == [(a, "animationHandle"), (b, "animationHandle")]
+
+		info = catalog.handle_info(b, "animationHandle")
+		assert info['first'] == 101 and info['last'] == 121
+		assert info['num_curves'] == 2 and info['fps'] == 30.0
+		assert len(info['targets']) == 3
+		self.failUnlessRaises(KeyError, catalog.handle_info, b, "missing")
+
+		# rescans are incremental
+		result = catalog.scan(self.tmpdir, processes=0)
+		assert result['unchanged'] == 2 and not result['added'] and not result['updated']
+
+		os.remove(b)
+		self._write_clip("a.ma", "sidekick")
+		os.utime(a, (time.time() + 10, time.time() + 10))
+		broken = os.path.join(self.tmpdir, "broken.ma")
+		open(broken, 'wb').write('createNode network -n "h";\n\tsetAttr ".cifo" -type "stringArray" 1 "x.tx";\n'
+									'connectAttr "c.msg" "h.ab" -na;\ncreateNode animCurveTL -n "c";\n'
+									'\tsetAttr -s 1 ".ktv[0]" 1 2 3;')
+		result = catalog.scan(self.tmpdir, processes=0)
+		assert result['updated'] == [a] and result['removed'] == [b]
+		assert result['failed'] == [broken] and result['unchanged'] == 0
+		assert catalog.files() == [a]
+		assert catalog.find_namespace("hero") == []
+		assert catalog.find_namespace("sidekick") == [(a, "animationHandle")]
+
+		# the catalog persists on disk
+		db_path = os.path.join(self.tmpdir, "catalog.db")
+		catalog = Catalog(db_path)
+		catalog.scan(self.tmpdir, processes=0)
+		catalog.close()
+		catalog = Catalog(db_path)
+		assert catalog.files() == [a]
+		catalog.close()
+		
+		# outdated databases are rebuilt
+		os.remove(db_path)
+		conn = sqlite3.connect(db_path)
+		conn.executescript("CREATE TABLE targets (handle_id INTEGER, plug TEXT, namespace TEXT);")
+		conn.close()
+		catalog = Catalog(db_path)
+		catalog.scan(self.tmpdir, processes=0)
+		assert catalog.find_target("sidekick:cube.rotateY") == [(a, "animationHandle")]
+		catalog.close()
+
+	def test_parallel_scan( self ):
+		paths = [self._write_clip("clip%02i.ma" % i, "ns%i" % i, offset=i) for i in range(20)]
+		catalog = Catalog()
+		result = catalog.scan(self.tmpdir, processes=2)
+		assert result['added'] == paths
+		assert catalog.find_target("ns7:*") == [(paths[7], "animationHandle")]
+		assert len(catalog.find_target("*:cube.translateX")) == len(paths)
+
+	def test_formats( self ):
+		a = self._write_clip("a.ma", "hero")
+		native = os.path.join(self.tmpdir, "b.aio")
+		writer = ClipWriter(native)
+		writer.add_clip(ClipData("nativeHandle", [CurveData("c", "animCurveTL", ["villain:cube.tx"], [5.0, 8.0], [0.0, 1.0])]))
+		writer.close()
+		
+		# the parts of a handle in multiple shards are indexed as one handle of the manifest
+		manifest_file = os.path.join(self.tmpdir, "crowd.aiom")
+		manifest = Manifest()
+		for index, namespace in enumerate(("extra1", "extra2")):
+			curves = [CurveData("c", "animCurveTL", ["%s:cube.tx" % namespace], [10.0 * index, 50.0], [0.0, 1.0])]
+			writer = ClipWriter(shard_path(manifest_file, index))
+			writer.add_clip(ClipData("crowdHandle", curves))
+			writer.close()
+			manifest.add_shard(os.path.basename(shard_path(manifest_file, index)), ["crowdHandle"],
+								[c.targets for c in curves])
+		# END for each shard
+		manifest.write(manifest_file)
+		
+		catalog = Catalog()
+		result = catalog.scan(self.tmpdir, processes=0)
+		assert result['added'] == sorted([a, native, manifest_file]) and not result['failed']
+		assert catalog.find_namespace("villain") == [(native, "nativeHandle")]
+		assert catalog.find_target("extra2:*") == [(manifest_file, "crowdHandle")]
+		info = catalog.handle_info(manifest_file, "crowdHandle")
+		assert info['num_curves'] == 2 and (info['first'], info['last']) == (0.0, 50.0)
+		assert info['targets'] == ["extra1:cube.tx", "extra2:cube.tx"]
+		
+		# patterns still restrict the formats
+		assert Catalog().scan(self.tmpdir, patterns=('*.ma', ), processes=0)['added'] == [a]
+		catalog.close()
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""Test reading animation files without maya"""
+from animio.clip import *
+from animio.clip import _encode_curves
+from animio.curve import CurveData, kTangentStep, kTangentLinear, kTangentClamped, kTangentFixed, kCycle
+
+import unittest
+import tempfile
+import math
+import os
+
+
+# an export as written by maya, with an unrelated node in between
+_ma_export = r'''//Maya ASCII 2011 scene
+//Name: clip.ma
+requires maya "2011";
+currentUnit -l meter -a degree -t ntsc;
+fileInfo "application" "maya";
+createNode animCurveTL -n "ns:cube_translateX";
+	setAttr ".tan" 2;
+	setAttr ".wgt" no;
+	setAttr -s 3 ".ktv[0:2]"  1 0 11 1.5
+		21 0;
+	setAttr ".pst" 3;
+createNode animCurveTA -n "cube_rotateY";
+	setAttr ".tan" 10;
+	setAttr ".wgt" no;
+	setAttr -s 2 ".ktv[0:1]"  1 0 11 90;
+	setAttr -s 2 ".kot[0:1]"  5 5;
+createNode transform -n "other";
+	setAttr ".t" -type "double3" 1 2 3 ;
+createNode network -n "animationHandle";
+	addAttr -ci true -sn "cifo" -ln "connectionInfo" -dt "stringArray";
+	setAttr ".cifo" -type "stringArray" 2 "cube.translateX,cone.translateX" "cube.rotateY"  ;
+	addAttr -ci true -sn "imif" -ln "intermediateInfo" -dt "stringArray";
+	setAttr ".imif" -type "stringArray" 2 ",mute1.input>pairBlend1.inTranslateX1" ""  ;
+select -ne :time1;
+	setAttr ".o" 1;
+connectAttr "cube_rotateY.msg" "animationHandle.ab[1]";
+connectAttr "ns:cube_translateX.msg" "animationHandle.ab[0]";
+// End of clip.ma
+'''
+
+
+class TestClip( unittest.TestCase ):
+
+	def test_read_ma( self ):
+		self.failUnlessRaises(ValueError, read_clips, "file.mb")
+		assert supports_file("file.MA") and not supports_file("file.mb")
+
+		fd, path = tempfile.mkstemp('.ma')
+		try:
+			os.write(fd, _ma_export)
+			os.close(fd)
+			clips = read_clips(path)
+		finally:
+			os.remove(path)
+		# END assure file is removed
+
+		assert len(clips) == 1
+		clip = clips[0]
+		assert clip.name == "animationHandle" and len(clip) == 2
+		assert clip.fps == 30.0
+		assert clip.time_range() == (1.0, 21.0)
+
+		# curves come in the order of their connections, the targets match
+		tx, ry = clip.curves
+		assert tx.name == "ns:cube_translateX" and tx.curve_type == "animCurveTL"
+		assert ry.name == "cube_rotateY"
+		assert ry.targets == ["cube.rotateY"]
+		assert tx.targets == ["cube.translateX", "cone.translateX"]
+		assert clip.targets() == tx.targets + ry.targets
+		assert clip.intermediates == [['', 'mute1.input>pairBlend1.inTranslateX1'], ['']]
+		assert clip.layer_info is None
+		assert ClipData("empty", [tx]).intermediates == [['', '']]
+
+		# values are converted into internal units
+		assert tx.times == [1.0, 11.0, 21.0]
+		assert tx.values == [0.0, 150.0, 0.0]
+		assert tx.in_types == tx.out_types == [kTangentLinear] * 3
+		assert tx.post_infinity == kCycle
+		assert abs(ry.values[1] - math.pi / 2.0) < 1.0e-9
+		assert ry.in_types == [kTangentClamped] * 2 and ry.out_types == [kTangentStep] * 2
+		assert ry.evaluate([5.0]) == [0.0]
+		assert tx.evaluate([6.0]) == [75.0]
+
+	def test_layer_info( self ):
+		info = dict(name="walk", parent="BaseAnimation", index=2, root=0, weight=0.5, override=1.0)
+		entries = format_layer_info(info)
+		assert entries == sorted(entries) and parse_layer_info(entries) == info
+
+		data = _ma_export.replace('\tsetAttr ".imif"', '\taddAttr -ci true -sn "lyif" -ln "layerInfo" -dt "stringArray";\n'
+									'\tsetAttr ".lyif" -type "stringArray" %i %s ;\n\tsetAttr ".imif"' 
+									% (len(entries), ' '.join('"%s"' % e for e in entries)))
+		fd, path = tempfile.mkstemp('.ma')
+		try:
+			os.write(fd, data)
+			os.close(fd)
+			clip = read_clips(path)[0]
+		finally:
+			os.remove(path)
+		# END assure file is removed
+		assert clip.layer_info == info
+		assert len(clip) == 2
+
+	def test_static_pose( self ):
+		data = _ma_export.replace('\tsetAttr ".imif"', '\taddAttr -ci true -sn "sttg" -ln "staticTargets" -dt "stringArray";\n'
+									'\tsetAttr ".sttg" -type "stringArray" 2 "cube.visibility" "cube.rotateX" ;\n'
+									'\taddAttr -ci true -sn "stvl" -ln "staticValues" -dt "doubleArray";\n'
+									'\tsetAttr ".stvl" -type "doubleArray" 2 0 1.5 ;\n\tsetAttr ".imif"')
+		fd, path = tempfile.mkstemp('.ma')
+		try:
+			os.write(fd, data)
+			os.close(fd)
+			clip = read_clips(path)[0]
+			assert clip.static_targets == ["cube.visibility", "cube.rotateX"]
+			# values are stored in internal units already
+			assert clip.static_values == [0.0, 1.5]
+			assert len(clip) == 2
+
+			# targets and values must match
+			open(path, 'wb').write(data.replace('"doubleArray" 2 0 1.5', '"doubleArray" 1 0'))
+			self.failUnlessRaises(ValueError, read_clips, path)
+		finally:
+			os.remove(path)
+		# END assure file is removed
+		assert ClipData("empty").static_targets == ClipData("empty").static_values == list()
+
+	def test_native( self ):
+		assert is_native_file("clip.AIO") and supports_file("clip.aio")
+		curves = [CurveData("curve%i" % i, "animCurveTA", ["node%i.rotateX" % i], [1.0, 10.0, 20.0], 
+							[0.0, i * 0.5, 1.0], post_infinity=kCycle) for i in range(500)]
+		layer_info = dict(name="layer", index=1, root=0, weight=0.5)
+		
+		fd, path = tempfile.mkstemp('.aio')
+		os.close(fd)
+		try:
+			writer = ClipWriter(path, threads=3, max_pending=2)
+			self.failUnlessRaises(ValueError, writer.add_curves, curves)
+			writer.begin_clip(ClipData("first", fps=30.0, layer_info=layer_info, 
+										static_targets=["node.tx"], static_values=[2.5]))
+			for index in range(0, len(curves), 64):
+				chunk = curves[index:index + 64]
+				writer.add_curves(chunk, [["pairBlend1.inRotateX1"]] * len(chunk))
+			# END for each chunk
+			writer.add_clip(ClipData("second", curves[:2]))
+			writer.close()
+			self.failUnlessRaises(ValueError, writer.add_curves, curves)
+			
+			first, second = read_clips(path)
+			assert first.name == "first" and first.fps == 30.0
+			assert first.layer_info == layer_info
+			assert first.static_targets == ["node.tx"] and first.static_values == [2.5]
+			assert len(first) == len(curves) and len(second) == 2 and second.fps == 24.0
+			assert first.intermediates == [["pairBlend1.inRotateX1"]] * len(curves)
+			assert second.intermediates == [['']] * 2
+			for read, written in zip(first.curves, curves):
+				assert read.name == written.name and read.targets == written.targets
+				assert read.times == written.times and read.values == written.values
+				assert read.out_x == written.out_x and read.in_types == written.in_types
+				assert read.post_infinity == kCycle
+			# END for each curve
+			
+			# aborted writers leave the previous file untouched
+			writer = ClipWriter(path)
+			writer.begin_clip(ClipData("third"))
+			writer.abort()
+			assert len(read_clips(path)) == 2
+			
+			# errors of the workers are raised in the main thread
+			writer = ClipWriter(path)
+			writer.begin_clip(ClipData("broken"))
+			writer.add_curves([None], [['']])
+			self.failUnlessRaises(IOError, writer.close)
+			assert len(read_clips(path)) == 2
+			
+			open(path, 'wb').write("garbage")
+			self.failUnlessRaises(ValueError, read_clips, path)
+		finally:
+			os.remove(path)
+		# END assure file is removed
+		
+	def test_dense( self ):
+		# baked animation, one key per frame
+		num_frames = 1000
+		baked = [CurveData("joint%i_rotateX" % i, "animCurveTA", ["joint%i.rotateX" % i], 
+							[float(f) for f in range(1, num_frames + 1)], 
+							[math.sin(f * 0.01 * (i + 1)) for f in range(num_frames)], 
+							[kTangentLinear] * num_frames, [kTangentLinear] * num_frames) for i in range(20)]
+		# keys with fixed tangents or uneven spacing are stored as they are
+		fixed = CurveData("fixed", "animCurveTU", ["node.fixed"], [1.0, 2.0, 3.0], [0.0, 1.0, 0.0], 
+							[kTangentFixed] * 3, [kTangentFixed] * 3, [1.0] * 3, [0.5] * 3, [1.0] * 3, [0.5] * 3)
+		keyed = CurveData("keyed", "animCurveTU", ["node.keyed"], [1.0, 2.0, 4.0], [0.0, 1.0, 0.0])
+		curves = baked + [fixed, keyed]
+		
+		dense_size = len(_encode_curves(curves, [[''] * len(c.targets) for c in curves]))
+		
+		fd, path = tempfile.mkstemp('.aio')
+		os.close(fd)
+		try:
+			writer = ClipWriter(path)
+			writer.add_clip(ClipData("mocap", curves, 30.0))
+			writer.close()
+			
+			clip = read_clips(path)[0]
+			assert len(clip) == len(curves)
+			for read, written in zip(clip.curves, curves):
+				assert read.name == written.name and read.targets == written.targets
+				assert read.times == written.times and read.values == written.values
+				assert read.in_types == written.in_types and read.out_types == written.out_types
+			# END for each curve
+			
+			# tangents of sparse curves are kept, dense ones are computed
+			assert clip.curves[-2].in_y == fixed.in_y
+			assert clip.curves[0].out_y == baked[0].out_y
+		finally:
+			os.remove(path)
+		# END assure file is removed
+		
+		# dense curves only store their values and tangent types, instead of eight doubles per key
+		assert dense_size * 2.5 < sum(len(c) for c in curves) * 8 * 8
+		
+	def test_takes( self ):
+		takes = [("blocking", [0, 1]), ("polish=2", [0, 2]), ("empty", [])]
+		entries = format_take_info(takes)
+		assert entries == ["blocking=0,1", "polish=2=0,2", "empty="]
+		assert parse_take_info(entries) == takes
+		assert ClipData("empty").takes == list() and ClipData("empty").active_take is None
+		
+		# the second take only stores the curve it changed
+		curves = [CurveData("tx", "animCurveTL", ["cube.tx"], [1.0, 10.0], [0.0, 5.0]), 
+					CurveData("ty", "animCurveTL", ["cube.ty"], [1.0, 10.0], [0.0, 1.0]), 
+					CurveData("tx1", "animCurveTL", ["cube.tx"], [1.0, 10.0], [0.0, 8.0])]
+		fd, path = tempfile.mkstemp('.aio')
+		os.close(fd)
+		try:
+			writer = ClipWriter(path)
+			writer.add_clip(ClipData("takes", curves, takes=takes[:2], active_take="polish=2"))
+			writer.add_clip(ClipData("plain", curves[:1]))
+			writer.close()
+			
+			clip, plain = read_clips(path)
+			assert len(clip) == 3
+			assert clip.takes == takes[:2] and clip.active_take == "polish=2"
+			assert plain.takes == list() and plain.active_take is None
+		finally:
+			os.remove(path)
+		# END assure file is removed
+		
+		data = _ma_export.replace('\tsetAttr ".imif"', '\taddAttr -ci true -sn "tkif" -ln "takeInfo" -dt "stringArray";\n'
+									'\tsetAttr ".tkif" -type "stringArray" 2 "a=0,1" "b=1" ;\n'
+									'\taddAttr -ci true -sn "actk" -ln "activeTake" -dt "string";\n'
+									'\tsetAttr ".actk" -type "string" "b";\n\tsetAttr ".imif"')
+		fd, path = tempfile.mkstemp('.ma')
+		try:
+			os.write(fd, data)
+			os.close(fd)
+			clip = read_clips(path)[0]
+		finally:
+			os.remove(path)
+		# END assure file is removed
+		assert clip.takes == [("a", [0, 1]), ("b", [1])] and clip.active_take == "b"
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""Test the pure python curve evaluator"""
+from animio.curve import *
+from animio.curve import (kTangentLinear, kTangentFlat, kTangentStep, kTangentStepNext, kTangentSmooth,
+							kLinear, kCycle, kCycleRelative, kOscillate)
+
+import unittest
+
+
+class TestCurve( unittest.TestCase ):
+
+	def assert_close(self, values, expected, tolerance=1.0e-6):
+		assert len(values) == len(expected)
+		for value, exp in zip(values, expected):
+			assert abs(value - exp) < tolerance, "%f != %f" % (value, exp)
+		# END for each value
+
+	def test_base( self ):
+		self.failUnlessRaises(ValueError, CurveData, times=[1.0], values=[])
+		empty = CurveData("empty")
+		assert len(empty) == 0
+		self.failUnlessRaises(ValueError, empty.time_range)
+		self.failUnlessRaises(ValueError, empty.evaluate, [1.0])
+
+		# a single key is constant everywhere
+		single = CurveData("single", times=[10.0], values=[2.0])
+		assert single.time_range() == (10.0, 10.0)
+		self.assert_close(single.evaluate([-5.0, 10.0, 100.0]), [2.0] * 3)
+
+		# evenly spaced keys are sampled
+		assert empty.sampling() is None and single.sampling() is None
+		baked = CurveData("baked", times=[i * 0.5 + 2.0 for i in range(100)], values=[0.0] * 100)
+		assert baked.sampling() == (2.0, 0.5)
+		assert CurveData("keyed", times=[1.0, 2.0, 4.0], values=[0.0] * 3).sampling() is None
+		assert CurveData("jitter", times=[1.0, 2.001, 3.0], values=[0.0] * 3).sampling() is None
+		assert CurveData("jitter", times=[1.0, 2.001, 3.0], values=[0.0] * 3).sampling(0.01) == (1.0, 1.0)
+
+		# content hashes ignore names and targets
+		same = CurveData("other", targets=["n.tx"], times=list(baked.times), values=list(baked.values))
+		assert same.content_hash() == baked.content_hash()
+		same.values[50] = 1.0
+		assert same.content_hash() != baked.content_hash()
+		assert CurveData("baked", "animCurveTL", times=baked.times, values=baked.values).content_hash() != baked.content_hash()
+		assert CurveData("baked", times=baked.times, values=baked.values, post_infinity=kCycle).content_hash() != baked.content_hash()
+
+	def test_tangent_types( self ):
+		times = [0.0, 10.0, 20.0]
+		values = [0.0, 10.0, 0.0]
+		num = len(times)
+
+		# linear tangents interpolate linearly
+		lin = CurveData("lin", times=times, values=values, in_types=[kTangentLinear] * num,
+						out_types=[kTangentLinear] * num)
+		self.assert_close(lin.evaluate([0.0, 2.5, 5.0, 10.0, 15.0, 20.0]), [0.0, 2.5, 5.0, 10.0, 5.0, 0.0])
+
+		# flat tangents are symmetric around the segment's middle
+		flat = CurveData("flat", times=times, values=values, in_types=[kTangentFlat] * num,
+							out_types=[kTangentFlat] * num)
+		self.assert_close(flat.evaluate([5.0]), [5.0])
+		a, b = flat.evaluate([2.0, 8.0])
+		assert abs(a + b - 10.0) < 1.0e-9 and a < 2.0
+
+		# weighted flat curves with tangents of a third of the segment match the
+		# unweighted ones
+		wflat = CurveData("wflat", times=times, values=values, in_types=[kTangentFlat] * num,
+							out_types=[kTangentFlat] * num, weighted=True)
+		samples = [x * 0.5 for x in range(41)]
+		self.assert_close(wflat.evaluate(samples), flat.evaluate(samples))
+
+		# stepped keys
+		step = CurveData("step", times=times, values=values, out_types=[kTangentStep] * num)
+		self.assert_close(step.evaluate([0.0, 9.99, 10.0, 19.0, 20.0]), [0.0, 0.0, 10.0, 10.0, 0.0])
+		step_next = CurveData("stepn", times=times, values=values, out_types=[kTangentStepNext] * num)
+		self.assert_close(step_next.evaluate([0.0, 0.01, 10.0, 10.5, 20.0]), [0.0, 10.0, 10.0, 0.0, 0.0])
+
+		# clamped tangents do not overshoot at symmetric extremes
+		clamped = CurveData("clamped", times=times, values=values)
+		assert max(clamped.evaluate(samples)) <= 10.0 + 1.0e-9
+
+		# asymmetric extremes keep their spline tangent, tangents are only flattened 
+		# if a neighbour has the same value or would be overshot
+		clamped = CurveData("clamped", times=[0.0, 10.0, 20.0, 30.0, 40.0, 50.0], 
+							values=[0.0, 10.0, 4.0, 4.0, 9.0, 9.5])
+		assert abs(clamped.out_y[1] / clamped.out_x[1] - 0.2) < 1.0e-9
+		assert clamped.out_y[2] == clamped.out_y[3] == 0.0
+		assert clamped.out_y[4] == 0.0 and clamped.in_y[4] == 0.0
+		assert clamped.out_y[0] > 0.0
+
+		# explicit tangents
+		fixed = CurveData("fixed", times=[0.0, 1.0], values=[0.0, 0.0],
+							in_x=[1.0, 1.0], in_y=[1.0, 1.0], out_x=[1.0, 1.0], out_y=[1.0, 1.0])
+		# h(s) = 2s^3 - 3s^2 + s
+		self.assert_close(fixed.evaluate([0.25, 0.5]), [0.09375, 0.0])
+
+	def test_infinity( self ):
+		times = [0.0, 10.0]
+		values = [0.0, 10.0]
+		kwargs = dict(times=times, values=values, in_types=[kTangentLinear] * 2,
+						out_types=[kTangentLinear] * 2)
+
+		const = CurveData(**kwargs)
+		self.assert_close(const.evaluate([-5.0, 15.0]), [0.0, 10.0])
+
+		lin = CurveData(pre_infinity=kLinear, post_infinity=kLinear, **kwargs)
+		self.assert_close(lin.evaluate([-5.0, 15.0]), [-5.0, 15.0])
+
+		cycle = CurveData(pre_infinity=kCycle, post_infinity=kCycle, **kwargs)
+		self.assert_close(cycle.evaluate([-5.0, 12.0, 25.0]), [5.0, 2.0, 5.0])
+
+		rel = CurveData(pre_infinity=kCycleRelative, post_infinity=kCycleRelative, **kwargs)
+		self.assert_close(rel.evaluate([-5.0, 12.0, 25.0]), [-5.0, 12.0, 25.0])
+
+		osc = CurveData(pre_infinity=kOscillate, post_infinity=kOscillate, **kwargs)
+		self.assert_close(osc.evaluate([-2.0, 12.0, 22.0]), [2.0, 8.0, 2.0])
+
+	def test_evaluate( self ):
+		curves = [CurveData(str(i), times=[0.0, 10.0], values=[0.0, float(i)],
+							in_types=[kTangentLinear] * 2, out_types=[kTangentLinear] * 2)
+					for i in range(100)]
+
+		# times may be unordered and any iterable
+		result = evaluate(curves, iter([10.0, 5.0, 0.0]))
+		assert len(result) == len(curves)
+		for i, values in enumerate(result):
+			self.assert_close(values, [float(i), i / 2.0, 0.0])
+		# END for each result
+		
+		# batches walk the segments in time order, results keep the order of the times
+		curve = CurveData(times=[0.0, 2.0, 5.0, 6.0, 10.0], values=[0.0, 4.0, -1.0, 3.0, 2.0],
+							in_types=[kTangentSmooth, kTangentLinear, kTangentStep, kTangentFlat, kTangentLinear],
+							out_types=[kTangentSmooth, kTangentStep, kTangentLinear, kTangentFlat, kTangentLinear],
+							pre_infinity=kCycleRelative, post_infinity=kOscillate)
+		times = [9.5, -3.0, 2.0, 0.5, 14.0, 6.0, 5.5, 2.0, 10.0, 23.0, 1.0]
+		batch = curve.evaluate(times)
+		self.assert_close(batch, [curve.evaluate([t])[0] for t in times])
+		self.assert_close([batch[i] for i in (2, 5, 7, 8, 4)], [4.0, 3.0, 4.0, 2.0, 3.0])
+		self.assert_close([batch[1]], [curve.evaluate([7.0])[0] - 2.0])
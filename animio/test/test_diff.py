@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Test comparison of animation"""
+from animio.diff import *
+from animio.diff import main
+from animio.curve import CurveData, kTangentLinear, kTangentFlat, kLinear
+
+import unittest
+import sys
+
+
+class TestDiff( unittest.TestCase ):
+
+	def _curves(self, prefix="", offset=0.0):
+		return [CurveData("%scurve%i" % (prefix, i), targets=["node%i.tx" % i, "other%i.tx" % i],
+							times=[0.0, 10.0, 20.0], values=[0.0, float(i) + offset, 0.0])
+				for i in range(10)]
+
+	def test_diff( self ):
+		a = self._curves()
+
+		# identical curves - names do not matter
+		report = diff(a, self._curves("b"))
+		assert not report
+		assert report.num_unchanged == 20
+		assert report.max_deviation() == 0.0
+
+		# modifications, additions and removals
+		b = self._curves(offset=0.5)
+		b[0].targets = ["new.tx"]
+		b[1].values[1] += 0.5
+		report = diff(a, b)
+		assert report
+		assert report.added == ["new.tx"]
+		assert report.removed == ["node0.tx", "other0.tx"]
+		assert len(report.modified) == 18
+		assert abs(report.max_deviation() - 1.0) < 1.0e-9
+		for channel in report.modified:
+			assert channel.keys_changed
+			assert channel.curve_a == channel.curve_b
+		# END for each channel
+
+		# tolerances apply
+		assert len(diff(a, self._curves(offset=1.0e-7)).modified) == 0
+		assert len(diff(a, self._curves(offset=0.1), tolerance=0.2).modified) == 0
+
+		# additional keys are a modification
+		c = self._curves()
+		c[2] = CurveData("curve2", targets=a[2].targets, times=[0.0, 10.0, 20.0, 30.0],
+							values=[0.0, 2.0, 0.0, 0.0])
+		report = diff(a, c)
+		assert len(report.modified) == 2
+
+		# serialization
+		data = report.to_dict()
+		assert len(data['modified']) == 2 and data['num_unchanged'] == 18
+		assert "2 modified" in report.format()
+
+	def test_rekeyed_and_infinity( self ):
+		linear = dict(in_types=[kTangentLinear] * 2, out_types=[kTangentLinear] * 2)
+		a = [CurveData("a", targets=["node.tx"], times=[0.0, 10.0], values=[0.0, 10.0], **linear)]
+		
+		# an additional key on the line does not change the shape
+		b = [CurveData("b", targets=["node.tx"], times=[0.0, 5.0, 10.0], values=[0.0, 5.0, 10.0], 
+						in_types=[kTangentLinear] * 3, out_types=[kTangentLinear] * 3)]
+		report = diff(a, b)
+		assert not report and not report.modified and report.num_unchanged == 0
+		assert len(report.rekeyed) == 1 and report.rekeyed[0].keys_changed
+		assert report.rekeyed[0].max_deviation < 1.0e-9
+		assert "1 rekeyed" in report.format() and len(report.to_dict()['rekeyed']) == 1
+		
+		# differing infinity types change the animation outside of the keys
+		c = [CurveData("c", targets=["node.tx"], times=[0.0, 10.0], values=[0.0, 10.0], 
+						post_infinity=kLinear, **linear)]
+		report = diff(a, c)
+		assert len(report.modified) == 1 and abs(report.max_deviation() - 10.0) < 1.0e-9
+		
+		# flat tangents with linear infinity keep the curve constant outside of the keys
+		flat = dict(in_types=[kTangentFlat] * 2, out_types=[kTangentFlat] * 2)
+		d = [CurveData("d", targets=["node.tx"], times=[0.0, 10.0], values=[0.0, 10.0], **flat)]
+		e = [CurveData("e", targets=["node.tx"], times=[0.0, 10.0], values=[0.0, 10.0], 
+						pre_infinity=kLinear, post_infinity=kLinear, **flat)]
+		report = diff(d, e)
+		assert not report and len(report.rekeyed) == 1
+
+	def test_command_line( self ):
+		# maya binary files cannot be read without maya
+		prev = sys.modules.get('maya.standalone')
+		sys.modules['maya.standalone'] = None
+		try:
+			self.failUnlessRaises(SystemExit, main, ["a.mb", "b.mb"])
+		finally:
+			if prev is None:
+				del(sys.modules['maya.standalone'])
+			else:
+				sys.modules['maya.standalone'] = prev
+			# END restore module
+		# END assure module is restored
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Test the package and its pure modules can be imported without maya"""
+import unittest
+import subprocess
+import sys
+import os
+
+
+_pure_modules = ('animio', 'animio.curve', 'animio.clip', 'animio.cache', 'animio.catalog', 
+				'animio.shard', 'animio.mapping', 'animio.diff', 'animio.plan')
+
+
+class TestImport( unittest.TestCase ):
+
+	def test_pure_modules( self ):
+		# use a fresh interpreter, the test runner might have imported mrv already
+		script = ("import sys\n"
+					"for name in %r:\n"
+					"	__import__(name)\n"
+					"assert not [m for m in sys.modules if m.split('.')[0] in ('mrv', 'maya')]\n"
+					"import animio\n"
+					"assert not animio._mrv_is_available\n") % (_pure_modules, )
+		root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+		process = subprocess.Popen([sys.executable, "-c", script], cwd=root, 
+									stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		stdout, stderr = process.communicate()
+		assert process.returncode == 0, stderr
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""Test the idle job scheduler using a stand-in event loop"""
+from animio.jobs import *
+
+import unittest
+
+
+def count_to(count, record):
+	"""Job generator appending each step to the record list"""
+	try:
+		for i in xrange(count):
+			record.append(i)
+			yield float(i + 1) / count
+		# END for each step
+	finally:
+		record.append('done')
+	# END assure we know when we are done
+
+def fail_after(count):
+	for i in xrange(count):
+		yield 0.0
+	# END for each step
+	raise ValueError("failed")
+
+
+class TestJobs( unittest.TestCase ):
+
+	def _make_scheduler(self):
+		loop = ManualEventLoop()
+		# a slice of 0 means we process one chunk per event
+		return loop, JobScheduler(loop, time_slice=0)
+
+	def test_job( self ):
+		record = list()
+		job = Job("counter", count_to, 2, record)
+		assert job.state == Job.kQueued and not record
+
+		assert job.step() and job.state == Job.kRunning
+		assert job.progress == 0.5
+		assert job.step() and job.progress == 1.0
+		assert not job.step()
+		assert job.state == Job.kFinished and job.is_done()
+		assert record == [0, 1, 'done']
+
+		# cancel closes the generator
+		record = list()
+		job = Job("counter", count_to, 10, record)
+		job.step()
+		job.cancel()
+		assert job.state == Job.kCancelled
+		assert record == [0, 'done']
+		assert not job.step()
+
+		# failures are recorded
+		job = Job("failure", fail_after, 1)
+		job.step()
+		self.failUnlessRaises(ValueError, job.step)
+		assert job.state == Job.kFailed and isinstance(job.error, ValueError)
+
+	def test_scheduler( self ):
+		loop, sched = self._make_scheduler()
+		assert not sched.is_busy() and sched.current_job() is None
+		assert not loop.has_callbacks()
+
+		progressed, finished = list(), list()
+		sched.progress_callbacks.append(progressed.append)
+		sched.finished_callbacks.append(finished.append)
+
+		r1, r2 = list(), list()
+		j1 = sched.submit(Job("first", count_to, 3, r1))
+		j2 = sched.submit(Job("second", count_to, 2, r2))
+		assert loop.has_callbacks()
+		assert sched.jobs() == [j1, j2] and sched.current_job() is j1
+
+		# jobs are processed in order, one chunk per event
+		loop.process_events(2)
+		assert r1 == [0, 1] and not r2
+		assert progressed == [j1, j1]
+
+		loop.process_events(100)
+		assert r1 == [0, 1, 2, 'done'] and r2 == [0, 1, 'done']
+		assert finished == [j1, j2]
+		assert j1.state == j2.state == Job.kFinished
+
+		# we deregister once there is no more work
+		assert not loop.has_callbacks() and not sched.is_busy()
+
+		# cancel the current job and all others
+		r1, r2 = list(), list()
+		j1 = sched.submit(Job("first", count_to, 3, r1))
+		j2 = sched.submit(Job("second", count_to, 2, r2))
+		loop.process_events()
+		assert sched.cancel() is j1
+		assert r1 == [0, 'done'] and sched.current_job() is j2
+		assert sched.cancel(j1) is None
+
+		assert sched.cancel_all() == [j2]
+		assert j2.state == Job.kCancelled and not r2
+		assert not loop.has_callbacks()
+		assert sched.cancel() is None
+
+		# failing jobs do not stop the queue
+		r1 = list()
+		jf = sched.submit(Job("failure", fail_after, 1))
+		j1 = sched.submit(Job("first", count_to, 1, r1))
+		loop.process_events(10)
+		assert jf.state == Job.kFailed and j1.state == Job.kFinished
+
+		# flush works synchronously
+		r1 = list()
+		j1 = sched.submit(Job("first", count_to, 5, r1))
+		sched.flush()
+		assert j1.state == Job.kFinished and len(r1) == 6
+		assert not loop.has_callbacks()
+
+		# with a time slice, many chunks are processed per event
+		sched.time_slice = 10.0
+		r1 = list()
+		sched.submit(Job("first", count_to, 50, r1))
+		assert loop.process_events() == 1
+		assert len(r1) == 51
@@ -2,6 +2,13 @@
 """General library testing"""
 from animio.test.lib import *
 from animio.lib import *
+from animio.diff import diff
+from animio.mapping import MappingTable
+from animio.shard import Manifest, shard_path
+from animio.plan import AssignmentPlan
+from animio.curve import CurveData, kTangentFixed, kTangentClamped, kTangentLinear, kTangentFlat, kCycle
+from animio.clip import ClipData, read_clips
+from animio.lib import _create_curves, _current_fps
 
 import mrv.test.maya as tmrv
 import mrv.maya.nt as nt
@@ -131,8 +138,37 @@ class TestAnimationHandle( TestBase ):
 		# END for each handle
 	
 	@with_scene('blendNmute.ma')
-	def _test_mute_and_blend( self ):
-		self.fail("TODO")
+	def test_mute_and_blend( self ):
+		blended = nt.Node("blended")
+		muted = nt.Node("muted")
+		ah = AnimationHandle.create()
+		ah.set_animation((blended, muted))
+
+		# targets are the final plugs, not the intermediates
+		targets = dict((cd.name, cd.targets) for cd in ah.iter_curve_data())
+		assert targets["nurbsSphere1_translateX"][0].endswith("blended.translateX")
+		assert targets["pCube1_rotateX"][0].endswith("muted.rotateX")
+		assert targets["pCube1_rotateY"][0].endswith("muted.rotateY")
+
+		# the intermediate inputs are stored alongside
+		chains = ah.findPlug('imif').masData().array()
+		assert len(chains) == len(targets)
+		assert [c for c in chains if "pairBlend1" in c]
+		assert [c for c in chains if "mute_pCube1_rotateX" in c]
+
+		# applying reconnects the curves to the intermediates
+		for curve in ah.iter_animation():
+			curve.output.mdisconnect()
+		# END for each curve
+		ah.apply_animation()
+		assert nt.Node("nurbsSphere1_translateX").output.moutputs()[0].mwrappedNode() == nt.Node("pairBlend1")
+		assert nt.Node("pCube1_rotateX").output.moutputs()[0].mwrappedNode() == nt.Node("mute_pCube1_rotateX")
+		assert nt.Node("pCube1_rotateY").output.moutputs()[0].mwrappedNode() == muted
+
+		# without the intermediates, the final targets are used
+		cmds.delete("mute_pCube1_rotateX")
+		ah.apply_animation()
+		assert nt.Node("pCube1_rotateX").output.moutputs()[0].mwrappedNode() == muted
 		
 	@with_scene('1still3moving.ma')
 	def test_export_import( self ):
@@ -261,7 +297,641 @@ class TestAnimationHandle( TestBase ):
 				assert splug_name in src_plgs[i].name()
 				assert dplug_name in trgt_plgs[i].name()
 			# END for each sourceplug/targetplug
+		# END for each case
+		
+		# mapping tables convert all names at once, strict ones skip unmapped targets
+		table = MappingTable([("*coneAnimated.*", "*cubeAnimated.*")], strict=True)
+		pairs = list(ahb.iter_assignments(converter=table))
+		assert pairs
+		for src_plg, trgt_plg in pairs:
+			assert "cone" in src_plg.name() and "cube" in trgt_plg.name()
+		# END for each assignment
+		
+		# records match the assignments, their target plugs are created on demand
+		records = list(ahb.iter_assignment_records(converter=table))
+		assert len(records) == len(pairs)
+		for record, (src_plg, trgt_plg) in zip(records, pairs):
+			assert record._target is None
+			assert record.source == src_plg and record[0] == src_plg
+			s, t = record
+			assert t == trgt_plg and record._target is None
+			assert record.target == trgt_plg and record._target is not None
+		# END for each record
+		self.failUnlessRaises(IndexError, records[0].__getitem__, 2)
+		
+		# records of the same curve share the source plug
+		assert len(set(id(r.source) for r in records)) == len(set(r.curve_index for r in records))
+		
+		# targets of records are not checked up front, missing ones raise on access
+		missing = lambda source, name: "doesnotexist.tx"
+		assert not list(ahb.iter_assignments(converter=missing))
+		records = list(ahb.iter_assignment_records(converter=missing))
+		assert len(records) == len(list(ahb.iter_assignments()))
+		for record in records:
+			assert record.target_name == "doesnotexist.tx"
+			self.failUnlessRaises(RuntimeError, getattr, record, 'target')
+		# END for each record
 				
+	@with_scene('1still3moving.ma')
+	def test_time_offset( self ):
+		ah = AnimationHandle.create()
+		ah.set_animation(nt.it.iterDagNodes(nt.api.MFn.kTransform, asNode=0))
+		first, last = ah.time_range()
+		assert first < last
+		
+		ah.apply_animation(time_offset=10)
+		assert ah.time_range() == (first + 10, last + 10)
+		
+		# offsets are relative to the stored keys, they do not accumulate
+		ah.apply_animation(time_offset=10)
+		assert ah.time_range() == (first + 10, last + 10)
+		
+		# scale pivots around the first stored key, before the offset is applied
+		ah.apply_animation(time_offset=10, time_scale=2.0)
+		assert ah.time_range() == (first + 10, first + 10 + (last - first) * 2)
+		
+		# undo restores the previous keys and the previously applied offset
+		cmds.undo()
+		assert ah.time_range() == (first + 10, last + 10)
+		ah.apply_animation(time_offset=10, time_scale=2.0)
+		ah.apply_animation(time_offset=10, time_scale=2.0)
+		assert ah.time_range() == (first + 10, first + 10 + (last - first) * 2)
+		ah.apply_animation(time_offset=5, time_scale=0.5)
+		assert ah.time_range() == (first + 5, first + 5 + (last - first) * 0.5)
+		
+		# without offset and scale, the stored keys are restored
+		ah.apply_animation()
+		assert ah.time_range() == (first, last)
+		ah.apply_animation(time_offset=10, time_scale=2.0)
+		
+		# the targets still use the managed animation
+		cone = nt.Node("coneAnimated")
+		assert cmds.findKeyframe(cone, which="first") >= first + 10
+		
+		# empty handles have no range
+		self.failUnlessRaises(ValueError, AnimationHandle.create().time_range)
+		
+	@with_scene('1still3moving.ma')
+	def test_merge_modes( self ):
+		cone = nt.Node("coneAnimated")
+		ah = AnimationHandle.create()
+		ah.set_animation((cone, ))
+		filename = ospath.join(tempfile.gettempdir(), "cone_export.ani.ma")
+		assert filename == ah.to_file(filename, force=True, type="mayaAscii")
+		ah.delete()
+		
+		def curve_names(node):
+			return sorted(c.name() for c in nt.AnimCurve.findAnimation((node, )))
+		def num_keys(node):
+			return sum(c.numKeys() for c in nt.AnimCurve.findAnimation((node, )))
+		
+		def keys(node):
+			return [(cmds.keyframe(name, q=True, timeChange=True), cmds.keyframe(name, q=True, valueChange=True))
+					for name in curve_names(node)]
+		
+		cone_curves = curve_names(cone)
+		cone_keys = num_keys(cone)
+		first = cmds.findKeyframe(cone, which="first")
+		last = cmds.findKeyframe(cone, which="last")
+		
+		ahb = AnimationHandle.from_file(filename)[1].next()
+		self.failUnlessRaises(ValueError, ahb.apply_animation, mode="invalid")
+		
+		# replacing the keys with the same ones keeps the existing curves
+		ahb.apply_animation(mode=AnimationHandle.kReplace)
+		assert curve_names(cone) == cone_curves
+		assert num_keys(cone) == cone_keys
+		
+		# insert moves existing keys behind the inserted ones, each curve makes room 
+		# for the keys of its own source curve
+		def key_range(name):
+			return (cmds.findKeyframe(name, which="first"), cmds.findKeyframe(name, which="last"))
+		ranges = dict((name, key_range(name)) for name in cone_curves)
+		keys_before = keys(cone)
+		ahb.apply_animation(mode=AnimationHandle.kInsert, insert_gap=2.0)
+		assert curve_names(cone) == cone_curves
+		assert num_keys(cone) == cone_keys * 2
+		assert cmds.findKeyframe(cone, which="first") == first
+		for name, (cfirst, clast) in ranges.iteritems():
+			assert key_range(name) == (cfirst, clast + (clast - cfirst) + 2.0)
+		# END for each curve
+		
+		# inserts can be undone and redone
+		keys_after = keys(cone)
+		cmds.undo()
+		assert keys(cone) == keys_before
+		cmds.redo()
+		assert keys(cone) == keys_after
+		
+		# unanimated targets receive new curves
+		cyl = nt.Node("cylinderStill")
+		ahb.apply_animation(converter=lambda s, t: t.replace("coneAnimated", "cylinderStill"), 
+							mode=AnimationHandle.kReplace)
+		assert len(curve_names(cyl)) == len(cone_curves)
+		assert num_keys(cyl) == cone_keys
+		
+		# undo removes the new curves, redo restores them with their keys
+		keys_after = keys(cyl)
+		cmds.undo()
+		assert not curve_names(cyl)
+		cmds.redo()
+		assert keys(cyl) == keys_after
+		
+		# tangents, weights and infinity types of merged keys are kept
+		cmds.cutKey("cylinderStill", attribute="scaleY", clear=True)
+		cmds.setKeyframe("cylinderStill", attribute="scaleY", time=20, value=2.0)
+		curve = CurveData("tangents", "animCurveTU", ["cylinderStill.scaleY"], [1.0, 10.0], [0.0, 5.0], 
+							[kTangentFixed] * 2, [kTangentFixed] * 2, [1.0, 3.0], [2.0, 0.0], 
+							[3.0, 1.0], [0.0, 2.0], True, kCycle, kCycle)
+		tangent_handle = AnimationHandle.from_clip(ClipData("tangents", [curve], _current_fps()))
+		source_name = tangent_handle.iter_animation().next().name()
+		tangent_handle.apply_animation(mode=AnimationHandle.kReplace)
+		target_name = nt.Node("cylinderStill").scaleY.minput().mwrappedNode().name()
+		assert target_name != source_name
+		assert cmds.keyframe(target_name, q=True, timeChange=True) == [1.0, 10.0, 20.0]
+		cmds.undo()
+		assert cmds.keyframe(target_name, q=True, timeChange=True) == [20.0]
+		assert cmds.keyTangent(target_name, q=True, weightedTangents=True) == [False]
+		cmds.redo()
+		assert cmds.keyframe(target_name, q=True, timeChange=True) == [1.0, 10.0, 20.0]
+		assert cmds.keyTangent(target_name, q=True, weightedTangents=True) == [True]
+		for flag in ('inAngle', 'inWeight', 'outAngle', 'outWeight'):
+			source_values = cmds.keyTangent(source_name, q=True, index=(0, 1), **{flag : True})
+			target_values = cmds.keyTangent(target_name, q=True, index=(0, 1), **{flag : True})
+			for sval, tval in zip(source_values, target_values):
+				assert abs(sval - tval) < 1.0e-4, flag
+			# END for each key
+		# END for each tangent attribute
+		# only the pre infinity is taken, the target keeps its last key
+		assert cmds.setInfinity(target_name, q=True, preInfinite=True) == ["cycle"]
+		assert cmds.setInfinity(target_name, q=True, postInfinite=True) == ["constant"]
+		tangent_handle.delete()
+		
+		ahb.delete()
+		os.remove(filename)
+		
+	@with_scene('1still3moving.ma')
+	def test_pose( self ):
+		cone = nt.Node("coneAnimated")
+		cyl = nt.Node("cylinderStill")
+		ah = AnimationHandle.create()
+		ah.set_animation((cone, ))
+		first, last = ah.time_range()
+		middle = first + (last - first) / 2.0
+		to_cyl = lambda s, t: t.replace("coneAnimated", "cylinderStill")
+		
+		# animated targets are skipped
+		assert ah.apply_pose() == 0
+		
+		for pose, time in ((AnimationHandle.kFirstPose, first), 
+							(AnimationHandle.kLastPose, last), 
+							(middle, middle)):
+			assert ah.apply_pose(pose, converter=to_cyl) == len(ah.affectedBy)
+			
+			cmds.currentTime(time)
+			for s_plug, t_plug in ah.iter_assignments(converter=to_cyl):
+				assert abs(cmds.getAttr(t_plug.name()) - cmds.getAttr(s_plug.name())) < 1.0e-5
+			# END for each assignment
+		# END for each pose
+		
+		# poses do not create animation
+		assert not nt.AnimCurve.findAnimation((cyl, ))
+		
+		# predicates are respected
+		assert ah.apply_pose(converter=to_cyl, predicate=lambda s, t: t.split(".")[-1] in ("tx", "translateX")) == 1
+		
+		# driven keys are evaluated at the value of their driver, not at the time
+		for driver_value, value in ((0.0, 0.0), (10.0, 5.0)):
+			cmds.setDrivenKeyframe("cylinderStill.ty", currentDriver="cylinderStill.tx", driverValue=driver_value, 
+									value=value, inTangentType="linear", outTangentType="linear")
+		# END for each driven key
+		driven = AnimationHandle.create()
+		driven.set_animation((cyl, ))
+		curve = cyl.ty.minput().mwrappedNode().name()
+		cmds.disconnectAttr(curve + ".output", "cylinderStill.ty")
+		cyl.tx.msetFloat(4.0)
+		cyl.ty.msetFloat(0.0)
+		assert driven.apply_pose(100.0) == 1
+		assert abs(cyl.ty.asFloat() - 2.0) < 1.0e-5
+		
+		# without driver, there is no value to set
+		cyl.ty.msetFloat(0.0)
+		cmds.disconnectAttr("cylinderStill.tx", curve + ".input")
+		assert driven.apply_pose(100.0) == 0
+		assert cyl.ty.asFloat() == 0.0
+
+	@with_scene('1still3moving.ma')
+	def test_plan( self ):
+		cone = nt.Node("coneAnimated")
+		cyl = nt.Node("cylinderStill")
+		ah = AnimationHandle.create()
+		ah.set_animation((cone, ))
+		to_cyl = lambda s, t: t.replace("coneAnimated", "cylinderStill")
+		
+		plan = ah.plan(converter=to_cyl)
+		assert len(plan) == len(list(ah.iter_assignments(converter=to_cyl)))
+		assert plan.resolved is None
+		assert ah.execute(plan) == (len(plan), 0)
+		assert plan.resolved is not None
+		for s_plug, t_plug in ah.iter_assignments(converter=to_cyl):
+			assert t_plug.minput() == s_plug
+		# END for each assignment
+		
+		# warm plans skip connected targets as well
+		assert ah.execute(plan) == (0, len(plan))
+		
+		# plans survive a roundtrip through a file
+		filename = ospath.join(tempfile.gettempdir(), "cone.plan")
+		plan.write(filename)
+		read_plan = AssignmentPlan.read(filename)
+		os.remove(filename)
+		assert read_plan == plan and read_plan.resolved is None
+		
+		# cached plugs are dropped once a node is deleted
+		cmds.delete("cylinderStill")
+		assert ah.execute(plan) == (0, 0)
+		
+		# plans do not fit handles managing other animation
+		ah.set_animation((nt.Node("cubeAnimated"), ))
+		self.failUnlessRaises(ValueError, ah.execute, read_plan)
+		self.failUnlessRaises(ValueError, ah.execute, plan, mode="invalid")
+
+	@with_scene('1still3moving.ma')
+	def test_apply_many( self ):
+		cone = nt.Node("coneAnimated")
+		cube = nt.Node("cubeAnimated")
+		cyl = nt.Node("cylinderStill")
+		hcone = AnimationHandle.create()
+		hcone.set_animation((cone, ))
+		hcube = AnimationHandle.create()
+		hcube.set_animation((cube, ))
+		num_cone = len(list(hcone.iter_assignments()))
+
+		self.failUnlessRaises(ValueError, AnimationHandle.apply_many, (hcone, ), priority="invalid")
+
+		# without conflicts, all curves are connected
+		assert AnimationHandle.apply_many((hcone, hcube)) == list()
+
+		# both handles animate the cylinder, the last one wins by default
+		to_cyl = lambda s, t: t.replace("coneAnimated", "cylinderStill").replace("cubeAnimated", "cylinderStill")
+		for priority, winner, loser in ((AnimationHandle.kLastWins, hcube, hcone),
+										(AnimationHandle.kFirstWins, hcone, hcube)):
+			conflicts = AnimationHandle.apply_many((hcone, hcube), converter=to_cyl, priority=priority)
+			assert len(conflicts) == num_cone
+			assert conflicts == sorted(conflicts)
+			winner_curves = set(c.name() for c in winner.iter_animation())
+			loser_curves = set(c.name() for c in loser.iter_animation())
+			for target, winning_curve, losing_curves in conflicts:
+				assert winning_curve in winner_curves
+				assert len(losing_curves) == 1 and losing_curves[0] in loser_curves
+				assert cmds.listConnections(target, source=True, destination=False)[0] == winning_curve
+			# END for each conflict
+		# END for each priority
+
+		# it matches applying the handles one after another
+		hcone.apply_animation(to_cyl)
+		hcube.apply_animation(to_cyl)
+		connected = [cmds.listConnections(t.name(), source=True, destination=False)
+						for s, t in hcube.iter_assignments(converter=to_cyl)]
+		cmds.undo(); cmds.undo()
+		AnimationHandle.apply_many((hcone, hcube), converter=to_cyl)
+		assert connected == [cmds.listConnections(t.name(), source=True, destination=False)
+								for s, t in hcube.iter_assignments(converter=to_cyl)]
+		
+		# nodes with the same name below different parents are different targets
+		for parent in ("groupA", "groupB"):
+			cmds.createNode("transform", name="target", parent=cmds.createNode("transform", name=parent))
+		# END for each parent
+		to_targets = lambda s, t: t.replace("coneAnimated", "groupA|target").replace("cubeAnimated", "groupB|target")
+		assert AnimationHandle.apply_many((hcone, hcube), converter=to_targets) == list()
+		for handle in (hcone, hcube):
+			for s_plug, t_plug in handle.iter_assignments(converter=to_targets):
+				assert t_plug.isDestination() and t_plug.minput() == s_plug
+			# END for each assignment
+		# END for each handle
+
+	@with_scene('1still3moving.ma')
+	def test_layers( self ):
+		cone = nt.Node("coneAnimated")
+		# without layers, there is a single handle
+		handles = AnimationHandle.create_layer_handles((cone, ))
+		assert len(handles) == 1 and handles[0].layer_info() is None
+		cmds.undo()
+		
+		# put the cone's translation into a layer and key it there
+		layer = cmds.animLayer("offsetLayer", attribute=["coneAnimated.tx", "coneAnimated.ty"])
+		cmds.setAttr(layer + ".weight", 0.5)
+		cmds.setKeyframe("coneAnimated.tx", animLayer=layer, time=1, value=2.0)
+		cmds.setKeyframe("coneAnimated.ty", animLayer=layer, time=1, value=3.0)
+		
+		handles = AnimationHandle.create_layer_handles((cone, ))
+		assert len(handles) == 2
+		root_info, layer_info = [h.layer_info() for h in handles]
+		assert root_info['root'] and root_info['index'] == 0
+		assert not layer_info['root'] and layer_info['name'] == layer
+		assert layer_info['weight'] == 0.5 and layer_info['parent'] == root_info['name']
+		assert len(handles[1].affectedBy) == 2
+		
+		# export by layer and rebuild the layer in a new scene
+		tmpfile = ospath.join(tempfile.gettempdir(), "layers.ma")
+		cmds.undo()
+		AnimInOutLibrary.export(tmpfile, (cone, ), layers=True)
+		mrvmaya.Scene.open(fixture_path('1still3moving.ma'), force=True)
+		for reference in (True, False):
+			for progress in AnimInOutLibrary.iter_import(tmpfile, reference=reference):
+				pass
+			# END for each step
+			assert cmds.objExists(layer) and cmds.nodeType(layer) == 'animLayer'
+			assert cmds.getAttr(layer + ".weight") == 0.5
+			assert len(cmds.animLayer(layer, q=True, animCurves=True)) == 2
+			assert sorted(cmds.animLayer(layer, q=True, attribute=True)) == ["coneAnimated.translateX", "coneAnimated.translateY"]
+			cmds.delete(layer)
+		# END for each import type
+		
+		# nodes without layered animation may still have a static pose
+		cyl = nt.Node("cylinderStill")
+		cmds.animLayer("emptyLayer")
+		assert AnimationHandle.create_layer_handles((cyl, )) == list()
+		self.failUnlessRaises(ValueError, AnimInOutLibrary.export, tmpfile, (cyl, ), layers=True)
+		cyl.tx.msetFloat(2.0)
+		AnimInOutLibrary.export(tmpfile, (cyl, ), layers=True, static=True)
+		cyl.tx.msetFloat(0.0)
+		for progress in AnimInOutLibrary.iter_import(tmpfile):
+			pass
+		# END for each step
+		assert cyl.tx.asFloat() == 2.0
+
+	@with_scene('1still3moving.ma')
+	def test_static_pose( self ):
+		cyl = nt.Node("cylinderStill")
+		cone = nt.Node("coneAnimated")
+		handle = AnimationHandle.create()
+		assert handle.static_pose() == (list(), list())
+		
+		cyl.tx.msetFloat(2.0)
+		cyl.rx.msetFloat(0.5)
+		num_static = handle.set_static_pose((cyl, cone))
+		targets, values = handle.static_pose()
+		assert num_static == len(targets) == len(values)
+		assert "cylinderStill.translateX" in targets
+		assert values[targets.index("cylinderStill.translateX")] == 2.0
+		# shapes are only included if given explicitly, locked channels are skipped
+		shape = cmds.listRelatives("cylinderStill", shapes=True)[0]
+		assert "cylinderStill.scaleZ" in targets
+		assert not [t for t in targets if t.startswith(shape + ".")]
+		cmds.setAttr("cylinderStill.sz", lock=True)
+		handle.set_static_pose((cyl, ))
+		assert "cylinderStill.scaleZ" not in handle.static_pose()[0]
+		cmds.setAttr("cylinderStill.sz", lock=False)
+		assert handle.set_static_pose((cyl, cone)) == num_static
+		# animated channels are not part of the pose
+		assert cone.tx.isDestination() and "coneAnimated.translateX" not in targets
+		
+		cyl.tx.msetFloat(0.0)
+		cyl.rx.msetFloat(0.0)
+		assert handle.apply_static_pose(predicate=lambda s, t: s.isNull() and t.startswith("cylinder")) > 0
+		assert cyl.tx.asFloat() == 2.0 and cyl.rx.asFloat() == 0.5
+		cmds.undo()
+		assert cyl.tx.asFloat() == 0.0
+		
+		# export static channels, even without any animation
+		tmpfile = ospath.join(tempfile.gettempdir(), "static.ma")
+		cyl.tx.msetFloat(2.0)
+		self.failUnlessRaises(ValueError, AnimInOutLibrary.export, tmpfile, (cyl, ))
+		AnimInOutLibrary.export(tmpfile, (cyl, ), static=True)
+		cyl.tx.msetFloat(0.0)
+		for reference in (True, False):
+			for progress in AnimInOutLibrary.iter_import(tmpfile, reference=reference):
+				pass
+			# END for each step
+			assert cyl.tx.asFloat() == 2.0
+			cyl.tx.msetFloat(0.0)
+		# END for each import type
+
+	@with_scene('1still3moving.ma')
+	def test_discovery( self ):
+		cone = nt.Node("coneAnimated")
+		discovery = AnimationDiscovery()
+		try:
+			assert not discovery._callback_ids
+			curves = discovery.get((cone, ))
+			assert curves and discovery.stats()['misses'] == 1
+			assert discovery._callback_ids
+			assert "coneAnimated.translateX" in [t for c, targets in curves for t, chain in targets]
+			
+			# repeated queries are memoized, handles connecting to curves do not invalidate
+			assert len(discovery.get([cone])) == len(curves)
+			assert discovery.stats()['hits'] == 1
+			handle = AnimationHandle.create()
+			handle._set_curves(discovery.get((cone, )))
+			assert len(handle.affectedBy) == len(curves)
+			assert discovery.stats()['hits'] == 2 and len(discovery) == 1
+			
+			# changing connections invalidates
+			cmds.disconnectAttr(cmds.listConnections("coneAnimated.tx", s=True, d=False, p=True)[0], "coneAnimated.tx")
+			assert len(discovery) == 0 and not discovery._callback_ids
+			assert len(discovery.get((cone, ))) == len(curves) - 1
+			cmds.undo()
+			assert len(discovery.get((cone, ))) == len(curves)
+			
+			# as do renames
+			cone.rename("coneRenamed")
+			assert len(discovery) == 0
+		finally:
+			discovery.remove_callbacks()
+		# END assure callbacks are removed
+		
+		# the shared instance is used by set_animation
+		assert animation_discovery() is animation_discovery()
+		before = animation_discovery().stats()['hits']
+		handle.set_animation((cone, ))
+		handle.set_animation((cone, ))
+		assert animation_discovery().stats()['hits'] == before + 1
+
+	@with_scene('1still3moving.ma')
+	def test_reapply( self ):
+		cone = nt.Node("coneAnimated")
+		handle = AnimationHandle.create()
+		handle.set_animation((cone, ))
+		num_assignments = len(list(handle.iter_assignments()))
+		
+		# everything is connected already
+		assert handle.apply_animation() == (0, num_assignments)
+		
+		# only the disconnected target is connected again
+		cmds.disconnectAttr(cmds.listConnections("coneAnimated.tx", s=True, d=False, p=True)[0], "coneAnimated.tx")
+		assert handle.apply_animation() == (1, num_assignments - 1)
+		assert cone.tx.isDestination()
+		
+		stats = dict()
+		list(handle.iter_apply_animation(chunk_size=1, stats=stats))
+		assert stats == dict(changed=0, skipped=num_assignments)
+
+	@with_scene('1still3moving.ma')
+	def test_skip_identical( self ):
+		cone = nt.Node("coneAnimated")
+		handle = AnimationHandle.create()
+		handle.set_animation((cone, ))
+		filename = ospath.join(tempfile.gettempdir(), "cone_identical.aio")
+		handle.to_file(filename)
+		
+		# the clip's curves are copies of the ones driving the cone
+		clip_handle = AnimationHandle.from_clip(read_clips(filename)[0])
+		num_assignments = len(list(clip_handle.iter_assignments()))
+		assert clip_handle.paste_animation(option="fitReplace", skip_identical=True) == (0, num_assignments)
+		assert clip_handle.apply_animation(skip_identical=True) == (0, num_assignments)
+		assert curve_hashes().stats()['entries'] >= num_assignments * 2
+		
+		# edited curves are hashed again
+		hits = curve_hashes().stats()['hits']
+		cmds.keyframe("coneAnimated.tx", edit=True, relative=True, valueChange=1.0, index=(0, 0))
+		assert clip_handle.apply_animation(skip_identical=True) == (1, num_assignments - 1)
+		assert curve_hashes().stats()['hits'] > hits
+		assert cone.tx.minput().node() == iter(clip_handle.iter_assignments(predicate=lambda s, t: t.endswith("translateX"))).next()[0].node()
+		
+		# inserting cannot skip the identical curves, they would not make room for the keys
+		num_keys = sum(c.numKeys() for c in nt.AnimCurve.findAnimation((cone, )))
+		self.failUnlessRaises(ValueError, clip_handle.apply_animation, mode=AnimationHandle.kInsert, 
+								skip_identical=True)
+		self.failUnlessRaises(ValueError, clip_handle.paste_animation, skip_identical=True)
+		assert sum(c.numKeys() for c in nt.AnimCurve.findAnimation((cone, ))) == num_keys
+		
+		# merge modes skip identical curves as well
+		assert clip_handle.apply_animation(mode=AnimationHandle.kReplace, skip_identical=True)[1] == num_assignments - 1
+		assert clip_handle.apply_animation() == (num_assignments - 1, 1)
+		
+		# without skipping, all channels make room for the inserted keys, even identical ones
+		insert_handle = AnimationHandle.from_clip(read_clips(filename)[0])
+		os.remove(filename)
+		last = cmds.findKeyframe(cone, which="last")
+		assert insert_handle.apply_animation(mode=AnimationHandle.kInsert) == (num_assignments, 0)
+		assert sum(c.numKeys() for c in nt.AnimCurve.findAnimation((cone, ))) == num_keys * 2
+		for curve in nt.AnimCurve.findAnimation((cone, )):
+			assert cmds.findKeyframe(curve.name(), which="last") > last
+		# END for each curve
+
+	@with_scene('1still3moving.ma')
+	def test_takes( self ):
+		cone = nt.Node("coneAnimated")
+		handle = AnimationHandle.create()
+		assert handle.takes() == list() and handle.active_take() is None
+		
+		num_curves = len(animation_discovery().get((cone, )))
+		assert handle.add_take("blocking", (cone, )) == (0, num_curves)
+		assert handle.active_take() == "blocking"
+		self.failUnlessRaises(ValueError, handle.add_take, "blocking", (cone, ))
+		
+		# the second take only stores the edited curve
+		cmds.keyframe("coneAnimated.tx", edit=True, relative=True, valueChange=1.0, index=(0, 0))
+		assert handle.add_take("polish", (cone, )) == (num_curves - 1, 1)
+		assert handle.takes() == ["blocking", "polish"]
+		assert handle.affectedBy.numElements() == num_curves + 1
+		assert len(list(handle.iter_assignments())) == num_curves
+		assert len(list(handle.iter_curve_data())) == num_curves
+		
+		# switching only touches the differing curve
+		tx_curve = cone.tx.minput().node()
+		assert handle.set_active_take("blocking") == (1, num_curves - 1)
+		assert cone.tx.minput().node() == tx_curve
+		assert handle.set_active_take("blocking") == (0, num_curves)
+		assert handle.set_active_take("polish", apply=False) == (0, 0)
+		assert handle.set_active_take("polish") == (1, num_curves - 1)
+		self.failUnlessRaises(ValueError, handle.set_active_take, "missing")
+		
+		# handles managing curves outside of takes cannot receive takes
+		plain = AnimationHandle.create()
+		plain.set_animation((cone, ))
+		self.failUnlessRaises(ValueError, plain.add_take, "take", (cone, ))
+		
+		# takes survive files
+		filename = ospath.join(tempfile.gettempdir(), "cone_takes.aio")
+		handle.to_file(filename)
+		clip = read_clips(filename)[0]
+		os.remove(filename)
+		assert len(clip) == num_curves + 1
+		assert [name for name, indices in clip.takes] == ["blocking", "polish"]
+		clip_handle = AnimationHandle.from_clip(clip)
+		assert clip_handle.takes() == handle.takes() and clip_handle.active_take() == "polish"
+		assert clip_handle.set_active_take("polish") == (0, num_curves)
+		
+		# removing a take deletes the curves nobody else uses
+		handle.remove_take("polish")
+		assert handle.takes() == ["blocking"] and handle.active_take() == "blocking"
+		assert handle.affectedBy.numElements() == num_curves
+		assert handle.set_active_take("blocking") == (1, num_curves - 1)
+		self.failUnlessRaises(ValueError, handle.remove_take, "polish")
+		
+		handle.clear()
+		assert handle.takes() == list() and handle.active_take() is None
+
+	@with_scene('1still3moving.ma')
+	def test_curve_data( self ):
+		ah = AnimationHandle.create()
+		ah.set_animation(nt.it.iterDagNodes(nt.api.MFn.kTransform, asNode=0))
+		curves = list(ah.iter_animation())
+		assert curves
+		
+		# exercise infinity, step and weighted tangents
+		cmds.setInfinity(curves[0], preInfinite="cycle", postInfinite="oscillate")
+		cmds.setInfinity(curves[1], preInfinite="linear", postInfinite="cycleRelative")
+		cmds.keyTangent(curves[2], outTangentType="step")
+		cmds.keyTangent(curves[3], edit=True, weightedTangents=True)
+		cmds.keyTangent(curves[3], index=(0, 0), outWeight=3.0, outAngle=20.0)
+		
+		curve_data = list(ah.iter_curve_data())
+		assert len(curve_data) == len(curves)
+		
+		mfncurve = manim.MFnAnimCurve()
+		unit = nt.api.MTime.uiUnit()
+		for cd, curve in zip(curve_data, curves):
+			assert cd.name == curve.name()
+			assert cd.targets
+			assert len(cd) == curve.numKeys()
+			
+			first, last = cd.time_range()
+			length = last - first
+			times = [first - length * 1.5 + i * (length * 4.0 / 400) for i in range(401)]
+			mfncurve.setObject(curve.object())
+			for time, value in zip(times, cd.evaluate(times)):
+				expected = mfncurve.evaluate(nt.api.MTime(time, unit))
+				assert abs(expected - value) < 1.0e-4, "%s at %f: %f != %f" % (cd.name, time, value, expected)
+			# END for each sample
+		# END for each curve
+		
+		# tangents computed from their type match the ones maya computes
+		times = [1.0, 5.0, 9.0, 12.0, 20.0, 24.0, 30.0]
+		values = [0.0, 10.0, 4.0, 4.0, 9.0, 9.5, -3.0]
+		for tangent_type, ttype in (("clamped", kTangentClamped), ("linear", kTangentLinear), 
+									("flat", kTangentFlat)):
+			node = cmds.createNode("transform")
+			for time, value in zip(times, values):
+				cmds.setKeyframe(node, attribute="tx", time=time, value=value, 
+									inTangentType=tangent_type, outTangentType=tangent_type)
+			# END for each key
+			cd = CurveData(tangent_type, times=times, values=values, 
+							in_types=[ttype] * len(times), out_types=[ttype] * len(times))
+			mfncurve.setObject(nt.Node(node).tx.minput().node())
+			samples = [times[0] + i * 0.25 for i in range(int((times[-1] - times[0]) * 4) + 1)]
+			for time, value in zip(samples, cd.evaluate(samples)):
+				expected = mfncurve.evaluate(nt.api.MTime(time, unit))
+				assert abs(expected - value) < 1.0e-4, "%s at %f: %f != %f" % (tangent_type, time, value, expected)
+			# END for each sample
+		# END for each tangent type
+		
+	@with_scene('1still3moving.ma')
+	def test_diff( self ):
+		ah = AnimationHandle.create()
+		ah.set_animation(nt.it.iterDagNodes(nt.api.MFn.kTransform, asNode=0))
+		before = list(ah.iter_curve_data())
+		assert not diff(before, ah)
+		
+		curve = ah.iter_animation().next()
+		cmds.keyframe(curve, edit=True, relative=True, valueChange=1.0, index=(0, 0))
+		report = diff(before, ah)
+		assert len(report.modified) == len(before[0].targets)
+		assert report.max_deviation() > 0.0
+		assert not report.added and not report.removed
+		
 	@with_scene('1still3moving.ma')
 	def test_paste( self ):
 		
@@ -312,6 +982,36 @@ class TestAnimationHandle( TestBase ):
 		assert cmds.findKeyframe(cylanim, which="first") == sfirst
 		
 
+	@with_scene('1still3moving.ma')
+	def test_paste_copies( self ):
+		cube = nt.Node("cubeAnimated")
+		cyl = nt.Node("cylinderStill")
+		ah = AnimationHandle.create()
+		ah.set_animation((cube, ))
+		to_cyl = lambda s, t: t.replace("cubeAnimated", "cylinderStill")
+		
+		# without time ranges, unanimated targets receive copies of their source curves
+		ah.paste_animation(converter=to_cyl)
+		assert len(nt.anim.AnimCurve.findAnimation([cyl])) == len(list(ah.iter_animation()))
+		for s_plug, t_plug in ah.iter_assignments(converter=to_cyl):
+			t_curve = t_plug.minput().node()
+			assert t_curve != s_plug.node()
+			assert manim.MFnAnimCurve(t_curve).numKeys() == manim.MFnAnimCurve(s_plug.node()).numKeys()
+			assert cmds.keyframe(t_plug.mfullyQualifiedName(), q=True, vc=True) == cmds.keyframe(s_plug.mwrappedNode().name(), q=True, vc=True)
+		# END for each assignment
+		
+		# curves are created in bulk from curve data, driving the given plugs
+		cmds.delete(cmds.listConnections(cyl.name(), s=True, d=False, type="animCurve"))
+		plugs = [cyl.tx, cyl.ry]
+		curve_datas = [CurveData("c", "animCurveTL", times=[1.0, 2.0, 3.0], values=[0.0, 1.0, 0.0])] * 2
+		curves = _create_curves(curve_datas, plugs=plugs)
+		assert len(curves) == 2
+		for curve, plug in zip(curves, plugs):
+			assert plug.minput().node() == curve
+			assert manim.MFnAnimCurve(curve).numKeys() == 3
+		# END for each curve
+		
+
 class TestLibrary( TestBase ):
 	
 	def _assert_no_handles(self):
@@ -335,14 +1035,89 @@ class TestLibrary( TestBase ):
 		assert not exp_file.isfile()
 		self._assert_no_handles()
 		
-		# something with keys works fine
+		# closing the export generator early reverts all changes
 		nani = nt.Node('coneAnimated')
+		export_steps = alib.iter_export(exp_file, (nani,))
+		export_steps.next()
+		export_steps.close()
+		assert not exp_file.isfile()
+		self._assert_no_handles()
+		
+		# the animation is searched in steps, edits made in between steps are kept
+		export_steps = alib.iter_export(exp_file, (nani, nstill), nodes_per_step=1)
+		assert [export_steps.next() for i in range(3)] == [0.25, 0.5, 0.5]
+		cmds.setAttr("cylinderStill.tx", 5.0)
+		export_steps.close()
+		assert not exp_file.isfile()
+		self._assert_no_handles()
+		assert cmds.getAttr("cylinderStill.tx") == 5.0
+		
+		# something with keys works fine
 		alib.export(exp_file, (nani,))
 		assert exp_file.isfile()
 		self._assert_no_handles()
 		
 		# import from the previous file, use remapping to get the animation onto still object
+		cone_curves = nt.AnimCurve.findAnimation((nani,))
+		cmds.delete(cone_curves)
+		assert not nt.AnimCurve.findAnimation((nani,))
+		
+		progress = list(alib.iter_import(exp_file, chunk_size=2))
+		assert progress == sorted(progress) and progress[-1] == 1.0
+		assert len(nt.AnimCurve.findAnimation((nani,))) == len(cone_curves)
+
+		# data only imports create the curves directly, leaving no reference or
+		# handle behind
+		cmds.delete(nt.AnimCurve.findAnimation((nani,)))
+		num_refs = len(FileReference.ls())
+		num_handles = len(list(AnimationHandle.iter_instances()))
+		progress = list(alib.iter_import(exp_file, reference=False))
+		assert progress[-1] == 1.0
+		assert len(nt.AnimCurve.findAnimation((nani,))) == len(cone_curves)
+		assert len(FileReference.ls()) == num_refs
+		assert len(list(AnimationHandle.iter_instances())) == num_handles
+		assert not diff(exp_file, AnimationHandle.iter_instances().next())
+
+		# merging leaves no curves behind
+		num_curves = len(list(nt.it.iterDgNodes(nt.api.MFn.kAnimCurve, asNode=0)))
+		list(alib.iter_import(exp_file, reference=False, mode=AnimationHandle.kReplace))
+		assert len(list(nt.it.iterDgNodes(nt.api.MFn.kAnimCurve, asNode=0))) == num_curves
+
+		mb_file = Path(tempfile.mkstemp('.mb')[1])
+		self.failUnlessRaises(ValueError, list, alib.iter_import(mb_file, reference=False))
+		mb_file.remove()
+		
+		# native files are written by a pipeline and hold the same animation
+		aio_file = Path(exp_file.stripext() + ".aio")
+		progress = list(alib.iter_export(aio_file, (nani,), chunk_size=2))
+		assert progress == sorted(progress) and progress[-1] == 1.0
+		assert aio_file.isfile() and not Path(aio_file + ".tmp").isfile()
+		assert not diff(exp_file, aio_file)
+		cmds.delete(nt.AnimCurve.findAnimation((nani,)))
+		num_refs = len(FileReference.ls())
+		list(alib.iter_import(aio_file))
+		assert len(nt.AnimCurve.findAnimation((nani,))) == len(cone_curves)
+		assert len(FileReference.ls()) == num_refs
+		aio_file.remove()
 		
+		# sharded exports write a manifest and one shard per curve budget
+		manifest_file = Path(exp_file.stripext() + ".aiom")
+		alib.export(manifest_file, (nani,), shard_by="count", max_curves=2)
+		num_shards = (len(cone_curves) + 1) // 2
+		assert manifest_file.isfile() and len(Manifest.read(manifest_file)) == num_shards
+		cmds.delete(nt.AnimCurve.findAnimation((nani,)))
+		list(alib.iter_import(manifest_file))
+		assert len(nt.AnimCurve.findAnimation((nani,))) == len(cone_curves)
+		
+		# selective loads skip shards of other namespaces
+		cmds.delete(nt.AnimCurve.findAnimation((nani,)))
+		list(alib.iter_import(manifest_file, namespaces=["missing"]))
+		assert not nt.AnimCurve.findAnimation((nani,))
+		for index in range(num_shards):
+			Path(shard_path(manifest_file, index)).remove()
+		# END for each shard
+		manifest_file.remove()
+
 		exp_file.remove()
 		
 		
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Test retarget mapping tables without maya"""
+from animio.mapping import *
+
+import unittest
+import tempfile
+import os
+
+
+_rules = """
+# exact pairs win over wildcards
+hero:hand_L.rotateZ -> rig:wrist_L.rotateZ
+hero:*_L.* -> rig:*Left.*
+hero:arm?.tx -> rig:arm.tx
+"""
+
+
+class TestMapping( unittest.TestCase ):
+
+	def test_base( self ):
+		table = MappingTable.from_string(_rules)
+		assert len(table) == 3
+		assert table.map_name("hero:hand_L.rotateZ") == "rig:wrist_L.rotateZ"
+		assert table.map_name("hero:hand_L.rotateX") == "rig:handLeft.rotateX"
+		assert table.map_name("hero:foot_L.tx") == "rig:footLeft.tx"
+		assert table.map_name("hero:arm1.tx") == "rig:arm.tx"
+		assert table.map_name("hero:arm12.tx") == "hero:arm12.tx"
+		assert table.map_name("other.tx") == "other.tx"
+
+		# converter interface
+		assert table(None, "hero:foot_L.ty") == "rig:footLeft.ty"
+
+		# bulk lookups
+		names = ["hero:hand_L.rotateZ", "other.tx", "hero:foot_L.tx"] * 2
+		assert table.map_names(names) == [table.map_name(n) for n in names]
+
+		# strict tables drop unmapped names
+		strict = MappingTable(table.rules(), strict=True)
+		assert strict.map_names(["other.tx", "hero:arm1.tx"]) == [None, "rig:arm.tx"]
+
+		# rules can be added later
+		strict.add_rule("other.tx", "rig:other.tx")
+		assert strict.map_name("other.tx") == "rig:other.tx"
+
+		# invalid input
+		self.failUnlessRaises(ValueError, MappingTable.from_string, "a.tx b.tx")
+		self.failUnlessRaises(ValueError, MappingTable.from_string, "a.tx -> ")
+		self.failUnlessRaises(ValueError, table.add_rule, "a.*", "b.*.*")
+		self.failUnlessRaises(ValueError, table.add_rule, "a.?", "b.?")
+
+		# roundtrip
+		assert MappingTable.from_string(table.to_string()).rules() == table.rules()
+
+	def test_file( self ):
+		fd, path = tempfile.mkstemp('.txt')
+		os.close(fd)
+		try:
+			MappingTable.from_string(_rules).to_file(path)
+			table = MappingTable.from_file(path)
+			assert len(table) == 3
+
+			# tables are cached until the file changes
+			assert MappingTable.from_file(path) is table
+			assert MappingTable.from_file(path, strict=True) is not table
+			open(path, 'ab').write("a.tx -> b.tx\n")
+			changed = MappingTable.from_file(path)
+			assert changed is not table and len(changed) == 4
+		finally:
+			os.remove(path)
+		# END assure file is removed
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Test assignment plans without maya"""
+from animio.plan import *
+
+import unittest
+import tempfile
+import os
+
+
+class TestPlan( unittest.TestCase ):
+
+	def test_base( self ):
+		targets = ["a:n.tx,a:n.ty", "b:n.tx"]
+		chains = ["a:pb.inTranslateX1,", ""]
+		fp = fingerprint(targets, chains)
+		assert fp == fingerprint(list(targets), list(chains))
+		assert fp != fingerprint(targets, ["", ""])
+		assert fp != fingerprint(["a:n.tx", "a:n.ty,b:n.tx"], chains)
+
+		plan = AssignmentPlan("handle", fp)
+		assert len(plan) == 0
+		plan.add(0, "a:pb.inTranslateX1")
+		plan.add(0, "a:n.ty")
+		plan.add(1, "b:n.tx")
+		assert len(plan) == 3
+		assert list(plan) == [(0, "a:pb.inTranslateX1"), (0, "a:n.ty"), (1, "b:n.tx")]
+
+		# adding assignments drops resolved plugs
+		plan.resolved = "resolved"
+		plan.add(1, "b:n.ty")
+		assert plan.resolved is None
+		plan.resolved = "resolved"
+		plan.invalidate()
+		assert plan.resolved is None
+
+		assert plan == AssignmentPlan("handle", fp, plan.curves, plan.targets)
+		assert plan != AssignmentPlan("other", fp, plan.curves, plan.targets)
+		self.failUnlessRaises(ValueError, AssignmentPlan, "handle", fp, [0], [])
+
+	def test_file( self ):
+		fd, path = tempfile.mkstemp('.json')
+		os.close(fd)
+		try:
+			plan = AssignmentPlan("handle", fingerprint(["n.tx"], [""]), [0, 0, 2], ["n.tx", "m.tx", "o.tx"])
+			plan.resolved = "resolved"
+			plan.write(path)
+			read = AssignmentPlan.read(path)
+			assert read == plan and read.resolved is None
+			assert isinstance(read.targets[0], str)
+
+			open(path, 'wb').write('{"version": 0}')
+			self.failUnlessRaises(ValueError, AssignmentPlan.read, path)
+			open(path, 'wb').write('garbage')
+			self.failUnlessRaises(ValueError, AssignmentPlan.read, path)
+		finally:
+			os.remove(path)
+		# END assure file is removed
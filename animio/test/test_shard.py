@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Test sharded exports without maya"""
+from animio.shard import *
+from animio.clip import ClipData, ClipWriter
+from animio.curve import CurveData
+
+import animio
+
+import unittest
+import tempfile
+import shutil
+import types
+import sys
+import os
+
+
+def _curves( namespace, count ):
+	return [CurveData("%s_curve%i" % (namespace, i), "animCurveTL", ["%s:node%i.tx" % (namespace, i)],
+						[1.0, 10.0], [0.0, float(i)]) for i in range(count)]
+
+
+class TestShard( unittest.TestCase ):
+
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def test_plan( self ):
+		handle_targets = [	[["a:n.tx"], ["b:n.tx"], ["a:n.ty"]],
+							[],
+							[["b:m.tx", "a:m.tx"], ["n.tx"], [], ["a:m.ty"]]]
+		shards = plan_shards(handle_targets, kByNamespace)
+		assert shards == [	[(1, []), (0, [0, 2]), (2, [3])],
+							[(0, [1]), (2, [0])],
+							[(2, [1, 2])]]
+
+		shards = plan_shards(handle_targets, kByNamespace, max_curves=2)
+		assert shards[0] == [(1, []), (0, [0, 2])] and shards[1] == [(2, [3])]
+
+		shards = plan_shards(handle_targets, kByCount, max_curves=3)
+		assert shards == [[(1, []), (0, [0, 1, 2])], [(2, [0, 1, 2])], [(2, [3])]]
+
+		assert plan_shards([[]]) == [[(0, [])]]
+		assert plan_shards([]) == []
+		self.failUnlessRaises(ValueError, plan_shards, handle_targets, "invalid")
+		self.failUnlessRaises(ValueError, plan_shards, handle_targets, kByCount, 0)
+
+	def test_manifest_and_load( self ):
+		manifest_file = os.path.join(self.tmpdir, "crowd.aiom")
+		assert is_manifest_file(manifest_file) and not is_manifest_file("crowd.aio")
+
+		manifest = Manifest()
+		for index, namespace in enumerate(("hero", "extra1", "extra2")):
+			curves = _curves(namespace, 10 + index)
+			writer = ClipWriter(shard_path(manifest_file, index))
+			writer.add_clip(ClipData("handle", curves, 25.0))
+			writer.close()
+			manifest.add_shard(os.path.basename(shard_path(manifest_file, index)), ["handle"],
+								[c.targets for c in curves])
+		# END for each shard
+		manifest.write(manifest_file)
+
+		manifest = Manifest.read(manifest_file)
+		assert len(manifest) == 3
+		assert manifest.namespaces() == ["extra1", "extra2", "hero"]
+		assert manifest.shards[1]['num_curves'] == 11
+		assert manifest.select() == [0, 1, 2]
+		assert manifest.select(["extra2", "missing"]) == [2]
+		assert manifest.select(pattern="hero:node9.*") == [0]
+		assert manifest.select(["hero"], pattern="extra*") == []
+
+		for processes in (0, 2):
+			loaded = list(iter_load_shards(manifest_file, processes=processes))
+			assert [index for index, clips in loaded] == [0, 1, 2]
+			assert [len(clips[0]) for index, clips in loaded] == [10, 11, 12]
+			assert loaded[2][1][0].curves[3].targets == ["extra2:node3.tx"]
+		# END for each amount of processes
+
+		loaded = list(iter_load_shards(manifest_file, namespaces=["extra1"], processes=2))
+		assert len(loaded) == 1 and loaded[0][0] == 1
+
+		open(manifest_file, 'wb').write('{"version": 0, "shards": []}')
+		self.failUnlessRaises(ValueError, Manifest.read, manifest_file)
+		open(manifest_file, 'wb').write('garbage')
+		self.failUnlessRaises(ValueError, Manifest.read, manifest_file)
+
+	def test_processes( self ):
+		if animio._in_maya():
+			assert animio._default_processes() == 0
+			return
+		# END handle maya
+		assert animio._default_processes() > 0
+
+		# within maya, shards are read in-process by default
+		sys.modules['maya.cmds'] = types.ModuleType('maya.cmds')
+		try:
+			assert animio._in_maya() and animio._default_processes() == 0
+			# explicitly requested workers are not started either
+			assert animio._process_pool(2) is None
+			manifest_file = os.path.join(self.tmpdir, "serial.aiom")
+			manifest = Manifest()
+			writer = ClipWriter(shard_path(manifest_file, 0))
+			writer.add_clip(ClipData("handle", _curves("hero", 2)))
+			writer.close()
+			manifest.add_shard(os.path.basename(shard_path(manifest_file, 0)), ["handle"], [["hero:node0.tx"], ["hero:node1.tx"]])
+			manifest.write(manifest_file)
+			assert [index for index, clips in iter_load_shards(manifest_file, processes=2)] == [0]
+		finally:
+			del(sys.modules['maya.cmds'])
+		# END assure fake module is removed
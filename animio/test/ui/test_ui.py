@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from animio.test.lib import *
 from animio.ui import *
+from animio.jobs import Job
 import tempfile
 
 from mrv.maya import Scene
@@ -50,15 +51,23 @@ class TestGeneralUI( unittest.TestCase ):
 		
 
 		# should use selected nodes, but there is no one selected in the scene
+		# the export runs as job, which fails
 		ectrl.nodeselector.set_uses_selection(True)
 		ectrl.nodeselector.set_uses_selection(True)
-		self.failUnlessRaises(ValueError, ectrl._on_export, None)
+		job = ectrl._on_export(None)
+		assert isinstance(job, Job)
+		assert scheduler().is_busy()
+		scheduler().flush()
+		assert job.state == Job.kFailed and isinstance(job.error, ValueError)
 		assert not exp_file.isfile()
 		
 		
 		# something with keys is selected
 		nt.select('coneAnimated')
-		ectrl._on_export(None)
+		job = ectrl._on_export(None)
+		assert not exp_file.isfile()
+		scheduler().flush()
+		assert job.state == Job.kFinished
 		assert exp_file.isfile()
 		cone_anim_file = exp_file
 		
@@ -85,6 +94,13 @@ class TestGeneralUI( unittest.TestCase ):
 		# export to namespaces
 		exp_file = self._set_export_file()
 		ectrl._on_export(None)
+		
+		# cancelled jobs do not write anything
+		scheduler().cancel_all()
+		assert not exp_file.isfile()
+		
+		ectrl._on_export(None)
+		scheduler().flush()
 		assert exp_file.isfile()
 		
 		
@@ -2,7 +2,11 @@
 """Module containing the user interface implementation of the AnimIO library"""
 __docformat__ = "restructuredtext"
 
+from animio import _assure_mrv_is_available
+_assure_mrv_is_available()
+
 import animio.lib as lib
+from animio.jobs import Job, JobScheduler
 import mrv.maya.nt as nt
 import mrv.maya.ui as ui
 import mrv.maya as mrvmaya
@@ -18,6 +22,21 @@ import logging
 log = logging.getLogger("animio.ui")
 
 
+#{ Utilities
+
+_scheduler = None
+def scheduler():
+	""":return: ``JobScheduler`` shared by all user interfaces to run export and 
+		import jobs while maya is idle"""
+	global _scheduler
+	if _scheduler is None:
+		_scheduler = JobScheduler()
+	# END create scheduler lazily
+	return _scheduler
+
+#} END utilities
+
+
 class FloatRangeField( ui.RowLayout ):
 	"""Implements a queryable range of integers
 	:note: it uses text fields allowing them to be empty"""
@@ -248,6 +267,8 @@ class ExportLayout( ui.FormLayout ):
 		self.range = None
 		self.filetype = None
 		self.rangetype = None
+		self.layers = None
+		self.static = None
 		#} END members 
 		
 		# CREATE UI
@@ -284,9 +305,16 @@ class ExportLayout( ui.FormLayout ):
 			if self.filetype:
 				ui.RadioButton(l="mayaAscii", sl=1)
 				ui.RadioButton(l="mayaBinary")
+				ui.RadioButton(l="compressed")
 			# END radio collection
 			
 			ui.Separator(h=20, style="none")
+			
+			# ANIMATION LAYERS
+			##################
+			self.layers = ui.CheckBox(l="by anim. layer")
+			self.static = ui.CheckBox(l="static channels")
+			ui.Separator(h=20, style="none")
 		# END column layout
 		self.setActive()
 
@@ -354,7 +382,9 @@ class ExportLayout( ui.FormLayout ):
 		# END additional setop
 			
 	def _on_export(self, sender, *args):
-		"""Perform the actual export after gathering UI data"""
+		"""Queue the actual export after gathering UI data
+		
+		:return: the queued ``Job``, or None if the user cancelled"""
 		# NOTE: Ignores timerange for now
 		if not self.nodeselector.uses_selection() and not self.nodeselector.selected_namespaces():
 			raise ValueError("Please select what to export from the scroll list")
@@ -369,14 +399,17 @@ class ExportLayout( ui.FormLayout ):
 			return
 		# END bail out
 		
-		extlist = ( ".ma", ".mb" )
+		extlist = ( ".ma", ".mb", ".aio" )
 		collection = [ p.basename() for p in ui.UI(self.filetype.p_collectionItemArray) ]
 		target_ext = extlist[collection.index(self.filetype.p_select)]
 		
 		file_path = Path(file_path)
 		file_path = file_path.stripext() + target_ext
 		
-		lib.AnimInOutLibrary.export(file_path, self.nodeselector.iter_nodes(asNode=False))
+		job = Job("Export %s" % file_path.basename(), lib.AnimInOutLibrary.iter_export, 
+					file_path, self.nodeselector.iter_nodes(asNode=False), 
+					self.layers.p_value, self.static.p_value)
+		return scheduler().submit(job)
 		
 	def _show_help(self, sender, *args):
 		print "TODO: link to offline docs once they are written"
@@ -401,6 +434,8 @@ class ConverterControl(ui.FormLayout):
 		self.tfreplace = None
 		self.tfprefix = None
 		self.cbprefix = None
+		self.cbsearch = None
+		self.tslsearch = None
 		
 		
 		# PREFIX
@@ -418,7 +453,7 @@ class ConverterControl(ui.FormLayout):
 		
 		# SEARCH AND REPLACE
 		####################
-		cbSearch = ui.CheckBox(l="search:")
+		cbSearch = self.cbsearch = ui.CheckBox(l="search:")
 		tfSearch = self.tfsearch = ui.TextField()
 		tReplace = ui.Text(l=" replace:")
 		tfReplace = self.tfreplace = ui.TextField()
@@ -433,7 +468,7 @@ class ConverterControl(ui.FormLayout):
 		###########################
 		small = 20
 		btnAdd = ui.Button(h=small, l="Add")
-		tslSR = ui.TextScrollList(name="AnimIOSearchReplace", w=190, numberOfRows=3, allowMultiSelection=True)
+		tslSR = self.tslsearch = ui.TextScrollList(name="AnimIOSearchReplace", w=190, numberOfRows=3, allowMultiSelection=True)
 		btnDel = ui.Button(h=small, l="Remove Selected")
 		
 		k = 0
@@ -485,8 +520,14 @@ class ConverterControl(ui.FormLayout):
 		###################
 		cbSearch.e_changeCommand = self._search_state_changed
 		cbPref.e_changeCommand = self._prefix_state_changed
+		btnAdd.e_released = self._add_search_replace
+		btnDel.e_released = self._remove_search_replace
 		
-		
+	
+	#{ Configuration
+	kSearchReplaceSeparator = " -> "
+	#} END configuration
+	
 	#{ Callbacks
 	def _search_state_changed(self, sender, *args):
 		self.tfsearch.p_enable = sender.p_value
@@ -498,6 +539,20 @@ class ConverterControl(ui.FormLayout):
 		self.tfprefix.p_enable = sender.p_value
 		if sender.p_value:
 			self.tfprefix.setFocus()
+	
+	def _add_search_replace(self, sender, *args):
+		"""Store the current search and replace tokens in our list"""
+		if not self.cbsearch.p_value or not self.tfsearch.p_text:
+			return
+		# END skip invalid input
+		self.tslsearch.p_append = self.tfsearch.p_text + self.kSearchReplaceSeparator + self.tfreplace.p_text
+		self.tfsearch.p_text = ""
+		self.tfreplace.p_text = ""
+		
+	def _remove_search_replace(self, sender, *args):
+		for item in noneToList(self.tslsearch.p_selectItem):
+			self.tslsearch.p_removeItem = item
+		# END for each selected item
 		
 	#} END callbacks
 		
@@ -505,15 +560,60 @@ class ConverterControl(ui.FormLayout):
 	def update(self):
 		"""Setup this control to represent the actual scene state"""
 		
+	def search_replace_tokens(self):
+		""":return: list of (search, replace) tuples the user entered, including 
+			the ones in the text fields"""
+		out = list()
+		for item in noneToList(self.tslsearch.p_allItems):
+			search, replace = item.split(self.kSearchReplaceSeparator, 1)
+			out.append((search, replace))
+		# END for each stored item
+		
+		if self.cbsearch.p_value and self.tfsearch.p_text:
+			out.append((self.tfsearch.p_text, self.tfreplace.p_text))
+		# END handle current tokens
+		return out
+		
+	def converter(self):
+		""":return: converter function compatible to ``AnimationHandle.iter_assignments``
+			applying the user's search-and-replace tokens and prefix, or None if 
+			there is nothing to convert"""
+		tokens = self.search_replace_tokens()
+		prefix = ""
+		if self.cbprefix.p_value:
+			prefix = self.tfprefix.p_text
+		# END get prefix
+		
+		if not tokens and not prefix:
+			return None
+		# END nothing to do
+		
+		def convert(source_plug, target_plug_name):
+			for search, replace in tokens:
+				target_plug_name = target_plug_name.replace(search, replace)
+			# END for each token
+			return prefix + target_plug_name
+		# END converter
+		return convert
 		
 	#} END interface 
 	
 class ImportLayout( ui.FormLayout ):
 	"""Layout encapsulating all import functionality"""
 	
+	#{ Annotations 
+	aImport = "Import animation from a file of your choice onto the scene"
+	
+	#} END annotations
+	
 	def __init__(self, **kwargs):
 		self.nodeselector = None
 		self.converter = None
+		self.at_current_time = None
+		self.replace_mode = None
+		self.insert_mode = None
+		self.first_pose = None
+		self.last_pose = None
 		
 		# Converter
 		####################
@@ -528,24 +628,22 @@ class ImportLayout( ui.FormLayout ):
 		selector.p_enable = cbFilter.p_value
 	
 		# buttons
-		btnImport = ui.Button(l="Import...")
+		btnImport = ui.Button(l="Import...", ann=self.aImport)
 		btnIHlp = ui.Button(label="?", ann="...need help?", w=22, h=22)
 		
 		# OPTIONS
 		#########
-		# Currently disabled as we don't yet support anything special yet
 		clOpts = ui.ColumnLayout(w=90, rs=2, adjustableColumn=True)
-		# if its  managed again, adjust the setup of the formlayout, it doesnt work
-		# in this case ( although it should )
-		clOpts.p_manage=False
 		
 		if clOpts:
+			# NOTE: options we don't yet support are disabled
 			ui.Text(w=90, h=20, l="options:", fn="boldLabelFont", align="left")
-			iAniRepGr = ui.RadioButtonGrp(w=90, nrb=1, l1="replace", sl=1)
-			ui.RadioButtonGrp(nrb=1, scl=iAniRepGr, w=90, l1="insert")
+			iAniConGr = ui.RadioButtonGrp(w=90, nrb=1, l1="connect", sl=1)
+			self.replace_mode = ui.RadioButtonGrp(nrb=1, scl=iAniConGr, w=90, l1="replace")
+			self.insert_mode = ui.RadioButtonGrp(nrb=1, scl=iAniConGr, w=90, l1="insert")
 			ui.Text(w=90, h=20, l="import at...", fn="boldLabelFont", align="left")
-			iOriTimeGr = ui.RadioButtonGrp(w=90, nrb=1, l1="original time", sl=0)
-			ui.RadioButtonGrp(w=90, nrb=1, scl=iOriTimeGr, l1="current time", sl=1)
+			iOriTimeGr = ui.RadioButtonGrp(w=90, nrb=1, l1="original time", sl=1)
+			self.at_current_time = ui.RadioButtonGrp(w=90, nrb=1, scl=iOriTimeGr, l1="current time")
 			ui.Text(w=90, h=20, l="load timerange:", fn="boldLabelFont", align="left")
 			
 			iTrCol = ui.RadioCollection()
@@ -559,8 +657,11 @@ class ImportLayout( ui.FormLayout ):
 				iSTrTf = ui.TextField(w=44)
 				iETrTf = ui.TextField(w=38)
 			iRow3.setParentActive()
-			iTrRadioG.append(ui.RadioButton(w=90, cl=iTrCol, l="last pose", al="left"))
-			iTrRadioG.append(ui.RadioButton(w=90, cl=iTrCol, l="first pose", al="left"))
+			self.last_pose = ui.RadioButton(w=90, cl=iTrCol, l="last pose", al="left")
+			self.first_pose = ui.RadioButton(w=90, cl=iTrCol, l="first pose", al="left")
+			for rb in (iTrRadioG[0], iTrRadioG[2], iSTrTf, iETrTf):
+				rb.p_enable = False
+			# END for each unsupported element
 		# END column layout
 		self.setActive()
 	
@@ -577,14 +678,8 @@ class ImportLayout( ui.FormLayout ):
 				(btnIHlp, b, 0),
 				(btnIHlp, r, sk),
 				(clOpts, r, 0),
-				(clOpts, b, 0),
 				(clOpts, t, 0),
 				(selector, l, sk),
-				
-				# remove once clOpts is managed again
-				(convControl, r, sk), 
-				(selector, r, sk), 
-				(cbFilter, r, sk)
 				],  # attach form
 			
 			attachControl=[
@@ -592,11 +687,10 @@ class ImportLayout( ui.FormLayout ):
 				(btnImport, r, 0, btnIHlp),
 				(selector, t, 5, cbFilter),
 				(selector, b, 5, btnImport),
-				
-				# enable once clOpts is manaaged again
-				#(cbFilter, r, lk, clOpts),
-				#(convControl, r, lk, clOpts),
-				#(selector, r, lk, clOpts),
+				(clOpts, b, 5, btnImport),
+				(cbFilter, r, lk, clOpts),
+				(convControl, r, lk, clOpts),
+				(selector, r, lk, clOpts),
 				], # attach control
 				
 			attachNone=[
@@ -616,6 +710,7 @@ class ImportLayout( ui.FormLayout ):
 		# SETUP CONNECTIONS
 		###################
 		cbFilter.e_changeCommand = self._filter_enable_state_changed
+		btnImport.e_released = self._on_import
 		
 		
 		# initialize
@@ -625,18 +720,183 @@ class ImportLayout( ui.FormLayout ):
 	#{ Callbacks 
 	def _filter_enable_state_changed(self, sender, *args):
 		self.nodeselector.p_enable = sender.p_value
+		
+	def _on_import(self, sender, *args):
+		"""Queue the import of a file after gathering UI data
+		
+		:return: the queued ``Job``, or None if the user cancelled"""
+		if hasattr(cmds, 'fileDialog2'):
+			file_path = cmds.fileDialog2(fileMode=1, dialogStyle=2, 
+							fileFilter="Animation Files (%s)" % ' '.join(self.kImportMasks))
+			file_path = file_path and file_path[0]
+		else:
+			# on linux, the old dialog supports only one mask
+			file_path = cmds.fileDialog(mode=0, directoryMask="*.*")
+		# END choose dialog
+		if not file_path:
+			return None
+		# END bail out
+		
+		start_time = None
+		if self.at_current_time.p_select:
+			start_time = apianim.MAnimControl.currentTime().value()
+		# END handle import time
+		
+		mode = lib.AnimationHandle.kConnect
+		if self.replace_mode.p_select:
+			mode = lib.AnimationHandle.kReplace
+		elif self.insert_mode.p_select:
+			mode = lib.AnimationHandle.kInsert
+		# END handle mode
+		
+		pose = None
+		if self.first_pose.p_select:
+			pose = lib.AnimationHandle.kFirstPose
+		elif self.last_pose.p_select:
+			pose = lib.AnimationHandle.kLastPose
+		# END handle pose
+		
+		file_path = Path(file_path)
+		job = Job("Import %s" % file_path.basename(), lib.AnimInOutLibrary.iter_import, 
+					file_path, self.converter.converter(), self.predicate(), 
+					chunk_size=self.kChunkSize, start_time=start_time, mode=mode, pose=pose)
+		return scheduler().submit(job)
 	
 	#} END callbacks
 	
+	#{ Configuration
+	# amount of assignments to connect per idle event
+	kChunkSize = 2500
+	# masks of all file types we can import
+	kImportMasks = ("*.ma", "*.mb", "*.aio", "*.aiom")
+	#} END configuration
+	
 	#{ Interface 
 	def update(self):
 		"""Trigger an update of the full import UI"""
 		self.converter.update()
 		self.nodeselector.update()
 		
+	def predicate(self):
+		""":return: predicate compatible to ``AnimationHandle.iter_assignments``
+			allowing only targets on nodes chosen in our node selector, or None
+			if the input is not filtered"""
+		if not self.nodeselector.p_enable:
+			return None
+		# END no filter
+		
+		node_names = set()
+		if self.nodeselector.uses_selection():
+			for node in nt.activeSelectionList().mtoIter(asNode=True, handlePlugs=False):
+				node_names.add(node.name().split('|')[-1])
+			# END for each selected node
+		# END handle selected nodes
+		namespaces = tuple(str(ns).lstrip(':') + ':' for ns in self.nodeselector.selected_namespaces())
+		
+		def is_selected(source_plug, target_plug_name):
+			node_name = target_plug_name.split('.', 1)[0].lstrip(':')
+			return node_name.split('|')[-1] in node_names or node_name.startswith(namespaces)
+		# END predicate
+		return is_selected
+		
 	#} END interface
 		
 
+class JobControl( ui.FormLayout ):
+	"""Displays the progress of the jobs run by our ``scheduler`` and allows the 
+	user to cancel them"""
+	
+	#{ Annotations 
+	aCancel = "Cancel the current job, reverting its changes where possible"
+	aCancelAll = "Cancel the current job and all queued ones"
+	
+	#} END annotations
+	
+	def __init__(self, *args, **kwargs):
+		"""Build our interface and connect to the scheduler"""
+		self.label = ui.Text(l="", al="left")
+		self.progress = ui.ProgressBar(maxValue=100, h=16)
+		btnCancel = ui.Button(l="Cancel", ann=self.aCancel, w=50, h=18)
+		btnCancelAll = ui.Button(l="All", ann=self.aCancelAll, w=22, h=18)
+		
+		t, b, l, r = self.kSides
+		self.setup(
+			attachForm=[
+				(self.label, t, 0),
+				(self.label, l, 2),
+				(self.label, r, 2),
+				(self.progress, l, 2),
+				(self.progress, b, 0),
+				(btnCancelAll, r, 2),
+				(btnCancelAll, b, 0),
+				(btnCancel, b, 0)],
+			
+			attachControl=[
+				(self.progress, t, 2, self.label),
+				(self.progress, r, 2, btnCancel),
+				(btnCancel, r, 0, btnCancelAll)],
+			
+			attachNone=[
+				(self.label, b),
+				(btnCancel, t),
+				(btnCancel, l),
+				(btnCancelAll, t),
+				(btnCancelAll, l)] )
+		self.setParentActive()
+		
+		# SETUP CONNECTIONS
+		###################
+		btnCancel.e_released = self._on_cancel
+		btnCancelAll.e_released = self._on_cancel_all
+		
+		sched = scheduler()
+		sched.progress_callbacks.append(self._job_progressed)
+		sched.finished_callbacks.append(self._job_finished)
+		sched.queue_callbacks.append(self._queue_changed)
+		
+		self._queue_changed(None)
+		
+	#{ Callbacks
+	def uiDeleted(self):
+		"""Deregister our scheduler callbacks"""
+		sched = scheduler()
+		sched.progress_callbacks.remove(self._job_progressed)
+		sched.finished_callbacks.remove(self._job_finished)
+		sched.queue_callbacks.remove(self._queue_changed)
+	
+	def _on_cancel(self, sender, *args):
+		scheduler().cancel()
+		
+	def _on_cancel_all(self, sender, *args):
+		scheduler().cancel_all()
+		
+	def _job_progressed(self, job):
+		self.progress.p_progress = int(job.progress * 100)
+		
+	def _job_finished(self, job):
+		if job.state == Job.kFailed:
+			log.error("%s failed: %s" % (job.name, job.error))
+			cmds.warning("%s failed: %s" % (job.name, job.error))
+		# END handle failure
+		self.progress.p_progress = 0
+		
+	def _queue_changed(self, job):
+		"""Display the current job and the amount of waiting ones"""
+		sched = scheduler()
+		current = sched.current_job()
+		if current is None:
+			self.label.p_label = "idle"
+		else:
+			num_queued = len(sched.jobs()) - 1
+			label = current.name
+			if num_queued:
+				label += " (%i queued)" % num_queued
+			# END handle queue
+			self.label.p_label = label
+		# END handle current job
+	#} END callbacks
+	
+
 class AnimIOLayout( ui.TabLayout ):
 	"""Represents a layout for exporting and importing animation"""
 	
@@ -682,7 +942,26 @@ class AnimIO_UI( ui.Window ):
 	
 	def __init__(self, *args, **kwargs):
 		self.p_title = "mfAnimIO v0.8.py"
-		self.p_wh = (320, 362)
+		self.p_wh = (320, 400)
 		
+		form = ui.FormLayout()
 		self.main = AnimIOLayout()
+		form.setActive()
+		self.jobctrl = JobControl()
+		
+		t, b, l, r = form.kSides
+		form.setup(
+			attachForm=[
+				(self.main, t, 0),
+				(self.main, l, 0),
+				(self.main, r, 0),
+				(self.jobctrl, l, 0),
+				(self.jobctrl, r, 0),
+				(self.jobctrl, b, 2)],
+			
+			attachControl=[
+				(self.main, b, 2, self.jobctrl)],
+			
+			attachNone=[
+				(self.jobctrl, t)] )
 		
\ No newline at end of file